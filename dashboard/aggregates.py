@@ -0,0 +1,224 @@
+"""
+Agregados incrementais das leituras (count, soma, soma dos quadrados, min, max)
+por sensor, no total e em baldes de tempo (minuto, hora, dia).
+
+O store e alimentado so com as linhas novas (ver IncrementalCsvReader.subscribe)
+e responde KPIs em O(1) e estatisticas de janela sem tocar nas leituras brutas.
+Os baldes de cada resolucao ficam em arrays ordenados pela chave (_Buckets):
+uma janela custa duas buscas binarias (O(log B)) mais uma reducao vetorizada
+so sobre os k baldes dentro dela, nunca sobre o historico inteiro.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+SENSOR_COLS = ["temperature", "vibration", "luminosity", "air_q"]
+# resolucao dos baldes -> retencao (None = sem limite); com retencao em todas, o
+# numero de baldes nao cresce com o turno (o total do historico fica em self.total)
+RESOLUTIONS = {"min": pd.Timedelta(days=2), "h": pd.Timedelta(days=90), "D": pd.Timedelta(days=730)}
+# indices no vetor de estatisticas
+N, SUM, SUMSQ, MIN, MAX = range(5)
+
+
+def _empty(ncols: int) -> np.ndarray:
+    st = np.zeros((ncols, 5))
+    st[:, MIN] = np.inf
+    st[:, MAX] = -np.inf
+    return st
+
+def _combine(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    out = a.copy()
+    out[:, N:MIN] += b[:, N:MIN]
+    out[:, MIN] = np.minimum(a[:, MIN], b[:, MIN])
+    out[:, MAX] = np.maximum(a[:, MAX], b[:, MAX])
+    return out
+
+def _batch_stats(values: np.ndarray) -> np.ndarray:
+    """Estatisticas (ncols x 5) de um bloco de valores (nrows x ncols), ignorando NaN."""
+    st = _empty(values.shape[1])
+    ok = ~np.isnan(values)
+    st[:, N] = ok.sum(axis=0)
+    st[:, SUM] = np.nansum(values, axis=0)
+    st[:, SUMSQ] = np.nansum(values * values, axis=0)
+    has = st[:, N] > 0
+    if has.any():
+        st[has, MIN] = np.nanmin(values[:, has], axis=0)
+        st[has, MAX] = np.nanmax(values[:, has], axis=0)
+    return st
+
+def summarize(st_row: np.ndarray) -> dict:
+    """count / mean / std (amostral, como o pandas) / min / max de uma linha de estatisticas."""
+    n = st_row[N]
+    if n == 0:
+        return {"count": 0, "mean": np.nan, "std": np.nan, "min": np.nan, "max": np.nan}
+    mean = st_row[SUM] / n
+    var = (st_row[SUMSQ] - n * mean * mean) / (n - 1) if n > 1 else np.nan
+    return {
+        "count": int(n), "mean": mean, "std": float(np.sqrt(max(var, 0.0))) if n > 1 else np.nan,
+        "min": st_row[MIN], "max": st_row[MAX],
+    }
+
+
+class _Buckets:
+    """
+    Baldes de uma resolucao: chaves (ns) ordenadas e estatisticas
+    (baldes x colunas x 5) em arrays pre-alocados. Baldes novos no fim (o caso
+    ao vivo) entram sem copia, com crescimento geometrico; a retencao so avanca
+    o inicio. Um balde novo no meio (leitura atrasada) usa np.insert.
+    """
+
+    def __init__(self, ncols: int, capacity: int = 64):
+        self._keys = np.empty(capacity, dtype=np.int64)
+        self._stats = np.empty((capacity, ncols, 5))
+        self._lo = self._hi = 0
+
+    def __len__(self):
+        return self._hi - self._lo
+
+    @property
+    def keys(self) -> np.ndarray:
+        return self._keys[self._lo:self._hi]
+
+    @property
+    def stats(self) -> np.ndarray:
+        return self._stats[self._lo:self._hi]
+
+    def _reserve(self, extra: int):
+        n = len(self)
+        if self._hi + extra <= len(self._keys):
+            return
+        cap = len(self._keys)
+        while n + extra > cap // 2:
+            cap *= 2
+        keys, stats = np.empty(cap, dtype=np.int64), np.empty((cap,) + self._stats.shape[1:])
+        keys[:n], stats[:n] = self.keys, self.stats
+        self._keys, self._stats, self._lo, self._hi = keys, stats, 0, n
+
+    def merge(self, keys: np.ndarray, st: np.ndarray):
+        """Combina as estatisticas `st` (k x colunas x 5) nos baldes `keys` (ordenados, sem repeticao)."""
+        cur = self.keys
+        pos = np.searchsorted(cur, keys)
+        hit = pos < len(cur)
+        hit[hit] = cur[pos[hit]] == keys[hit]
+        if hit.any():
+            dst = self.stats[pos[hit]]
+            dst[:, :, N:MIN] += st[hit, :, N:MIN]
+            dst[:, :, MIN] = np.minimum(dst[:, :, MIN], st[hit, :, MIN])
+            dst[:, :, MAX] = np.maximum(dst[:, :, MAX], st[hit, :, MAX])
+            self.stats[pos[hit]] = dst
+        new = ~hit
+        if not new.any():
+            return
+        keys, st, pos = keys[new], st[new], pos[new]
+        if pos[0] == len(cur):
+            self._reserve(len(keys))
+            self._keys[self._hi:self._hi + len(keys)] = keys
+            self._stats[self._hi:self._hi + len(keys)] = st
+            self._hi += len(keys)
+        else:
+            merged_keys = np.insert(cur, pos, keys)
+            merged_stats = np.insert(self.stats, pos, st, axis=0)
+            self._keys, self._stats, self._lo, self._hi = merged_keys, merged_stats, 0, len(merged_keys)
+
+    def drop_before(self, cutoff: int):
+        """Descarta os baldes com chave < cutoff (ns)."""
+        self._lo += int(np.searchsorted(self.keys, cutoff, "left"))
+
+    def window(self, col: int, start: int, end: int) -> np.ndarray:
+        """Estatisticas (1 x 5) da coluna nos baldes com start <= chave < end."""
+        keys = self.keys
+        lo, hi = np.searchsorted(keys, start, "left"), np.searchsorted(keys, end, "left")
+        acc = _empty(1)
+        if hi > lo:
+            part = self.stats[lo:hi, col]
+            acc[0, N:MIN] = part[:, N:MIN].sum(axis=0)
+            acc[0, MIN] = part[:, MIN].min()
+            acc[0, MAX] = part[:, MAX].max()
+        return acc
+
+
+class AggregateStore:
+    def __init__(self, columns=None, resolutions=None):
+        self.columns = list(columns or SENSOR_COLS)
+        self.resolutions = dict(resolutions or RESOLUTIONS)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.total = _empty(len(self.columns))
+        self.buckets = {res: _Buckets(len(self.columns)) for res in self.resolutions}
+        self.last_ts = None
+
+    def on_rows(self, new: pd.DataFrame, reset: bool = False):
+        """Callback para o leitor incremental: reset=True quando o historico foi relido."""
+        with self._lock:
+            if reset:
+                self.reset()
+            self._update(new)
+
+    def update(self, new: pd.DataFrame):
+        with self._lock:
+            self._update(new)
+
+    def _update(self, new: pd.DataFrame):
+        if new is None or new.empty:
+            return
+        values = np.column_stack([
+            pd.to_numeric(new[c], errors="coerce").to_numpy(dtype=float) if c in new.columns
+            else np.full(len(new), np.nan)
+            for c in self.columns
+        ])
+        self.total = _combine(self.total, _batch_stats(values))
+
+        ts = pd.to_datetime(new["ts"], errors="coerce")
+        ok = ts.notna().to_numpy()
+        if not ok.any():
+            return
+        ts, values = ts[ok], values[ok]
+        last = ts.max()
+        self.last_ts = last if self.last_ts is None else max(self.last_ts, last)
+        frame = pd.DataFrame(values, columns=self.columns, index=ts.to_numpy())
+        for res, retention in self.resolutions.items():
+            store = self.buckets[res]
+            part = frame
+            if retention is not None:
+                cutoff = self.last_ts - retention
+                part = frame[frame.index >= cutoff.floor(res)]
+                store.drop_before(cutoff.value)
+            if part.empty:
+                continue
+            # um groupby por resolucao; so os baldes tocados sao combinados
+            keys = part.index.floor(res)
+            g = part.groupby(keys)
+            counts = g.count()
+            agg = np.stack([
+                counts.to_numpy(dtype=float),
+                g.sum().to_numpy(dtype=float),
+                (part * part).groupby(keys).sum().to_numpy(dtype=float),
+                g.min().fillna(np.inf).to_numpy(dtype=float),
+                g.max().fillna(-np.inf).to_numpy(dtype=float),
+            ], axis=2)  # (baldes, colunas, 5)
+            store.merge(counts.index.to_numpy(dtype="datetime64[ns]").astype(np.int64), agg)
+
+    # ===================== Consultas =====================
+    def stats(self, col: str) -> dict:
+        """Estatisticas do historico inteiro (O(1))."""
+        return summarize(self.total[self.columns.index(col)])
+
+    def window_stats(self, col: str, start=None, end=None, res: str = None) -> dict:
+        """
+        Estatisticas de [start, end) somando os baldes da resolucao `res`
+        (padrao: a mais fina cuja retencao cobre a janela). O(log B + k), com k
+        os baldes dentro da janela.
+        """
+        end = pd.Timestamp(end) if end is not None else (self.last_ts or pd.Timestamp.now()) + pd.Timedelta(days=1)
+        start = pd.Timestamp(start) if start is not None else pd.Timestamp.min
+        if res is None:
+            res = next((r for r, ret in self.resolutions.items()
+                        if ret is None or self.last_ts is None or start >= self.last_ts - ret),
+                       list(self.resolutions)[-1])
+        i = self.columns.index(col)
+        with self._lock:
+            acc = self.buckets[res].window(i, start.value, end.value)
+        return summarize(acc[0])
@@ -0,0 +1,266 @@
+"""
+Motor de alertas vetorizado (janela + histerese + persistencia).
+
+Avalia as mesmas regras do dashboard para todas as linhas de uma serie de uma
+vez, com somas moveis em NumPy, em vez de aplicar funcoes escalares linha a
+linha. Nao depende do Streamlit: pode ser usado para backfill de alertas sobre
+o historico inteiro (ver main()).
+"""
+import argparse
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+# --- Parametros padrao (mesmos do dashboard) ---
+WINDOW = 5
+MIN_BREACHES = 3
+HYST = {
+    "vibration": 0.05,
+    "air_q":     5,
+    "luminosity":50,
+    "temperature":2.0
+}
+LEVEL = {"baixa":1,"media":2,"alta":3}
+SEVERITY_NAMES = np.array([None, "baixa", "media", "alta"], dtype=object)
+# ordem usada para escolher o valor registrado no log
+VALUE_COLS = ["vibration", "air_q", "luminosity", "temperature"]
+
+
+@dataclass(frozen=True)
+class Rule:
+    """
+    Regra de alerta sobre uma coluna.
+    kind: "ge" (valor >= thr), "le" (valor <= thr) ou "range" (fora de [low, high]).
+    small/big: distancia ao limite a partir da qual a severidade vira media/alta.
+    """
+    key: str
+    kind: str
+    thr: float = None
+    low: float = None
+    high: float = None
+    hyst: float = 0.0
+    small: float = 0.0
+    big: float = 0.0
+
+
+def default_rules(vib_thr=None, air_thr=None, lux_range=None, temp_range=None, hyst=None):
+    """Monta as regras do dashboard; regras com limiar None ficam desligadas."""
+    hyst = hyst or HYST
+    rules = []
+    if vib_thr is not None:
+        rules.append(Rule("vibration", "ge", thr=vib_thr, hyst=hyst["vibration"], small=0.15, big=0.40))
+    if air_thr is not None:
+        rules.append(Rule("air_q", "le", thr=air_thr, hyst=hyst["air_q"], small=10, big=25))
+    if lux_range is not None:
+        rules.append(Rule("luminosity", "range", low=lux_range[0], high=lux_range[1],
+                          hyst=hyst["luminosity"], small=120, big=250))
+    if temp_range is not None:
+        rules.append(Rule("temperature", "range", low=temp_range[0], high=temp_range[1],
+                          hyst=hyst["temperature"], small=3.0, big=6.0))
+    return rules
+
+
+# ===================== Kernels vetorizados =====================
+def _values(df: pd.DataFrame, key: str) -> np.ndarray:
+    if key not in df.columns:
+        return np.full(len(df), np.nan)
+    return pd.to_numeric(df[key], errors="coerce").to_numpy(dtype=float)
+
+def breach_mask(v: np.ndarray, rule: Rule) -> np.ndarray:
+    """Violacao ja descontando a histerese (NaN nunca viola)."""
+    with np.errstate(invalid="ignore"):
+        if rule.kind == "ge":
+            return v >= float(rule.thr) + rule.hyst
+        if rule.kind == "le":
+            return v <= float(rule.thr) - rule.hyst
+        return (v < (rule.low - rule.hyst)) | (v > (rule.high + rule.hyst))
+
+def severity_level(v: np.ndarray, rule: Rule) -> np.ndarray:
+    """Nivel de severidade por linha: 0 (nenhuma), 1 baixa, 2 media, 3 alta."""
+    with np.errstate(invalid="ignore"):
+        if rule.kind == "ge":
+            dist = v - float(rule.thr)
+        elif rule.kind == "le":
+            dist = float(rule.thr) - v
+        else:
+            dist = np.where(v < rule.low, rule.low - v, v - rule.high)
+            # dentro da faixa nao ha severidade
+            dist = np.where((v >= rule.low) & (v <= rule.high), -1.0, dist)
+        level = np.select([dist >= rule.big, dist >= rule.small, dist >= 0], [3, 2, 1], default=0)
+    return np.where(np.isnan(v), 0, level).astype(np.int8)
+
+def rolling_count(mask: np.ndarray, window: int, groups: np.ndarray = None) -> np.ndarray:
+    """
+    Quantidade de violacoes nas ultimas `window` linhas (inclusive a atual).
+    Com `groups` (codigos inteiros, linhas de cada grupo contiguas) a janela
+    nao atravessa a fronteira entre grupos.
+    """
+    c = np.cumsum(mask, dtype=np.int64)
+    if groups is None:
+        out = c.copy()
+        if window < len(c):
+            out[window:] -= c[:-window]
+        return out
+    idx = np.arange(len(c))
+    new_group = np.ones(len(c), dtype=bool)
+    new_group[1:] = groups[1:] != groups[:-1]
+    start = np.maximum.accumulate(np.where(new_group, idx, 0))
+    lag = idx - window
+    # soma acumulada logo antes da janela (ou do inicio do grupo)
+    before = np.where(lag >= start, c[np.maximum(lag, 0)], np.where(start > 0, c[start - 1], 0))
+    return c - before
+
+
+# ===================== Avaliacao =====================
+def evaluate(df: pd.DataFrame, rules, window: int = WINDOW, min_breaches: int = MIN_BREACHES,
+             by: str = None) -> pd.DataFrame:
+    """
+    Avalia todas as regras para todas as linhas de df (ja ordenado por ts).
+    Para cada linha i o resultado e o mesmo que o dashboard mostraria se i
+    fosse a ultima leitura: contagem de violacoes na janela, severidade da
+    ultima leitura e severidade geral (a maior entre as regras disparadas).
+    Com by="device_id" a janela e contada por dispositivo, numa unica passada.
+    """
+    out = pd.DataFrame(index=df.index)
+    overall = np.zeros(len(df), dtype=np.int8)
+    if by is not None:
+        codes = pd.factorize(df[by])[0]
+        order = np.argsort(codes, kind="stable")
+    for rule in rules:
+        v = _values(df, rule.key)
+        mask = breach_mask(v, rule)
+        if by is None:
+            count = rolling_count(mask, window)
+        else:
+            count = np.empty(len(df), dtype=np.int64)
+            count[order] = rolling_count(mask[order], window, codes[order])
+        level = severity_level(v, rule)
+        fired = (count >= min_breaches) & (level > 0)
+        out[f"count_{rule.key}"] = count
+        out[f"sev_{rule.key}"] = np.where(fired, level, 0).astype(np.int8)
+        overall = np.maximum(overall, out[f"sev_{rule.key}"].to_numpy())
+    out["level"] = overall
+    out["severidade"] = SEVERITY_NAMES[overall]
+    return out
+
+def log_value(df: pd.DataFrame) -> pd.Series:
+    """Valor registrado no log: primeira coluna nao nula entre VALUE_COLS."""
+    vals = pd.DataFrame({c: _values(df, c) for c in VALUE_COLS}, index=df.index)
+    return vals.bfill(axis=1).iloc[:, 0]
+
+def describe(rule: Rule, value, count, window: int, sev: str) -> str:
+    """Texto da regra disparada (mesmo formato do log do dashboard)."""
+    if rule.key == "vibration":
+        return f"vib>={rule.thr:g} (ult={float(value):.2f}, {count}/{window} viol.) sev={sev}"
+    if rule.key == "air_q":
+        return f"air_q<={rule.thr:g} (ult={int(float(value))}, {count}/{window} viol.) sev={sev}"
+    if rule.key == "luminosity":
+        return f"lux fora [{rule.low},{rule.high}] (ult={int(float(value))}, {count}/{window} viol.) sev={sev}"
+    if rule.key == "temperature":
+        return f"temp fora [{rule.low},{rule.high}] (ult={float(value):.1f} C, {count}/{window} viol.) sev={sev}"
+    return f"{rule.key} (ult={value}, {count}/{window} viol.) sev={sev}"
+
+def active_rules(df: pd.DataFrame, rules, window: int = WINDOW, min_breaches: int = MIN_BREACHES) -> dict:
+    """
+    Regras disparadas na leitura mais recente, na ordem de `rules`:
+    {key: {"severidade", "regra" (texto), "valor" (ultimo valor da coluna)}}.
+    """
+    if df.empty:
+        return {}
+    tail = df.tail(window)
+    res = evaluate(tail, rules, window, min_breaches).iloc[-1]
+    last = tail.iloc[-1]
+    active = {}
+    for rule in rules:
+        lvl = int(res[f"sev_{rule.key}"])
+        if lvl:
+            sev = SEVERITY_NAMES[lvl]
+            active[rule.key] = {
+                "severidade": sev,
+                "regra": describe(rule, last[rule.key], int(res[f"count_{rule.key}"]), window, sev),
+                "valor": float(last[rule.key]),
+            }
+    return active
+
+def active_by_device(df: pd.DataFrame, rules, window: int = WINDOW, min_breaches: int = MIN_BREACHES,
+                     by: str = "device_id") -> dict:
+    """active_rules() de todos os dispositivos de df de uma vez: {device: {key: ...}}."""
+    if df.empty:
+        return {}
+    tail = df.groupby(by, sort=False).tail(window)
+    res = evaluate(tail, rules, window, min_breaches, by=by)
+    last = ~tail[by].duplicated(keep="last").to_numpy()
+    tail, res = tail[last], res[last]
+    out = {}
+    for dev, row, r in zip(tail[by], tail.to_dict("records"), res.to_dict("records")):
+        active = {}
+        for rule in rules:
+            lvl = int(r[f"sev_{rule.key}"])
+            if lvl:
+                sev = SEVERITY_NAMES[lvl]
+                active[rule.key] = {
+                    "severidade": sev,
+                    "regra": describe(rule, row[rule.key], int(r[f"count_{rule.key}"]), window, sev),
+                    "valor": float(row[rule.key]),
+                }
+        out[dev] = active
+    return out
+
+def latest(df: pd.DataFrame, rules, window: int = WINDOW, min_breaches: int = MIN_BREACHES):
+    """
+    Estado de alerta da leitura mais recente.
+    Retorna (severidade geral ou None, partes do texto da regra, valor para o log).
+    """
+    if df.empty:
+        return None, [], None
+    active = active_rules(df, rules, window, min_breaches)
+    sevs = [a["severidade"] for a in active.values()]
+    overall = max(sevs, key=lambda s: LEVEL[s]) if sevs else None
+    return overall, [a["regra"] for a in active.values()], log_value(df.tail(1)).iloc[-1]
+
+def backfill(df: pd.DataFrame, rules, window: int = WINDOW, min_breaches: int = MIN_BREACHES) -> pd.DataFrame:
+    """Linhas do historico em que algum alerta estaria ativo, no formato do alerts.csv."""
+    res = evaluate(df, rules, window, min_breaches)
+    hit = res["level"].to_numpy() > 0
+    sub, res = df[hit], res[hit]
+    regras = []
+    for (_, row), (_, r) in zip(sub.iterrows(), res.iterrows()):
+        regras.append(" | ".join(
+            describe(rule, row[rule.key], int(r[f"count_{rule.key}"]), window, SEVERITY_NAMES[r[f"sev_{rule.key}"]])
+            for rule in rules if r[f"sev_{rule.key}"]
+        ))
+    return pd.DataFrame({
+        "ts": sub["ts"].to_numpy(),
+        "regra": regras,
+        "valor": log_value(sub).round(3).to_numpy(),
+        "severidade": res["severidade"].to_numpy(),
+    })
+
+
+# ===================== CLI (backfill) =====================
+def main(argv=None):
+    from readings_log import normalize_cols
+
+    ap = argparse.ArgumentParser(description="Backfill de alertas sobre o historico de leituras.")
+    ap.add_argument("csv", help="CSV de leituras (ex.: ingest/readings.csv)")
+    ap.add_argument("-o", "--out", default=None, help="CSV de saida (padrao: stdout)")
+    ap.add_argument("--vib-thr", type=float, default=0.8)
+    ap.add_argument("--air-thr", type=int, default=60)
+    ap.add_argument("--lux", type=int, nargs=2, default=None, metavar=("LOW", "HIGH"))
+    ap.add_argument("--temp", type=int, nargs=2, default=None, metavar=("LOW", "HIGH"))
+    ap.add_argument("--window", type=int, default=WINDOW)
+    ap.add_argument("--min-breaches", type=int, default=MIN_BREACHES)
+    args = ap.parse_args(argv)
+
+    df = normalize_cols(pd.read_csv(args.csv))
+    rules = default_rules(args.vib_thr, args.air_thr, args.lux, args.temp)
+    out = backfill(df, rules, args.window, args.min_breaches)
+    if args.out:
+        out.to_csv(args.out, index=False)
+    else:
+        print(out.to_csv(index=False), end="")
+
+
+if __name__ == "__main__":
+    main()
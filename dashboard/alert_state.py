@@ -0,0 +1,131 @@
+"""
+Estado dos alertas por regra (aberto / reconhecido / fechado).
+
+O dashboard reavalia as regras a cada rerun; em vez de registrar um alerta a
+cada avaliacao, este modulo guarda o estado de cada regra (em memoria e em um
+JSON ao lado do log) e so anexa uma linha ao alerts.csv quando ha transicao:
+  - regra dispara e estava fechada        -> "aberto"
+  - severidade sobe (aberto/reconhecido)  -> "aberto" de novo, com a nova severidade
+  - operador reconhece                    -> "reconhecido"
+  - regra deixa de disparar               -> "fechado"
+"""
+import os
+import json
+import tempfile
+import threading
+
+import pandas as pd
+
+from readings_log import ReadingsAppender, DEFAULT_DEVICE, safe_name
+
+ALERT_COLS = ["ts","device_id","regra","valor","severidade","canal","status"]
+STATUS_OPEN = "aberto"
+STATUS_ACK = "reconhecido"
+STATUS_CLOSED = "fechado"
+LEVEL = {"baixa":1,"media":2,"alta":3}
+
+
+def _now() -> str:
+    return pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class AlertStateStore:
+    def __init__(self, log_path: str, state_path: str = None, device_id: str = DEFAULT_DEVICE,
+                 canal: str = "whatsapp", sink=None):
+        # sink: callable opcional que recebe as mesmas linhas gravadas no log
+        # (ex.: SqliteStore.insert_alerts)
+        # um store por dispositivo: o log e compartilhado, o estado fica em
+        # <log>_state.json (padrao) ou <log>_state_<device>.json
+        self.log_path = log_path
+        self.sink = sink
+        suffix = "" if device_id == DEFAULT_DEVICE else "_" + safe_name(device_id)
+        self.state_path = state_path or os.path.splitext(log_path)[0] + "_state" + suffix + ".json"
+        self.device_id = device_id
+        self.canal = canal
+        self.state = {}
+        self._mtime = None
+        self._lock = threading.Lock()
+        self._log = ReadingsAppender(log_path, columns=ALERT_COLS, tail_size=0)
+        self._load()
+
+    # --- persistencia ---
+    def _load(self):
+        if not os.path.exists(self.state_path):
+            return
+        mtime = os.path.getmtime(self.state_path)
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                self.state = json.load(f)
+            self._mtime = mtime
+        except (OSError, ValueError):
+            # estado corrompido/parcial: recomeca do zero (o log continua valido)
+            self.state = {}
+
+    def _save(self):
+        dir_ = os.path.dirname(self.state_path) or "."
+        fd, tmp = tempfile.mkstemp(prefix="tmp_alert_state_", suffix=".json", dir=dir_)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.state_path)
+        self._mtime = os.path.getmtime(self.state_path)
+
+    def _transition(self, key: str, status: str, regra: str, valor, severidade: str, ts: str):
+        entry = self.state.setdefault(key, {})
+        entry.update({"status": status, "regra": regra, "valor": valor, "severidade": severidade})
+        if status == STATUS_OPEN:
+            entry.setdefault("desde", ts)
+        entry["atualizado"] = ts
+        return {
+            "ts": ts, "device_id": self.device_id, "regra": regra,
+            "valor": round(float(valor or 0), 3), "severidade": severidade,
+            "canal": self.canal, "status": status,
+        }
+
+    def _write(self, rows: list):
+        self._log.append(rows)
+        if self.sink is not None:
+            self.sink(rows)
+
+    # --- API ---
+    def update(self, active: dict) -> list:
+        """
+        Aplica o resultado da avaliacao atual ({key: {"severidade", "regra", "valor"}})
+        e grava no log apenas as transicoes. Retorna as linhas gravadas.
+        """
+        ts = _now()
+        rows = []
+        with self._lock:
+            self._load()
+            for key, a in active.items():
+                cur = self.state.get(key)
+                if cur is None or cur["status"] == STATUS_CLOSED:
+                    self.state.pop(key, None)
+                    rows.append(self._transition(key, STATUS_OPEN, a["regra"], a["valor"], a["severidade"], ts))
+                elif LEVEL[a["severidade"]] > LEVEL[cur["severidade"]]:
+                    rows.append(self._transition(key, STATUS_OPEN, a["regra"], a["valor"], a["severidade"], ts))
+            for key, cur in self.state.items():
+                if key not in active and cur["status"] != STATUS_CLOSED:
+                    rows.append(self._transition(key, STATUS_CLOSED, cur["regra"], cur["valor"],
+                                                 cur["severidade"], ts))
+            if rows:
+                self._write(rows)
+                self._save()
+        return rows
+
+    def acknowledge(self, key: str) -> bool:
+        with self._lock:
+            self._load()
+            cur = self.state.get(key)
+            if cur is None or cur["status"] != STATUS_OPEN:
+                return False
+            row = self._transition(key, STATUS_ACK, cur["regra"], cur["valor"], cur["severidade"], _now())
+            self._write([row])
+            self._save()
+        return True
+
+    def active(self) -> dict:
+        """Alertas abertos ou reconhecidos."""
+        with self._lock:
+            return {k: dict(v) for k, v in self.state.items() if v["status"] != STATUS_CLOSED}
@@ -0,0 +1,303 @@
+"""
+Reducao de pontos para o grafico de series temporais.
+
+- minmax(): para cada balde guarda o minimo e o maximo (na ordem do tempo),
+  entao picos e vales continuam visiveis;
+- lttb(): Largest-Triangle-Three-Buckets, preserva o formato da curva;
+- SeriesPyramid: niveis pre-calculados de min/max (cada nivel agrupa FACTOR
+  baldes do anterior), mantidos de forma incremental. Uma consulta de qualquer
+  intervalo escolhe o nivel mais fino que cabe no orcamento de pontos, sem
+  varrer o historico bruto. Cada nivel guarda no maximo LEVEL_CAPACITY
+  entradas: o passado distante so existe nos niveis grossos.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+SENSOR_COLS = ["temperature", "vibration", "luminosity", "air_q"]
+FACTOR = 8
+# entradas mantidas por nivel da piramide (None = historico bruto inteiro)
+LEVEL_CAPACITY = 100_000
+METHODS = ("minmax", "lttb")
+
+
+def _as_ns(ts) -> np.ndarray:
+    return pd.to_datetime(ts).to_numpy(dtype="datetime64[ns]").astype(np.int64)
+
+
+def minmax(x: np.ndarray, y: np.ndarray, n_out: int):
+    """Min/max por balde: no maximo n_out pontos, em ordem de x."""
+    n = len(x)
+    if n <= n_out or n_out < 2:
+        return x, y
+    edges = np.linspace(0, n, n_out // 2 + 1).astype(np.int64)[:-1]
+    edges = np.unique(edges)
+    i_min = _reduce_arg(y, edges, np.minimum)
+    i_max = _reduce_arg(y, edges, np.maximum)
+    idx = np.unique(np.concatenate([i_min, i_max]))
+    return x[idx], y[idx]
+
+
+def _reduce_arg(y: np.ndarray, edges: np.ndarray, op) -> np.ndarray:
+    """Indice (global) do min/max de cada balde [edges[i], edges[i+1])."""
+    best = op.reduceat(y, edges)
+    bucket = np.repeat(np.arange(len(edges)), np.diff(np.append(edges, len(y))))
+    hit = np.flatnonzero(y == best[bucket])
+    # primeira ocorrencia de cada balde
+    _, first = np.unique(bucket[hit], return_index=True)
+    return hit[first]
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int):
+    """Largest-Triangle-Three-Buckets (Steinarsson, 2013); mantem o 1o e o ultimo ponto."""
+    n = len(x)
+    if n <= n_out or n_out < 3:
+        return x, y
+    xf = x.astype(float)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt_lo, nxt_hi = hi, (edges[i + 2] if i + 2 < len(edges) else n)
+        cx, cy = xf[nxt_lo:nxt_hi].mean(), y[nxt_lo:nxt_hi].mean()
+        # area (x2) do triangulo entre o ponto escolhido, o candidato e a media do proximo balde
+        area = np.abs((xf[a] - cx) * (y[lo:hi] - y[a]) - (xf[a] - xf[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return x[out], y[out]
+
+
+class _Level:
+    """
+    Um nivel da piramide em arrays pre-alocados (crescimento geometrico): os
+    pontos novos sao gravados no lugar, sem copiar o nivel inteiro. `base` e o
+    indice absoluto (desde o inicio do historico) da primeira entrada guardada;
+    entradas antigas descartadas so avancam o inicio.
+    """
+
+    def __init__(self, raw: bool = False, capacity: int = 64):
+        # nivel bruto: so (t, v); tmin/tmax e vmin/vmax sao o proprio ponto
+        self.raw = raw
+        self.fields = ("t0", "vmin") if raw else ("t0", "tmin", "vmin", "tmax", "vmax")
+        self._arr = {f: np.empty(capacity, dtype=np.int64 if f[0] == "t" else float) for f in self.fields}
+        self._lo = self._hi = 0
+        self.base = 0
+
+    def __len__(self):
+        return self._hi - self._lo
+
+    @property
+    def end(self) -> int:
+        """Indice absoluto logo apos a ultima entrada."""
+        return self.base + len(self)
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        if self.raw:
+            field = "t0" if field[0] == "t" else "vmin"
+        return self._arr[field][self._lo:self._hi]
+
+    def truncate(self, abs_end: int):
+        """Descarta as entradas a partir do indice absoluto abs_end."""
+        self._hi = self._lo + max(abs_end - self.base, 0)
+
+    def _realloc(self, cap: int):
+        size = len(self)
+        for f, arr in self._arr.items():
+            out = np.empty(cap, dtype=arr.dtype)
+            out[:size] = arr[self._lo:self._hi]
+            self._arr[f] = out
+        self._lo, self._hi = 0, size
+
+    def append(self, data: dict):
+        n = len(data["t0"])
+        if self._hi + n > len(self._arr["t0"]):
+            cap = max(len(self._arr["t0"]), 64)
+            while len(self) + n > cap // 2:
+                cap *= 2
+            self._realloc(cap)
+        for f in self.fields:
+            self._arr[f][self._hi:self._hi + n] = data[f]
+        self._hi += n
+
+    def drop_before(self, abs_idx: int):
+        n = min(max(abs_idx - self.base, 0), len(self))
+        self._lo += n
+        self.base += n
+        # devolve a memoria quando sobra muito (ex.: depois de carregar o historico inteiro)
+        if len(self._arr["t0"]) > max(4 * len(self), 64):
+            self._realloc(max(2 * len(self), 64))
+
+
+class SeriesPyramid:
+    """
+    Niveis de min/max de uma serie. Nivel 0 = pontos brutos; o nivel k+1 junta
+    FACTOR baldes do nivel k. Cada nivel guarda, por balde: inicio (t0), e o
+    valor/instante do minimo e do maximo.
+
+    Um append grava os pontos no fim de cada nivel e recalcula so o ultimo balde
+    (aberto) de cada nivel acima: O(pontos novos + niveis), nao O(historico).
+    Com `capacity`, cada nivel guarda no maximo ~capacity entradas; as mais
+    antigas ficam so nos niveis grossos, entao a memoria cresce com o log do
+    historico e consultas antigas saem de um nivel mais grosso.
+    """
+
+    def __init__(self, factor: int = FACTOR, capacity: int = None):
+        self.factor = factor
+        self.capacity = capacity
+        self.reset()
+
+    def reset(self):
+        self.levels = []
+
+    def __len__(self):
+        return len(self.levels[0]) if self.levels else 0
+
+    @property
+    def last_t(self):
+        return self.levels[0]["t0"][-1] if len(self) else None
+
+    def build(self, t: np.ndarray, v: np.ndarray):
+        self.reset()
+        self.extend(t, v)
+
+    def extend(self, t: np.ndarray, v: np.ndarray):
+        """
+        Acrescenta pontos (ordenados por t). Pontos atrasados sao intercalados
+        no nivel 0 e os niveis acima recalculados a partir dali (raro); os mais
+        antigos que o nivel 0 ainda guarda sao descartados.
+        """
+        if len(t) == 0:
+            return
+        if not self.levels:
+            self.levels = [_Level(raw=True)]
+        base = self.levels[0]
+        if len(base) and t[0] < self.last_t:
+            keep = t >= base["t0"][0] if base.base else np.ones(len(t), dtype=bool)
+            t, v = t[keep], v[keep]
+            if not len(t):
+                return
+            p = int(np.searchsorted(base["t0"], t[0], "right"))
+            t_all = np.concatenate([base["t0"][p:], t])
+            v_all = np.concatenate([base["vmin"][p:], v])
+            order = np.argsort(t_all, kind="mergesort")
+            changed_from = base.base + p
+            base.truncate(changed_from)
+            t, v = t_all[order], v_all[order]
+        else:
+            changed_from = base.end
+        base.append({"t0": t, "vmin": v})
+        self._rebuild_from(1, changed_from)
+        if self.capacity:
+            self._trim()
+
+    def _rebuild_from(self, k: int, changed_from: int):
+        """Recalcula os baldes do nivel k em diante que contem entradas do nivel k-1 >= changed_from."""
+        while self.levels[k - 1].end > 1:
+            prev = self.levels[k - 1]
+            start_bucket = changed_from // self.factor
+            rel = start_bucket * self.factor - prev.base
+            vmin, vmax = prev["vmin"][rel:], prev["vmax"][rel:]
+            edges = np.arange(0, len(vmin), self.factor)
+            i_min = _reduce_arg(vmin, edges, np.minimum)
+            i_max = _reduce_arg(vmax, edges, np.maximum)
+            new = {
+                "t0": prev["t0"][rel:][edges],
+                "tmin": prev["tmin"][rel:][i_min], "vmin": vmin[i_min],
+                "tmax": prev["tmax"][rel:][i_max], "vmax": vmax[i_max],
+            }
+            if k == len(self.levels):
+                self.levels.append(_Level())
+            self.levels[k].truncate(start_bucket)
+            self.levels[k].append(new)
+            changed_from = start_bucket
+            k += 1
+        del self.levels[k:]
+
+    def _trim(self):
+        """
+        Descarta o inicio de cada nivel acima de capacity. O corte e alinhado a
+        FACTOR e nunca passa do que o nivel de baixo ainda guarda, para que os
+        baldes a recalcular tenham sempre as entradas de origem.
+        """
+        limit = None
+        for lvl in self.levels:
+            cut = (lvl.end - self.capacity) // self.factor * self.factor
+            if limit is not None:
+                cut = min(cut, limit // self.factor * self.factor)
+            if cut > lvl.base:
+                lvl.drop_before(cut)
+            limit = lvl.base // self.factor
+
+    def query(self, start: int = None, end: int = None, budget: int = 1000, method: str = "minmax"):
+        """(t, v) de [start, end] (ns) com no maximo `budget` pontos."""
+        if not len(self):
+            return np.array([], dtype=np.int64), np.array([])
+        for k, lvl in enumerate(self.levels):
+            # niveis que ja descartaram o inicio so servem se a janela comeca depois dele
+            covers = lvl.base == 0 or (start is not None and start >= lvl["t0"][0])
+            if not covers and k < len(self.levels) - 1:
+                continue
+            lo = 0 if start is None else max(np.searchsorted(lvl["t0"], start, "right") - 1, 0)
+            hi = len(lvl) if end is None else np.searchsorted(lvl["t0"], end, "right")
+            n = hi - lo
+            # nivel mais fino com no maximo ~FACTOR x budget pontos; o corte
+            # final para o orcamento fica com minmax()/lttb()
+            per = 1 if k == 0 else 2
+            if n * per <= budget * self.factor or k == len(self.levels) - 1:
+                break
+        if k == 0:
+            t, v = lvl["t0"][lo:hi], lvl["vmin"][lo:hi]
+        else:
+            t = np.concatenate([lvl["tmin"][lo:hi], lvl["tmax"][lo:hi]])
+            v = np.concatenate([lvl["vmin"][lo:hi], lvl["vmax"][lo:hi]])
+            order = np.argsort(t, kind="mergesort")
+            t, v = t[order], v[order]
+            keep = np.ones(len(t), dtype=bool)
+            keep[1:] = t[1:] != t[:-1]
+            t, v = t[keep], v[keep]
+        # baldes de borda podem trazer pontos fora do intervalo
+        m = np.ones(len(t), dtype=bool)
+        if start is not None:
+            m &= t >= start
+        if end is not None:
+            m &= t <= end
+        t, v = t[m], v[m]
+        return lttb(t, v, budget) if method == "lttb" else minmax(t, v, budget)
+
+
+class DownsampleStore:
+    """Uma piramide por sensor, alimentada pelo leitor incremental (subscribe)."""
+
+    def __init__(self, columns=None, factor: int = FACTOR, capacity: int = LEVEL_CAPACITY):
+        self.columns = list(columns or SENSOR_COLS)
+        self.pyramids = {c: SeriesPyramid(factor, capacity) for c in self.columns}
+        self._lock = threading.Lock()
+
+    def on_rows(self, new: pd.DataFrame, reset: bool = False):
+        with self._lock:
+            if reset:
+                for p in self.pyramids.values():
+                    p.reset()
+            if new is None or new.empty:
+                return
+            ts = pd.to_datetime(new["ts"], errors="coerce")
+            for c, p in self.pyramids.items():
+                if c not in new.columns:
+                    continue
+                v = pd.to_numeric(new[c], errors="coerce")
+                ok = (ts.notna() & v.notna()).to_numpy()
+                t = _as_ns(ts[ok])
+                vals = v.to_numpy(dtype=float)[ok]
+                order = np.argsort(t, kind="mergesort")
+                p.extend(t[order], vals[order])
+
+    def frame(self, col: str, start=None, end=None, budget: int = 1000, method: str = "minmax") -> pd.DataFrame:
+        """DataFrame indexado por ts pronto para st.line_chart."""
+        s = None if start is None else pd.Timestamp(start).value
+        e = None if end is None else pd.Timestamp(end).value
+        with self._lock:
+            t, v = self.pyramids[col].query(s, e, budget, method)
+        return pd.DataFrame({col: v}, index=pd.DatetimeIndex(pd.to_datetime(t), name="ts"))
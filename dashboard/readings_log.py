@@ -0,0 +1,363 @@
+import io
+import os
+import re
+import csv
+import threading
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+# Colunas canonicas das leituras (mesma ordem do ingest/readings.csv)
+READING_COLS = ["ts", "temperature", "vibration", "luminosity", "air_q"]
+TS_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+DEFAULT_DEVICE = "esp32-01"
+
+
+# ===================== Schema =====================
+def parse_ts(values: pd.Series) -> pd.Series:
+    # parse elemento a elemento (ISO8601 e, se falhar, formato livre) para que
+    # um trecho do arquivo resulte no mesmo valor que o arquivo inteiro
+    ts = pd.to_datetime(values, errors="coerce", format="ISO8601")
+    bad = ts.isna() & values.notna()
+    if bad.any():
+        ts[bad] = pd.to_datetime(values[bad], errors="coerce", format="mixed")
+    return ts
+
+def map_cols(df: pd.DataFrame) -> pd.DataFrame:
+    rename_map = {
+        "ts":"ts","temperature":"temperature","vibration":"vibration","luminosity":"luminosity","air_q":"air_q",
+        "TS":"ts","TEMPERATURE":"temperature","VIBRATION":"vibration","LUMINOSITY":"luminosity","AIR_Q":"air_q",
+        "TEMPERATURA":"temperature","VIBRACAO":"vibration","LUMINOSIDADE":"luminosity","QUALIDADE_AR":"air_q",
+        "timestamp":"ts","datahora":"ts"
+    }
+    df = df.rename(columns={c: rename_map.get(c, c) for c in df.columns})
+    for c in READING_COLS:
+        if c not in df.columns:
+            df[c] = np.nan
+    df["ts"] = parse_ts(df["ts"])
+    return df
+
+def normalize_cols(df: pd.DataFrame) -> pd.DataFrame:
+    return map_cols(df).sort_values("ts")
+
+
+# ===================== Helpers de arquivo =====================
+def read_last_lines(path: str, n: int, block_size: int = 8192) -> list:
+    """
+    Le as ultimas n linhas de um arquivo texto lendo blocos a partir do fim.
+    O custo depende de n (e do tamanho das linhas), nao do tamanho do arquivo.
+    """
+    if n <= 0 or not os.path.exists(path):
+        return []
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        data = b""
+        pos = end
+        while pos > 0 and data.count(b"\n") <= n:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+    lines = data.decode("utf-8", errors="replace").splitlines()
+    if pos > 0:
+        # a primeira linha do bloco pode estar cortada ao meio
+        lines = lines[1:]
+    return lines[-n:]
+
+
+# ===================== Particoes por dispositivo =====================
+def safe_name(device_id: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", str(device_id))
+
+def partition_path(base_path: str, device_id: str = None) -> str:
+    """
+    CSV de um dispositivo. O dispositivo padrao continua em base_path
+    (ingest/readings.csv); os demais ficam em <base sem extensao>/<device>.csv.
+    """
+    if not device_id or device_id == DEFAULT_DEVICE:
+        return base_path
+    root, ext = os.path.splitext(base_path)
+    return os.path.join(root, safe_name(device_id) + (ext or ".csv"))
+
+def list_devices(base_path: str) -> list:
+    """Dispositivos com particao em disco (o padrao primeiro)."""
+    devices = [DEFAULT_DEVICE] if os.path.exists(base_path) else []
+    root, ext = os.path.splitext(base_path)
+    if os.path.isdir(root):
+        devices += sorted(os.path.splitext(f)[0] for f in os.listdir(root)
+                          if f.endswith(ext or ".csv") and os.path.splitext(f)[0] != DEFAULT_DEVICE)
+    return devices
+
+def read_device_tails(base_path: str, n: int, devices=None) -> pd.DataFrame:
+    """Ultimas n leituras de cada dispositivo, num unico frame com a coluna device_id."""
+    parts = []
+    for dev in devices if devices is not None else list_devices(base_path):
+        path = partition_path(base_path, dev)
+        if os.path.exists(path):
+            parts.append(normalize_cols(read_tail_csv(path, n)).assign(device_id=dev))
+    if not parts:
+        return pd.DataFrame(columns=READING_COLS + ["device_id"])
+    return pd.concat(parts, ignore_index=True)
+
+
+def read_tail_csv(path: str, n: int) -> pd.DataFrame:
+    """Ultimas n linhas de um CSV (com o cabecalho), sem ler o arquivo inteiro."""
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        header = f.readline().rstrip("\r\n")
+    lines = [l for l in read_last_lines(path, n + 1) if l.strip() and l != header][-n:]
+    return pd.read_csv(io.StringIO("\n".join([header] + lines)))
+
+
+def _format_value(v):
+    if v is None:
+        return ""
+    if isinstance(v, (pd.Timestamp, np.datetime64)):
+        return pd.Timestamp(v).strftime(TS_FORMAT)
+    if isinstance(v, float) and np.isnan(v):
+        return ""
+    if isinstance(v, np.generic):
+        v = v.item()
+        if isinstance(v, float) and np.isnan(v):
+            return ""
+    return v
+
+
+# ===================== Escrita append-only =====================
+class ReadingsAppender:
+    """
+    Escrita append-only de leituras em CSV.
+
+    Cada chamada a append() grava apenas as linhas novas no fim do arquivo
+    (custo O(linhas novas), independente do tamanho do historico) e atualiza
+    uma cauda em memoria (deque com tamanho fixo) com as mesmas linhas.
+    A ordem das colunas e o terminador de linha seguem o cabecalho ja
+    existente no arquivo.
+    """
+
+    def __init__(self, path: str, columns=None, tail_size: int = 500):
+        self.path = path
+        self.columns = list(columns or READING_COLS)
+        self.lineterminator = "\n"
+        self.tail = deque(maxlen=tail_size)
+        self._lock = threading.Lock()
+        self._needs_newline = False
+        self._open_file()
+
+    def _open_file(self):
+        parent = os.path.dirname(self.path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            with open(self.path, "w", newline="", encoding="utf-8") as f:
+                csv.writer(f, lineterminator=self.lineterminator).writerow(self.columns)
+            return
+
+        with open(self.path, "r", newline="", encoding="utf-8") as f:
+            first = f.readline()
+        if first.endswith("\r\n"):
+            self.lineterminator = "\r\n"
+        header = next(csv.reader([first.rstrip("\r\n")]), [])
+        if header:
+            self.columns = header
+
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            self._needs_newline = f.read(1) != b"\n"
+
+        # semeia a cauda com o fim do arquivo para ficar em sincronia
+        for line in read_last_lines(self.path, self.tail.maxlen):
+            if line.strip() and line.rstrip("\r") != first.rstrip("\r\n"):
+                values = next(csv.reader([line]))
+                self.tail.append(dict(zip(self.columns, values)))
+
+    def append(self, rows) -> int:
+        """Grava as linhas (lista de dicts ou DataFrame) no fim do arquivo."""
+        if isinstance(rows, pd.DataFrame):
+            rows = rows.to_dict("records")
+        rows = [dict(r) for r in rows]
+        if not rows:
+            return 0
+        with self._lock:
+            with open(self.path, "a", newline="", encoding="utf-8") as f:
+                if self._needs_newline:
+                    f.write(self.lineterminator)
+                    self._needs_newline = False
+                w = csv.writer(f, lineterminator=self.lineterminator)
+                for r in rows:
+                    w.writerow([_format_value(r.get(c)) for c in self.columns])
+            self.tail.extend(rows)
+        return len(rows)
+
+    def tail_frame(self, n: int = None) -> pd.DataFrame:
+        """Ultimas n linhas gravadas (sem reler o arquivo)."""
+        with self._lock:
+            rows = list(self.tail)
+        if n is not None:
+            rows = rows[-n:]
+        out = pd.DataFrame(rows, columns=self.columns)
+        # linhas semeadas do arquivo chegam como texto
+        for c in out.columns:
+            if c == "ts":
+                out[c] = pd.to_datetime(out[c], errors="coerce")
+            else:
+                out[c] = pd.to_numeric(out[c], errors="coerce")
+        return out
+
+
+class PartitionedAppender:
+    """
+    Roteia as linhas para o CSV do seu dispositivo (coluna device_id; sem ela,
+    DEFAULT_DEVICE), com um ReadingsAppender por particao.
+    """
+
+    def __init__(self, base_path: str, tail_size: int = 500):
+        self.path = base_path
+        self.tail_size = tail_size
+        self.appenders = {}
+
+    def get(self, device_id: str = DEFAULT_DEVICE) -> ReadingsAppender:
+        app = self.appenders.get(device_id)
+        if app is None or not os.path.exists(app.path):
+            app = ReadingsAppender(partition_path(self.path, device_id), tail_size=self.tail_size)
+            self.appenders[device_id] = app
+        return app
+
+    def append(self, rows, device_id: str = DEFAULT_DEVICE) -> int:
+        df = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame([dict(r) for r in rows])
+        if df.empty:
+            return 0
+        if "device_id" not in df.columns:
+            return self.get(device_id).append(df)
+        devs = df["device_id"].fillna(device_id)
+        total = 0
+        for dev, part in df.drop(columns="device_id").groupby(devs, sort=False):
+            total += self.get(dev).append(part)
+        return total
+
+
+# ===================== Leitura incremental =====================
+class IncrementalCsvReader:
+    """
+    Leitor incremental do CSV de leituras.
+
+    Guarda o offset (em bytes) ate onde o arquivo ja foi lido e o cabecalho
+    mapeado. Em cada refresh() le apenas as linhas completas adicionadas
+    depois desse offset, normaliza so elas e avisa os ouvintes. O arquivo so
+    e relido por completo quando for truncado, rotacionado (outro inode) ou
+    tiver o cabecalho trocado.
+
+    Com keep_frame=True os lotes novos ficam numa lista e so sao juntados (e
+    ordenados por ts, se algum chegou fora de ordem) quando `frame` e lido:
+    um refresh() continua custando so as linhas novas.
+
+    Com keep_frame=False o historico nao fica em memoria: as linhas so passam
+    pelos ouvintes (ex.: RingBuffer, AggregateStore) e o frame fica vazio.
+    """
+
+    def __init__(self, path: str, keep_frame: bool = True):
+        self.path = path
+        self.keep_frame = keep_frame
+        self.rows = 0
+        self.offset = 0
+        self.header = b""
+        self.columns = []
+        self._frame = None
+        self._pending = []
+        self._in_order = True
+        self._last_ts = pd.NaT
+        self._ident = None
+        self._lock = threading.Lock()
+        self._listeners = []
+
+    def subscribe(self, fn):
+        """
+        Registra fn(novas_linhas, reset) chamado a cada leitura: reset=True com
+        o frame inteiro apos uma releitura completa, False so com as linhas novas.
+        """
+        self._listeners.append(fn)
+        if self.frame is not None:
+            fn(self.frame, True)
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        """Historico normalizado e ordenado por ts (None antes do primeiro refresh)."""
+        if self._pending:
+            merged = pd.concat([self._frame] + self._pending) if len(self._frame) else pd.concat(self._pending)
+            if not self._in_order:
+                merged = merged.sort_values("ts", kind="mergesort")
+            self._frame, self._pending, self._in_order = merged, [], True
+            self._last_ts = merged["ts"].iloc[-1]
+        return self._frame
+
+    def _notify(self, rows: pd.DataFrame, reset: bool):
+        for fn in self._listeners:
+            fn(rows, reset)
+
+    def _parse(self, data: bytes, names=None) -> pd.DataFrame:
+        if names is None:
+            return pd.read_csv(io.BytesIO(data))
+        return pd.read_csv(io.BytesIO(data), header=None, names=names)
+
+    def _full_load(self, st):
+        with open(self.path, "rb") as f:
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        self.header = data[:data.find(b"\n") + 1] if end else b""
+        if end:
+            raw = self._parse(data[:end])
+            self.columns = list(raw.columns)
+        else:
+            raw = pd.DataFrame(columns=READING_COLS)
+            self.columns = []
+        frame = normalize_cols(raw)
+        self.offset = end
+        self.rows = len(frame)
+        self._ident = (st.st_dev, st.st_ino)
+        self._notify(frame, True)
+        self._frame = frame if self.keep_frame else frame.iloc[:0]
+        self._pending, self._in_order = [], True
+        self._last_ts = frame["ts"].iloc[-1] if len(self._frame) else pd.NaT
+
+    def _header_changed(self) -> bool:
+        with open(self.path, "rb") as f:
+            return f.read(len(self.header)) != self.header
+
+    def _merge(self, new: pd.DataFrame):
+        n = self.rows
+        new.index = pd.RangeIndex(n, n + len(new))
+        new = map_cols(new)
+        self.rows += len(new)
+        if not self.keep_frame:
+            self._notify(new, False)
+            return
+        # so marca se vai precisar ordenar; a juncao fica para quando `frame` for lido
+        last_ts = self._last_ts
+        in_order = (n == 0 or pd.notna(last_ts)) and new["ts"].notna().all() \
+            and new["ts"].is_monotonic_increasing and (n == 0 or new["ts"].iloc[0] >= last_ts)
+        self._in_order = self._in_order and in_order
+        self._last_ts = new["ts"].iloc[-1] if in_order else pd.NaT
+        self._pending.append(new)
+        self._notify(new, False)
+
+    def refresh(self) -> int:
+        """Le so o que foi anexado e avisa os ouvintes; devolve o numero de linhas lidas."""
+        with self._lock:
+            before = self.rows
+            st = os.stat(self.path)
+            if (self._frame is None or (st.st_dev, st.st_ino) != self._ident
+                    or st.st_size < self.offset or not self.header or self._header_changed()):
+                self._full_load(st)
+                return self.rows
+            elif st.st_size > self.offset:
+                with open(self.path, "rb") as f:
+                    f.seek(self.offset)
+                    data = f.read(st.st_size - self.offset)
+                end = data.rfind(b"\n") + 1
+                if end:
+                    chunk = data[:end]
+                    if chunk.strip():
+                        self._merge(self._parse(chunk, names=self.columns))
+                    self.offset += end
+            return self.rows - before
@@ -0,0 +1,125 @@
+"""
+Ultimas leituras de um dispositivo em memoria de tamanho fixo.
+
+O leitor incremental mantinha o historico inteiro num DataFrame e o crescia com
+pd.concat (copia tudo a cada lote). O painel ao vivo so precisa da janela
+recente (alertas, ultimas linhas) e dos agregados/piramides, que ja sao
+alimentados pelo mesmo leitor. RingBuffer guarda as ultimas `capacity` linhas
+num array NumPy pre-alocado por coluna (ts, temperature, vibration, luminosity,
+air_q); a memoria do buffer nao cresce com o turno. (Os agregados e as
+piramides tambem sao limitados: ver DeviceFeed em shared_state.py.)
+
+Cada valor e gravado duas vezes (posicao i e i + capacity), entao as ultimas n
+linhas sempre formam uma fatia contigua: window(n) devolve views somente
+leitura, sem copia, mesmo depois de o buffer dar a volta.
+
+Os lotes ficam em ordem de chegada. O buffer anota onde o ts voltou para tras
+(lote atrasado); enquanto esse ponto estiver na janela, since() filtra por
+mascara em vez de fazer busca binaria.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+from readings_log import READING_COLS
+
+DEFAULT_CAPACITY = 10_000
+
+
+class RingBuffer:
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, columns=None):
+        self.capacity = int(capacity)
+        self.columns = list(columns or READING_COLS)
+        self._data = {c: np.empty(2 * self.capacity, dtype="datetime64[ns]" if c == "ts" else float)
+                      for c in self.columns}
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self._end = 0      # proxima posicao de escrita, em [0, capacity)
+        self.size = 0      # linhas guardadas (<= capacity)
+        self.total = 0     # linhas recebidas desde o ultimo reset
+        self._break = 0    # indice (em total) da ultima linha com ts menor que a anterior
+
+    def __len__(self):
+        return self.size
+
+    def on_rows(self, new: pd.DataFrame, reset: bool = False):
+        """Callback para o leitor incremental (mesmo contrato do AggregateStore)."""
+        with self._lock:
+            if reset:
+                self.reset()
+            self._append(new)
+
+    def append(self, new: pd.DataFrame):
+        with self._lock:
+            self._append(new)
+
+    def _append(self, new: pd.DataFrame):
+        if new is None or new.empty:
+            return
+        self.total += len(new)
+        # ordem de chegada entre lotes; dentro do lote, por ts (como o frame do leitor)
+        if "ts" in new.columns and not new["ts"].is_monotonic_increasing:
+            new = new.sort_values("ts", kind="mergesort")
+        new = new.iloc[-self.capacity:]
+        m = len(new)
+        if self.size and "ts" in self._data:
+            prev = self._data["ts"][self._end + self.capacity - 1]
+            first = pd.to_datetime(new["ts"].iloc[:1], errors="coerce").to_numpy(dtype="datetime64[ns]")[0] \
+                if "ts" in new.columns else np.datetime64("NaT")
+            if np.isnat(prev) or np.isnat(first) or first < prev:
+                self._break = self.total - m
+        pos = (self._end + np.arange(m)) % self.capacity
+        for c, arr in self._data.items():
+            if c not in new.columns:
+                values = np.full(m, np.datetime64("NaT") if c == "ts" else np.nan, dtype=arr.dtype)
+            elif c == "ts":
+                values = pd.to_datetime(new[c], errors="coerce").to_numpy(dtype="datetime64[ns]")
+            else:
+                values = pd.to_numeric(new[c], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+            arr[pos] = values
+            arr[pos + self.capacity] = values
+        self._end = (self._end + m) % self.capacity
+        self.size = min(self.size + m, self.capacity)
+
+    # ===================== Consultas =====================
+    def window(self, n: int = None) -> dict:
+        """
+        {coluna: array} das ultimas n linhas (todas se None), em ordem. Sao views
+        do buffer, sem copia: validas ate o proximo lote (copie para guardar).
+        """
+        with self._lock:
+            n = self.size if n is None else max(0, min(int(n), self.size))
+            stop = self._end + self.capacity
+            out = {}
+            for c, arr in self._data.items():
+                view = arr[stop - n:stop]
+                view.flags.writeable = False
+                out[c] = view
+            return out
+
+    def since(self, start) -> dict:
+        """
+        Como window(), so com as linhas de ts >= start. Com a janela em ordem de
+        ts faz busca binaria (views); se um lote atrasado ainda esta na janela,
+        filtra por mascara (copias, na ordem de chegada).
+        """
+        with self._lock:
+            ordered = self._break <= self.total - self.size
+        w = self.window()
+        start = np.datetime64(pd.Timestamp(start), "ns")
+        if not ordered:
+            keep = w["ts"] >= start
+            return {c: v[keep] for c, v in w.items()}
+        i = np.searchsorted(w["ts"], start, "left")
+        return {c: v[i:] for c, v in w.items()}
+
+    def frame(self, n: int = None) -> pd.DataFrame:
+        """DataFrame das ultimas n linhas (copia pequena, para APIs que pedem pandas)."""
+        return pd.DataFrame(self.window(n))
+
+    @property
+    def last_ts(self):
+        return pd.Timestamp(self._data["ts"][self._end + self.capacity - 1]) if self.size else None
@@ -0,0 +1,81 @@
+"""
+Estado compartilhado por todas as sessoes do dashboard no mesmo processo.
+
+Cada aba aberta do Streamlit e uma sessao; se cada uma tiver o seu leitor, o
+mesmo CSV e normalizado e mantido em memoria uma vez por espectador. Aqui ha
+um DeviceFeed por dispositivo (leitor incremental + ultimas linhas em
+RingBuffer + agregados + piramides do grafico + ultimas leituras pontuadas),
+guardado num SharedRegistry que o app cria uma vez por processo
+(st.cache_resource).
+
+Invalidacao explicita: cada entrada guarda um token (ex.: inode/mtime do
+arquivo do banco ou do ponteiro ATUAL dos modelos); quando o token calculado
+na sessao difere do guardado, a entrada e reconstruida. Linhas novas nao
+invalidam nada: o leitor so le o que foi anexado e avisa os ouvintes.
+"""
+import os
+import threading
+
+from aggregates import AggregateStore
+from downsample import DownsampleStore
+from ring_buffer import RingBuffer, DEFAULT_CAPACITY
+
+
+def file_token(path: str):
+    """(inode, mtime em ns) do arquivo; None se nao existir."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns)
+
+
+class DeviceFeed:
+    """
+    Frame normalizado de um dispositivo e as estruturas alimentadas por ele.
+
+    O leitor deve ser criado com keep_frame=False: as ultimas `capacity` linhas
+    ficam no RingBuffer e o resto do historico so nos agregados (baldes com
+    retencao, ver aggregates.RESOLUTIONS) e nas piramides (no maximo `capacity`
+    entradas por nivel; o passado distante so nos niveis grossos). Leituras
+    de ring/agg/pyr/scored devem ser feitas dentro de `with feed.lock:` para
+    nao verem uma atualizacao pela metade.
+    """
+
+    def __init__(self, reader, scored=None, lock=None, capacity: int = DEFAULT_CAPACITY):
+        # lock: o mesmo para os feeds que dividem um OnlineScorer (ele tem estado mutavel)
+        self.reader = reader
+        self.ring = RingBuffer(capacity)
+        self.agg, self.pyr = AggregateStore(), DownsampleStore(capacity=capacity)
+        self.scored = scored
+        self.lock = lock or threading.RLock()
+        reader.subscribe(self.ring.on_rows)
+        reader.subscribe(self.agg.on_rows)
+        reader.subscribe(self.pyr.on_rows)
+        if scored is not None:
+            reader.subscribe(scored.on_rows)
+
+    def refresh(self) -> RingBuffer:
+        """Le so as linhas novas (uma vez, para todas as sessoes) e devolve o buffer."""
+        with self.lock:
+            self.reader.refresh()
+            return self.ring
+
+
+class SharedRegistry:
+    """Objetos por chave, reconstruidos quando o token de invalidacao muda."""
+
+    def __init__(self):
+        self._items = {}
+        # reentrante: build() pode pedir outra entrada (ex.: o feed pede o scorer)
+        self.lock = threading.RLock()
+
+    def get(self, key, token, build):
+        with self.lock:
+            entry = self._items.get(key)
+            if entry is None or entry[0] != token:
+                entry = self._items[key] = (token, build())
+            return entry[1]
+
+    def __len__(self):
+        return len(self._items)
@@ -0,0 +1,16 @@
+"""
+Leituras simuladas (as mesmas do botao "Gerar leitura" do dashboard),
+compartilhadas com o gerador de carga do ingest (ingest/loadgen.py).
+"""
+import numpy as np
+import pandas as pd
+
+
+def healthy_reading(ts=None):
+    return {
+        "ts": ts or pd.Timestamp.now(),
+        "temperature": np.random.normal(28.0, 0.8),
+        "vibration":   max(0.0, np.random.normal(0.25, 0.06)),
+        "luminosity":  int(np.random.normal(550, 35)),
+        "air_q":       int(np.clip(np.random.normal(82, 3), 0, 100))
+    }
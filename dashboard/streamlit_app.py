@@ -1,13 +1,34 @@
 import os
+import sys
 import pandas as pd
 import numpy as np
 import streamlit as st
+from streamlit.errors import StreamlitAPIException
 import random
 
+# raiz do repositorio no path para importar db.storage
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+import alert_engine
+from alert_state import AlertStateStore, STATUS_OPEN
+from readings_log import (DEFAULT_DEVICE, PartitionedAppender, IncrementalCsvReader, read_tail_csv,
+                          read_device_tails, list_devices, partition_path)
+from downsample import METHODS
+from simulation import healthy_reading
+from shared_state import DeviceFeed, SharedRegistry, file_token
+from ml.scoring_online import OnlineScorer, UltimasPontuadas
+
 # ===================== Config =====================
 st.set_page_config(page_title="HERMIA - Dashboard", layout="wide")
 CSV_PATH   = "ingest/readings.csv"
 ALERTS_LOG = "dashboard/alerts.csv"
+# Backend das leituras: "csv" (padrao) ou "sqlite" (db/storage.py, arquivo em DB_PATH)
+BACKEND    = os.environ.get("HERMIA_BACKEND", "csv")
+DB_PATH    = os.environ.get("HERMIA_DB", "db/hermia.db")
+# Modelos versionados do pipeline (ml/modelos.py); sem modelo, so as regras
+MODELOS_DIR = os.environ.get("HERMIA_MODELOS", "ml/modelos")
 
 # --- Parametros de estabilidade (anti-alarme falso) ---
 WINDOW = 5          # tamanho da janela para avaliar persistencia
@@ -19,26 +40,49 @@ HYST = {
     "temperature":2.0
 }
 
+# Regras que abrem/fecham alertas e gravam o alerts.csv: fixas no servidor, iguais
+# para todas as sessoes (o estado dos alertas e compartilhado entre elas). Limiar
+# ("0.8") ou faixa ("300,800"); vazio desliga a regra. Os controles da barra
+# lateral so mudam o que cada sessao ve.
+def env_limit(name: str, default: str):
+    raw = os.environ.get(name, default).strip()
+    if not raw:
+        return None
+    # inteiros ficam int: o texto das regras no log e o mesmo de antes ("air_q<=60")
+    parts = tuple(int(v) if v.is_integer() else v for v in map(float, raw.split(",")))
+    return parts if len(parts) == 2 else parts[0]
+
+ALERT_LIMITS = {
+    "vibration":   env_limit("HERMIA_ALERT_VIB", "0.8"),
+    "air_q":       env_limit("HERMIA_ALERT_AIR", "60"),
+    "luminosity":  env_limit("HERMIA_ALERT_LUX", ""),
+    "temperature": env_limit("HERMIA_ALERT_TEMP", ""),
+}
+ALERT_RULES = alert_engine.default_rules(ALERT_LIMITS["vibration"], ALERT_LIMITS["air_q"],
+                                         ALERT_LIMITS["luminosity"], ALERT_LIMITS["temperature"], hyst=HYST)
+
+# Periodos do grafico (a partir da ultima leitura); None = historico inteiro
+PERIODS = {"1h": "1h", "24h": "24h", "7 dias": "7D", "30 dias": "30D", "Tudo": None}
+# Modo ao vivo: intervalo padrao (s) entre verificacoes de dados novos
+LIVE_EVERY = 2
+# Leituras recentes mantidas em memoria por dispositivo (RingBuffer); o historico
+# completo so existe nos agregados e nas piramides do grafico
+RING_CAPACITY = 10_000
+
 # ===================== Utils ======================
-def normalize_cols(df: pd.DataFrame) -> pd.DataFrame:
-    rename_map = {
-        "ts":"ts","temperature":"temperature","vibration":"vibration","luminosity":"luminosity","air_q":"air_q",
-        "TS":"ts","TEMPERATURE":"temperature","VIBRATION":"vibration","LUMINOSITY":"luminosity","AIR_Q":"air_q",
-        "TEMPERATURA":"temperature","VIBRACAO":"vibration","LUMINOSIDADE":"luminosity","QUALIDADE_AR":"air_q",
-        "timestamp":"ts","datahora":"ts"
-    }
-    df = df.rename(columns={c: rename_map.get(c, c) for c in df.columns})
-    for c in ["ts","temperature","vibration","luminosity","air_q"]:
-        if c not in df.columns:
-            df[c] = np.nan
-    df["ts"] = pd.to_datetime(df["ts"], errors="coerce")
-    return df.sort_values("ts")
+def limit_default(rule: str, fallback, lo, hi, cast):
+    """Valor inicial do controle da barra lateral: o limite do servidor, dentro da faixa do slider."""
+    v = ALERT_LIMITS[rule]
+    if v is None:
+        return fallback
+    clip = lambda x: cast(min(max(x, lo), hi))
+    return tuple(map(clip, v)) if isinstance(v, tuple) else clip(v)
 
 def ensure_dirs():
     os.makedirs(os.path.dirname(CSV_PATH), exist_ok=True)
     os.makedirs(os.path.dirname(ALERTS_LOG), exist_ok=True)
 
-def load_csv() -> pd.DataFrame:
+def ensure_csv():
     ensure_dirs()
     if not os.path.exists(CSV_PATH):
         ts = pd.date_range(end=pd.Timestamp.now(), periods=50, freq="min")
@@ -50,23 +94,81 @@ def load_csv() -> pd.DataFrame:
             "air_q": np.random.randint(50, 100, size=50)
         })
         demo.to_csv(CSV_PATH, index=False)
-    return normalize_cols(pd.read_csv(CSV_PATH))
 
-def save_csv(df: pd.DataFrame):
-    ensure_dirs()
-    df.to_csv(CSV_PATH, index=False)
-
-def save_alert(regra: str, valor: float, severidade: str = "alta"):
-    ensure_dirs()
-    cols = ["ts","device_id","regra","valor","severidade","canal","status"]
-    if not os.path.exists(ALERTS_LOG):
-        pd.DataFrame(columns=cols).to_csv(ALERTS_LOG, index=False)
-    log = pd.read_csv(ALERTS_LOG)
-    log.loc[len(log)] = [
-        pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "esp32-01", regra, round(float(valor or 0), 3), severidade, "whatsapp", "registrado"
-    ]
-    log.to_csv(ALERTS_LOG, index=False)
+def list_all_devices() -> list:
+    if BACKEND == "sqlite":
+        return get_store().devices() or [DEFAULT_DEVICE]
+    ensure_csv()
+    return list_devices(CSV_PATH)
+
+def new_reader(device: str):
+    # leitor incremental so da particao do dispositivo: em cada rerun so as linhas novas sao lidas;
+    # o historico nao fica num DataFrame (ver DeviceFeed: RingBuffer + agregados)
+    if BACKEND == "sqlite":
+        from db.storage import IncrementalSqliteReader
+        return IncrementalSqliteReader(get_store(), device, keep_frame=False)
+    ensure_csv()
+    return IncrementalCsvReader(partition_path(CSV_PATH, device), keep_frame=False)
+
+# Tudo abaixo e compartilhado pelas sessoes do processo (shared_state.py): com
+# varias abas abertas o CSV e lido, normalizado e mantido em memoria uma vez so.
+@st.cache_resource(show_spinner=False)
+def shared() -> SharedRegistry:
+    return SharedRegistry()
+
+def models_token():
+    # muda quando o pipeline publica outra versao (ATUAL e regravado)
+    return file_token(os.path.join(MODELOS_DIR, "ATUAL"))
+
+def get_scorer():
+    # IsolationForest online carregado uma vez por processo; None se nao houver modelo treinado
+    def build():
+        if not os.path.isdir(MODELOS_DIR):
+            return None
+        try:
+            return OnlineScorer(MODELOS_DIR)
+        except (FileNotFoundError, ValueError):
+            return None
+    return shared().get(("scorer", MODELOS_DIR), models_token(), build)
+
+def get_feed(device: str) -> DeviceFeed:
+    """Leitor, agregados, piramides do grafico e ultimas leituras pontuadas do dispositivo."""
+    def build():
+        # anomalias: so as leituras novas passam pelo IsolationForest
+        scorer = get_scorer()
+        scored = UltimasPontuadas(scorer) if scorer is not None else None
+        return DeviceFeed(new_reader(device), scored, lock=shared().lock, capacity=RING_CAPACITY)
+    if BACKEND == "sqlite":
+        key, token = ("feed", DB_PATH, device), (id(get_store()), models_token())
+    else:
+        key, token = ("feed", partition_path(CSV_PATH, device)), (None, models_token())
+    return shared().get(key, token, build)
+
+def get_appender() -> PartitionedAppender:
+    # grava so as linhas novas, cada uma no CSV do seu dispositivo; recriado se o CSV for recriado
+    ensure_csv()
+    return shared().get(("appender", CSV_PATH), os.stat(CSV_PATH).st_ino,
+                        lambda: PartitionedAppender(CSV_PATH))
+
+def get_store():
+    # conexao SQLite (modo WAL; leitores nao bloqueiam o escritor)
+    def build():
+        from db.storage import SqliteStore
+        store = SqliteStore(DB_PATH)
+        if store.count_readings() == 0 and os.path.exists(CSV_PATH):
+            for dev in list_devices(CSV_PATH):
+                store.import_csv(partition_path(CSV_PATH, dev), device_id=dev)
+        return store
+    return shared().get(("sqlite", DB_PATH), None, build)
+
+def get_alert_store(device: str) -> AlertStateStore:
+    # estado dos alertas por dispositivo e regra; so as transicoes vao para o ALERTS_LOG
+    def build():
+        ensure_dirs()
+        sink = get_store().insert_alerts if BACKEND == "sqlite" else None
+        return AlertStateStore(ALERTS_LOG, device_id=device, sink=sink)
+    sink_token = id(get_store()) if BACKEND == "sqlite" else None
+    return shared().get(("alerts", ALERTS_LOG, device), sink_token, build)
 
 # ===================== App ========================
 st.title("HERMIA - Dashboard (Sprint 4)")
@@ -75,24 +177,38 @@ st.caption("KPIs + grafico + alertas com severidade + log de evidencias. Anti-al
 with st.sidebar:
     st.header("Configuracao")
 
+    device = st.selectbox("Dispositivo", list_all_devices(), key="device_select")
+
     serie = st.selectbox(
         "Serie para grafico",
         ["vibration", "air_q", "luminosity", "temperature"],
         key="serie_select",
     )
-
-    # Regras/limiares
-    use_vib = st.checkbox("Usar regra de vibracao (>=)", True, key="use_vib")
-    vib_thr  = st.slider("Threshold de vibracao (>=)", 0.0, 1.5, 0.8, 0.05, key="vib_thr")
-
-    use_air = st.checkbox("Usar regra de qualidade do ar (<=)", True, key="use_air")
-    air_thr  = st.slider("Threshold qualidade do ar (<=)", 0, 100, 60, 1, key="air_thr")
-
-    use_lux = st.checkbox("Usar regra de luminosidade (faixa)", False, key="use_lux")
-    lux_low, lux_high = st.slider("Faixa aceitavel (lux)", 200, 900, (300, 800), key="lux_range")
-
-    use_temp = st.checkbox("Usar regra de temperatura (faixa)", False, key="use_temp")
-    temp_low, temp_high = st.slider("Faixa aceitavel (C)", 10, 90, (20, 60), key="temp_range")
+    periodo = st.selectbox("Periodo do grafico", list(PERIODS), index=1, key="chart_period")
+    budget = st.slider("Pontos no grafico", 200, 5000, 1000, 100, key="chart_budget")
+    metodo = st.selectbox("Reducao de pontos", METHODS, key="chart_method",
+                          help="minmax preserva picos e vales; lttb preserva o formato da curva.")
+
+    # Regras/limiares (so exibicao: o estado e o log dos alertas seguem ALERT_LIMITS)
+    st.caption("Limiares de exibicao desta sessao. Alertas reconheciveis e o log usam os limites do "
+               "servidor (HERMIA_ALERT_*).")
+    use_vib = st.checkbox("Usar regra de vibracao (>=)", ALERT_LIMITS["vibration"] is not None, key="use_vib")
+    vib_thr  = st.slider("Threshold de vibracao (>=)", 0.0, 1.5,
+                         limit_default("vibration", 0.8, 0.0, 1.5, float), 0.05, key="vib_thr")
+
+    use_air = st.checkbox("Usar regra de qualidade do ar (<=)", ALERT_LIMITS["air_q"] is not None, key="use_air")
+    air_thr  = st.slider("Threshold qualidade do ar (<=)", 0, 100,
+                         limit_default("air_q", 60, 0, 100, int), 1, key="air_thr")
+
+    use_lux = st.checkbox("Usar regra de luminosidade (faixa)", ALERT_LIMITS["luminosity"] is not None,
+                          key="use_lux")
+    lux_low, lux_high = st.slider("Faixa aceitavel (lux)", 200, 900,
+                                  limit_default("luminosity", (300, 800), 200, 900, int), key="lux_range")
+
+    use_temp = st.checkbox("Usar regra de temperatura (faixa)", ALERT_LIMITS["temperature"] is not None,
+                           key="use_temp")
+    temp_low, temp_high = st.slider("Faixa aceitavel (C)", 10, 90,
+                                    limit_default("temperature", (20, 60), 10, 90, int), key="temp_range")
 
     st.divider()
     gen_mode = st.selectbox(
@@ -108,18 +224,18 @@ with st.sidebar:
     with colB:
         force_spike = st.button("Forcar alerta (ALTA)", key="force_spike")
 
-# ---------- Dados ----------
-df = load_csv()
+    st.divider()
+    live = st.toggle("Ao vivo", False, key="live",
+                     help="KPIs, grafico e alertas se atualizam sozinhos quando chega leitura nova, "
+                          "sem reexecutar o resto da pagina.")
+    live_every = st.slider("Verificar a cada (s)", 1, 30, LIVE_EVERY, 1, key="live_every", disabled=not live)
 
 # ---------- Helpers de geracao ----------
-def healthy_reading(ts=None):
-    return {
-        "ts": ts or pd.Timestamp.now(),
-        "temperature": np.random.normal(28.0, 0.8),
-        "vibration":   max(0.0, np.random.normal(0.25, 0.06)),
-        "luminosity":  int(np.random.normal(550, 35)),
-        "air_q":       int(np.clip(np.random.normal(82, 3), 0, 100))
-    }
+# As leituras geradas violam os limites do servidor (os que abrem alertas); regra
+# desligada no servidor usa o valor da barra lateral
+GEN_LIMITS = {rule: ALERT_LIMITS[rule] if ALERT_LIMITS[rule] is not None else value
+              for rule, value in [("vibration", vib_thr), ("air_q", air_thr),
+                                  ("luminosity", (lux_low, lux_high)), ("temperature", (temp_low, temp_high))]}
 
 def apply_severity_to_rule(base, rule, severity):
     """
@@ -127,6 +243,8 @@ def apply_severity_to_rule(base, rule, severity):
     - 'baixa' fica logo apos a histerese (conta como violacao), mas com distancia pequena.
     - 'media' e 'alta' mais distantes.
     """
+    vib_thr, air_thr = GEN_LIMITS["vibration"], GEN_LIMITS["air_q"]
+    (lux_low, lux_high), (temp_low, temp_high) = GEN_LIMITS["luminosity"], GEN_LIMITS["temperature"]
     b = dict(base)
     if rule == "vibration":
         if severity == "baixa":  b["vibration"] = float(vib_thr) + HYST["vibration"] + 0.01   # ~0.06 acima
@@ -161,17 +279,14 @@ def apply_severity_to_rule(base, rule, severity):
     return b
 
 def pick_enabled_rules():
-    rules = []
-    if use_vib:  rules.append("vibration")
-    if use_air:  rules.append("air_q")
-    if use_lux:  rules.append("luminosity")
-    if use_temp: rules.append("temperature")
-    return rules
+    return [rule for rule, limit in ALERT_LIMITS.items() if limit is not None]
 
 def add_rows(rows):
-    global df
-    df = pd.concat([df, pd.DataFrame(rows)], ignore_index=True)
-    save_csv(df)
+    # append-only: nao reescreve o historico; o painel le as linhas novas depois das acoes
+    if BACKEND == "sqlite":
+        get_store().insert_readings(rows, device_id=device)
+    else:
+        get_appender().append(rows, device_id=device)
 
 # ---------- Acao: Gerar leitura ----------
 if gen_read:
@@ -218,119 +333,187 @@ if force_spike:
     add_rows(rows)
     st.toast("Spike ALTA inserido + leitura normal para estabilizar.")
 
-# ---------------- KPIs -------------------
-col1, col2, col3, col4 = st.columns(4)
-with col1: st.metric("Leituras", f"{len(df):,}".replace(",", "."))
-with col2: st.metric("Vibracao media", f"{df['vibration'].mean():.2f}")
-with col3: st.metric("Qualidade do ar media", f"{df['air_q'].mean():.1f}")
-with col4: st.metric("Modelo/Regra", "Regras combinadas (anti-alarme falso)")
-
-# --------------- Grafico -----------------
-st.subheader("Serie temporal")
-if not df.empty:
-    plot_df = df[["ts", serie]].dropna().set_index("ts").tail(500)
-    st.line_chart(plot_df)
-else:
-    st.info("Sem dados. Verifique ingest/readings.csv.")
-
-# ======== Alertas (janela + histerese + persistencia) ========
-st.subheader("Alertas")
-if not df.empty:
-    window_df = df.tail(WINDOW).copy()
-
-    def breach_vib(v):
-        if pd.isna(v): return False
-        return float(v) >= float(vib_thr) + HYST["vibration"]
-
-    def breach_air(a):
-        if pd.isna(a): return False
-        return float(a) <= float(air_thr) - HYST["air_q"]
-
-    def breach_range(val, low, high, key):
-        if pd.isna(val): return False
-        v = float(val)
-        return v < (low - HYST[key]) or v > (high + HYST[key])
-
-    count_vib = window_df["vibration"].apply(breach_vib).sum() if use_vib else 0
-    count_air = window_df["air_q"].apply(breach_air).sum()     if use_air else 0
-    count_lux = window_df["luminosity"].apply(lambda x: breach_range(x, lux_low, lux_high, "luminosity")).sum() if use_lux else 0
-    count_tmp = window_df["temperature"].apply(lambda x: breach_range(x, temp_low, temp_high, "temperature")).sum() if use_temp else 0
-
-    def sev_vibration(v):
-        if pd.isna(v): return None
-        dv = float(v) - float(vib_thr)
-        if dv < 0: return None
-        if dv >= 0.40: return "alta"
-        if dv >= 0.15: return "media"
-        return "baixa"
-
-    def sev_airq(a):
-        if pd.isna(a): return None
-        da = float(air_thr) - float(a)
-        if da < 0: return None
-        if da >= 25: return "alta"
-        if da >= 10: return "media"
-        return "baixa"
-
-    def sev_out_range(v, low, high, small, big):
-        if pd.isna(v): return None
-        v = float(v)
-        if low <= v <= high: return None
-        dist = (low - v) if v < low else (v - high)
-        if dist >= big:  return "alta"
-        if dist >= small:return "media"
-        return "baixa"
-
-    triggered_parts, severities = [], []
-    last = window_df.iloc[-1]
-
-    if use_vib and count_vib >= MIN_BREACHES:
-        s = sev_vibration(last.get("vibration"))
-        if s:
-            severities.append(s)
-            triggered_parts.append(f"vib>={vib_thr:g} (ult={float(last['vibration']):.2f}, {count_vib}/{WINDOW} viol.) sev={s}")
-
-    if use_air and count_air >= MIN_BREACHES:
-        s = sev_airq(last.get("air_q"))
-        if s:
-            severities.append(s)
-            triggered_parts.append(f"air_q<={air_thr:d} (ult={int(float(last['air_q']))}, {count_air}/{WINDOW} viol.) sev={s}")
-
-    if use_lux and count_lux >= MIN_BREACHES:
-        s = sev_out_range(last.get("luminosity"), lux_low, lux_high, small=120, big=250)
-        if s:
-            severities.append(s)
-            triggered_parts.append(f"lux fora [{lux_low},{lux_high}] (ult={int(float(last['luminosity']))}, {count_lux}/{WINDOW} viol.) sev={s}")
-
-    if use_temp and count_tmp >= MIN_BREACHES:
-        s = sev_out_range(last.get("temperature"), temp_low, temp_high, small=3.0, big=6.0)
-        if s:
-            severities.append(s)
-            triggered_parts.append(f"temp fora [{temp_low},{temp_high}] (ult={float(last['temperature']):.1f} C, {count_tmp}/{WINDOW} viol.) sev={s}")
-
-    LEVEL = {"baixa":1,"media":2,"alta":3}
-    overall = max(severities, key=lambda s: LEVEL[s]) if severities else None
-
-    if overall:
-        regra = " | ".join(triggered_parts)
-        if overall == "alta":
-            st.error(f"ALERTA ({overall}): {regra}")
-        elif overall == "media":
-            st.warning(f"ALERTA ({overall}): {regra}")
+# ---------- Painel (KPIs, grafico, alertas e log) ----------
+# No modo ao vivo so este fragmento roda de tempos em tempos. Cada execucao compara
+# uma assinatura barata dos dados (stat dos CSVs ou maior id do SQLite); sem
+# leitura nova nem mudanca de parametro, reaproveita o ultimo resultado sem reler
+# nada nem reavaliar os alertas.
+def data_version():
+    """Muda quando chega leitura (de qualquer dispositivo) ou transicao de alerta."""
+    if BACKEND == "sqlite":
+        return get_store().version()
+    sig = []
+    for path in [partition_path(CSV_PATH, d) for d in list_all_devices()] + [ALERTS_LOG]:
+        try:
+            s = os.stat(path)
+            sig.append((s.st_size, s.st_mtime_ns))
+        except FileNotFoundError:
+            sig.append(None)
+    return tuple(sig)
+
+def memo(name: str, key, compute):
+    """compute() so quando key muda; senao o ultimo resultado (por sessao)."""
+    cache = st.session_state.setdefault("_memo", {})
+    hit = cache.get(name)
+    if hit is None or hit[0] != key:
+        hit = cache[name] = (key, compute())
+    return hit[1]
+
+def compute_view() -> dict:
+    """Le as linhas novas e monta tudo o que o painel mostra."""
+    feed = get_feed(device)
+    # sob o lock do feed: outra sessao pode estar alimentando os mesmos agregados
+    with feed.lock:
+        return build_view(feed.refresh(), feed.agg, feed.pyr, feed.scored)
+
+def build_view(ring, agg, pyr, scored) -> dict:
+    view = {"empty": not len(ring), "plot": None, "windows": [], "active": {}, "custom_rules": False,
+            "others": [], "anomaly": None}
+
+    # ---------------- KPIs -------------------
+    if BACKEND == "sqlite":
+        view["kpi"] = get_store().kpis(device)
+    else:
+        view["kpi"] = {"n_readings": ring.total, "avg_vibration": agg.stats("vibration")["mean"],
+                       "avg_air_q": agg.stats("air_q")["mean"]}
+
+    if len(ring):
+        # --------------- Grafico -----------------
+        span = PERIODS[periodo]
+        start = agg.last_ts - pd.Timedelta(span) if span and agg.last_ts is not None else None
+        view["plot"] = pyr.frame(serie, start=start, budget=budget, method=metodo)
+        if agg.last_ts is not None:
+            view["windows"] = [(label, agg.window_stats(serie, agg.last_ts - pd.Timedelta(span)))
+                               for label, span in [("Ultima hora", "1h"), ("Ultimas 24h", "24h")]]
+
+        # ======== Alertas (janela + histerese + persistencia) ========
+        # estado compartilhado: so as regras do servidor abrem/fecham alertas e gravam o log
+        # todos os dispositivos numa unica avaliacao vetorizada (so a janela final de cada um)
+        others = [d for d in list_all_devices() if d != device]
+        if BACKEND == "sqlite":
+            tails = get_store().device_tails(WINDOW, others)
         else:
-            st.info(f"ALERTA ({overall}): {regra}")
-        valor_log = last.get("vibration")
-        if pd.isna(valor_log): valor_log = last.get("air_q")
-        if pd.isna(valor_log): valor_log = last.get("luminosity")
-        if pd.isna(valor_log): valor_log = last.get("temperature")
-        save_alert(regra, valor_log, severidade=overall)
+            tails = read_device_tails(CSV_PATH, WINDOW, others)
+        window = ring.frame(WINDOW)
+        tails = pd.concat([tails, window.assign(device_id=device)], ignore_index=True)
+        fleet = alert_engine.active_by_device(tails, ALERT_RULES, WINDOW, MIN_BREACHES)
+        for dev, dev_active in fleet.items():
+            get_alert_store(dev).update(dev_active)
+        view["others"] = [d for d in others if fleet.get(d)]
+
+        # o aviso do painel usa os limiares da sessao (so exibicao, nada e gravado)
+        rules = alert_engine.default_rules(
+            vib_thr  if use_vib  else None,
+            air_thr  if use_air  else None,
+            (lux_low, lux_high)   if use_lux  else None,
+            (temp_low, temp_high) if use_temp else None,
+            hyst=HYST,
+        )
+        view["custom_rules"] = rules != ALERT_RULES
+        view["active"] = (alert_engine.active_rules(window, rules, WINDOW, MIN_BREACHES) if view["custom_rules"]
+                          else fleet.get(device, {}))
+
+        # Anomalia (IsolationForest online, rank contra a referencia do treino)
+        if scored is not None and not scored.frame.empty:
+            recent = scored.frame.tail(WINDOW * 10)
+            view["anomaly"] = {"last": scored.frame.iloc[-1], "n": len(recent),
+                               "high": int(recent["criticidade"].isin(["Alto", "Crítico"]).sum()),
+                               "versao": scored.scorer.versao,
+                               "ms": scored.scorer.stats()["ms_por_leitura"]}
+
+    # --------------- Log ---------------------
+    if BACKEND == "sqlite":
+        view["log"] = get_store().last_alerts(20, device)
+    elif os.path.exists(ALERTS_LOG):
+        log = read_tail_csv(ALERTS_LOG, 200)
+        if "device_id" in log.columns:
+            log = log[log["device_id"] == device]
+        view["log"] = log.tail(20)
     else:
-        st.success("Sem alertas persistentes na janela recente.")
-
-# --------------- Log ---------------------
-if os.path.exists(ALERTS_LOG):
-    st.write("Log de alertas (evidencia):")
-    st.dataframe(pd.read_csv(ALERTS_LOG).tail(20), use_container_width=True)
+        view["log"] = None
+    return view
+
+@st.fragment(run_every=live_every if live else None)
+def panel():
+    params = (device, serie, periodo, budget, metodo, use_vib, vib_thr, use_air, air_thr,
+              use_lux, lux_low, lux_high, use_temp, temp_low, temp_high)
+    view = memo("view", (data_version(), models_token(), params), compute_view)
+
+    # ---------------- KPIs -------------------
+    kpi = view["kpi"]
+    col1, col2, col3, col4 = st.columns(4)
+    with col1: st.metric("Leituras", f"{kpi['n_readings']:,}".replace(",", "."))
+    with col2: st.metric("Vibracao media", f"{kpi['avg_vibration']:.2f}")
+    with col3: st.metric("Qualidade do ar media", f"{kpi['avg_air_q']:.1f}")
+    with col4: st.metric("Modelo/Regra", "Regras combinadas (anti-alarme falso)")
+
+    # --------------- Grafico -----------------
+    st.subheader("Serie temporal")
+    if not view["empty"]:
+        st.line_chart(view["plot"])
+        if view["windows"]:
+            cols = st.columns(2)
+            for c, (label, w) in zip(cols, view["windows"]):
+                if w["count"]:
+                    c.caption(f"{label}: media {w['mean']:.2f} | min {w['min']:.2f} | "
+                              f"max {w['max']:.2f} ({w['count']} leituras)")
+    else:
+        st.info("Sem dados. Verifique ingest/readings.csv.")
+
+    # ======== Alertas (janela + histerese + persistencia) ========
+    st.subheader("Alertas")
+    if not view["empty"]:
+        active = view["active"]
+        store = get_alert_store(device)
+
+        triggered_parts = [a["regra"] for a in active.values()]
+        severities = [a["severidade"] for a in active.values()]
+        LEVEL = {"baixa":1,"media":2,"alta":3}
+        overall = max(severities, key=lambda s: LEVEL[s]) if severities else None
+
+        if overall:
+            regra = " | ".join(triggered_parts)
+            if overall == "alta":
+                st.error(f"ALERTA ({overall}): {regra}")
+            elif overall == "media":
+                st.warning(f"ALERTA ({overall}): {regra}")
+            else:
+                st.info(f"ALERTA ({overall}): {regra}")
+        else:
+            st.success("Sem alertas persistentes na janela recente.")
+        if view["custom_rules"]:
+            st.caption("Aviso acima com os limiares desta sessao; os alertas abaixo e o log seguem os limites "
+                       "do servidor.")
+
+        for key, a in store.active().items():
+            c1, c2 = st.columns([4, 1])
+            c1.write(f"**{key}**: {a['status']} ({a['severidade']}) desde {a['desde']}")
+            if a["status"] == STATUS_OPEN and c2.button("Reconhecer", key=f"ack_{key}"):
+                store.acknowledge(key)
+                try:
+                    st.rerun(scope="fragment")
+                except StreamlitAPIException:
+                    # o clique veio numa execucao completa do script, nao num rerun do fragmento
+                    st.rerun()
+
+        if view["others"]:
+            st.caption("Outros dispositivos com alerta: " + ", ".join(view["others"]))
+
+        anomaly = view["anomaly"]
+        if anomaly is not None:
+            last = anomaly["last"]
+            c1, c2 = st.columns([1, 3])
+            c1.metric("Anomalia (ultima leitura)", str(last["criticidade"]),
+                      f"rank {last['anomalia_rank_pct']:.0%}", delta_color="off")
+            c2.caption(f"IsolationForest {anomaly['versao']}: {anomaly['high']} de {anomaly['n']} leituras recentes "
+                       f"com criticidade Alto/Critico ({anomaly['ms']} ms por leitura).")
+
+    # --------------- Log ---------------------
+    if view["log"] is not None:
+        st.write("Log de alertas (evidencia):")
+        st.dataframe(view["log"], use_container_width=True)
+
+panel()
 
 st.caption("Sprint 4: KPIs, grafico, alertas com severidade e log (anti-alarme falso).")
 
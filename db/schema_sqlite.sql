@@ -0,0 +1,66 @@
+-- Schema SQLite local (readings / alerts) usado por db/storage.py.
+-- Mesmas tabelas e colunas assumidas em queries.sql.
+
+CREATE TABLE IF NOT EXISTS readings (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts          TEXT    NOT NULL,
+    device_id   TEXT    NOT NULL DEFAULT 'esp32-01',
+    temperature REAL,
+    vibration   REAL,
+    luminosity  REAL,
+    air_q       REAL
+);
+CREATE INDEX IF NOT EXISTS idx_readings_ts        ON readings (ts);
+-- uma leitura por (dispositivo, instante): regravar a mesma entrada (ex.: o
+-- pipeline com --db rodando de novo) nao duplica linhas nem os KPIs abaixo
+DROP INDEX IF EXISTS idx_readings_device_ts;
+CREATE UNIQUE INDEX IF NOT EXISTS ux_readings_device_ts ON readings (device_id, ts);
+
+CREATE TABLE IF NOT EXISTS alerts (
+    id        INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts        TEXT NOT NULL,
+    device_id TEXT NOT NULL DEFAULT 'esp32-01',
+    rule      TEXT NOT NULL,
+    value     REAL,
+    severity  TEXT,
+    channel   TEXT,
+    status    TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_alerts_ts        ON alerts (ts);
+CREATE INDEX IF NOT EXISTS idx_alerts_device_ts ON alerts (device_id, ts);
+
+-- Agregados por dispositivo mantidos por trigger: os KPIs de queries.sql
+-- (COUNT / AVG) saem desta tabela sem varrer readings.
+CREATE TABLE IF NOT EXISTS readings_kpi (
+    device_id TEXT PRIMARY KEY,
+    n         INTEGER NOT NULL DEFAULT 0,
+    n_vib     INTEGER NOT NULL DEFAULT 0,
+    sum_vib   REAL    NOT NULL DEFAULT 0,
+    n_air     INTEGER NOT NULL DEFAULT 0,
+    sum_air   REAL    NOT NULL DEFAULT 0
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_readings_kpi_ins AFTER INSERT ON readings
+BEGIN
+    INSERT INTO readings_kpi (device_id, n, n_vib, sum_vib, n_air, sum_air)
+    VALUES (NEW.device_id, 1,
+            NEW.vibration IS NOT NULL, COALESCE(NEW.vibration, 0),
+            NEW.air_q IS NOT NULL,     COALESCE(NEW.air_q, 0))
+    ON CONFLICT (device_id) DO UPDATE SET
+        n       = n + 1,
+        n_vib   = n_vib + (NEW.vibration IS NOT NULL),
+        sum_vib = sum_vib + COALESCE(NEW.vibration, 0),
+        n_air   = n_air + (NEW.air_q IS NOT NULL),
+        sum_air = sum_air + COALESCE(NEW.air_q, 0);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_readings_kpi_del AFTER DELETE ON readings
+BEGIN
+    UPDATE readings_kpi SET
+        n       = n - 1,
+        n_vib   = n_vib - (OLD.vibration IS NOT NULL),
+        sum_vib = sum_vib - COALESCE(OLD.vibration, 0),
+        n_air   = n_air - (OLD.air_q IS NOT NULL),
+        sum_air = sum_air - COALESCE(OLD.air_q, 0)
+    WHERE device_id = OLD.device_id;
+END;
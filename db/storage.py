@@ -0,0 +1,246 @@
+"""
+storage.py - Camada de armazenamento local em SQLite (modo WAL) para
+leituras e alertas, usada pelo dashboard e pelo pipeline de ML.
+
+- schema em db/schema_sqlite.sql (tabelas readings / alerts, indices em ts e
+  device_id, agregados de KPI mantidos por trigger);
+- insercoes em lote (executemany dentro de uma transacao);
+- as consultas de db/queries.sql prontas como metodos.
+"""
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+DB_DIR = os.path.dirname(os.path.abspath(__file__))
+SCHEMA_PATH = os.path.join(DB_DIR, "schema_sqlite.sql")
+DEFAULT_DB = os.path.join(DB_DIR, "hermia.db")
+DEFAULT_DEVICE = "esp32-01"
+
+READING_COLS = ["ts", "temperature", "vibration", "luminosity", "air_q"]
+# colunas do alerts.csv do dashboard -> colunas da tabela alerts
+ALERT_COL_MAP = {"regra": "rule", "valor": "value", "severidade": "severity", "canal": "channel"}
+ALERT_COLS = ["ts", "device_id", "rule", "value", "severity", "channel", "status"]
+TS_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+def _ts_text(values) -> list:
+    ts = pd.to_datetime(pd.Series(values), errors="coerce", format="ISO8601")
+    return ts.dt.strftime(TS_FORMAT).tolist()
+
+
+def _records(df: pd.DataFrame, cols: list) -> list:
+    out = df.reindex(columns=cols).astype(object)
+    return out.where(pd.notna(out), None).values.tolist()
+
+
+class SqliteStore:
+    """
+    Conexao unica (thread-safe via lock) com o banco local.
+    Abra uma por processo e reutilize: as leituras concorrentes de outros
+    processos nao bloqueiam a escrita gracas ao modo WAL.
+    """
+
+    def __init__(self, path: str = DEFAULT_DB):
+        self.path = path
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._dedupe_readings()
+        with open(SCHEMA_PATH, "r", encoding="utf-8") as f:
+            self.conn.executescript(f.read())
+        self._lock = threading.Lock()
+
+    def close(self):
+        self.conn.close()
+
+    def _dedupe_readings(self):
+        """Bancos anteriores ao indice unico (device_id, ts) podem ter leituras repetidas: fica a primeira."""
+        tabela = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'readings'").fetchone()
+        indice = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'ux_readings_device_ts'").fetchone()
+        if tabela and not indice:
+            with self.conn:
+                # o trigger de DELETE desconta as linhas removidas de readings_kpi
+                self.conn.execute("DELETE FROM readings WHERE id NOT IN "
+                                  "(SELECT MIN(id) FROM readings GROUP BY device_id, ts)")
+
+    def _query(self, sql: str, params=()) -> pd.DataFrame:
+        with self._lock:
+            return pd.read_sql_query(sql, self.conn, params=params)
+
+    # ===================== Escrita =====================
+    def insert_readings(self, rows, device_id: str = DEFAULT_DEVICE) -> int:
+        """
+        Insere leituras (DataFrame ou lista de dicts) em um unico lote. Leituras
+        ja gravadas (mesmo device_id e ts) sao ignoradas; devolve quantas entraram.
+        """
+        df = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(list(rows))
+        if df.empty:
+            return 0
+        df = df.reindex(columns=READING_COLS + ["device_id"])
+        df["ts"] = _ts_text(df["ts"])
+        df["device_id"] = df["device_id"].fillna(device_id)
+        data = _records(df, ["ts", "device_id"] + READING_COLS[1:])
+        with self._lock, self.conn:
+            cur = self.conn.executemany(
+                "INSERT OR IGNORE INTO readings (ts, device_id, temperature, vibration, luminosity, air_q) "
+                "VALUES (?, ?, ?, ?, ?, ?)", data)
+        return cur.rowcount
+
+    def insert_alerts(self, rows) -> int:
+        """Insere alertas; aceita tanto as colunas do alerts.csv quanto as da tabela."""
+        df = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(list(rows))
+        if df.empty:
+            return 0
+        df = df.rename(columns=ALERT_COL_MAP).reindex(columns=ALERT_COLS)
+        df["device_id"] = df["device_id"].fillna(DEFAULT_DEVICE)
+        data = _records(df, ALERT_COLS)
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO alerts (ts, device_id, rule, value, severity, channel, status) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", data)
+        return len(data)
+
+    def import_csv(self, path: str, device_id: str = DEFAULT_DEVICE, chunksize: int = 50_000) -> int:
+        """Importa um readings.csv em lotes (equivalente ao .import do README)."""
+        total = 0
+        for chunk in pd.read_csv(path, chunksize=chunksize):
+            total += self.insert_readings(chunk, device_id=device_id)
+        return total
+
+    # ===================== KPIs (queries.sql) =====================
+    def kpis(self, device_id: str = None) -> dict:
+        """n_readings, avg_vibration e avg_air_q a partir dos agregados (O(1))."""
+        where, params = ("WHERE device_id = ?", (device_id,)) if device_id else ("", ())
+        with self._lock:
+            n, n_vib, s_vib, n_air, s_air = self.conn.execute(
+                "SELECT COALESCE(SUM(n), 0), COALESCE(SUM(n_vib), 0), COALESCE(SUM(sum_vib), 0), "
+                "COALESCE(SUM(n_air), 0), COALESCE(SUM(sum_air), 0) FROM readings_kpi " + where,
+                params).fetchone()
+        return {
+            "n_readings": int(n),
+            "avg_vibration": round(s_vib / n_vib, 3) if n_vib else np.nan,
+            "avg_air_q": round(s_air / n_air, 1) if n_air else np.nan,
+        }
+
+    def count_readings(self, device_id: str = None) -> int:
+        return self.kpis(device_id)["n_readings"]
+
+    def avg_vibration(self, device_id: str = None) -> float:
+        return self.kpis(device_id)["avg_vibration"]
+
+    def avg_air_q(self, device_id: str = None) -> float:
+        return self.kpis(device_id)["avg_air_q"]
+
+    def devices(self) -> list:
+        """Dispositivos com leituras (via readings_kpi, sem varrer readings)."""
+        with self._lock:
+            rows = self.conn.execute("SELECT device_id FROM readings_kpi WHERE n > 0 ORDER BY device_id").fetchall()
+        return [r[0] for r in rows]
+
+    def device_tails(self, n: int, devices=None) -> pd.DataFrame:
+        """Ultimas n leituras de cada dispositivo (uma busca no indice (device_id, ts) por dispositivo)."""
+        parts = [self.last_readings(n, dev) for dev in (devices if devices is not None else self.devices())]
+        parts = [p for p in parts if not p.empty]
+        if not parts:
+            return pd.DataFrame(columns=["id"] + READING_COLS + ["device_id"])
+        return pd.concat(parts, ignore_index=True)
+
+    def last_readings(self, n: int = 5, device_id: str = None) -> pd.DataFrame:
+        """Ultimas n leituras (ORDER BY id DESC LIMIT n), devolvidas em ordem cronologica."""
+        where, params = ("WHERE device_id = ?", (device_id, n)) if device_id else ("", (n,))
+        df = self._query(
+            "SELECT id, ts, device_id, temperature, vibration, luminosity, air_q FROM readings "
+            f"{where} ORDER BY id DESC LIMIT ?", params)
+        df["ts"] = pd.to_datetime(df["ts"], errors="coerce", format="ISO8601")
+        return df.iloc[::-1].reset_index(drop=True)
+
+    def last_alerts(self, n: int = 10, device_id: str = None) -> pd.DataFrame:
+        """Top n alertas mais recentes."""
+        where, params = ("WHERE device_id = ?", (device_id, n)) if device_id else ("", (n,))
+        return self._query(
+            "SELECT ts, device_id, rule, value, severity, channel, status FROM alerts "
+            f"{where} ORDER BY id DESC LIMIT ?", params)
+
+    # ===================== Leitura incremental =====================
+    def version(self) -> tuple:
+        """(maior id de readings, maior id de alerts): muda a cada insercao; O(1) pela chave primaria."""
+        with self._lock:
+            return self.conn.execute(
+                "SELECT (SELECT MAX(id) FROM readings), (SELECT MAX(id) FROM alerts)").fetchone()
+
+    def readings_since(self, last_id: int = 0, device_id: str = None) -> pd.DataFrame:
+        """Leituras com id > last_id (usa a chave primaria; nao varre a tabela)."""
+        sql = ("SELECT id, ts, device_id, temperature, vibration, luminosity, air_q FROM readings "
+               "WHERE id > ?")
+        params = [last_id]
+        if device_id:
+            sql += " AND device_id = ?"
+            params.append(device_id)
+        df = self._query(sql + " ORDER BY id", params)
+        df["ts"] = pd.to_datetime(df["ts"], errors="coerce", format="ISO8601")
+        return df
+
+
+class IncrementalSqliteReader:
+    """Mesmo papel do IncrementalCsvReader do dashboard, mas usando o id como checkpoint."""
+
+    def __init__(self, store: SqliteStore, device_id: str = None, keep_frame: bool = True):
+        # keep_frame=False: as linhas so passam pelos ouvintes; o frame fica vazio
+        self.store = store
+        self.device_id = device_id
+        self.keep_frame = keep_frame
+        self.last_id = 0
+        self._frame = None
+        # lotes novos aguardando a juncao, feita so quando `frame` e lido
+        self._pending = []
+        self._in_order = True
+        self._last_ts = pd.NaT
+        self._listeners = []
+
+    def subscribe(self, fn):
+        """fn(novas_linhas, reset) a cada refresh (mesmo contrato do leitor de CSV)."""
+        self._listeners.append(fn)
+        if self.frame is not None:
+            fn(self.frame, True)
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        """Historico ordenado por ts (None antes do primeiro refresh)."""
+        if self._pending:
+            merged = pd.concat([self._frame] + self._pending, ignore_index=True)
+            self._frame = merged if self._in_order else merged.sort_values("ts", kind="mergesort")
+            self._pending, self._in_order = [], True
+            self._last_ts = self._frame["ts"].iloc[-1]
+        return self._frame
+
+    def refresh(self) -> int:
+        """Le as linhas com id acima do checkpoint; devolve quantas foram lidas."""
+        new = self.store.readings_since(self.last_id, self.device_id)
+        if self._frame is None:
+            frame = new.sort_values("ts", kind="mergesort")
+            for fn in self._listeners:
+                fn(frame, True)
+            self._frame = frame if self.keep_frame else frame.iloc[:0]
+            self._last_ts = frame["ts"].iloc[-1] if len(self._frame) else pd.NaT
+        elif not new.empty:
+            for fn in self._listeners:
+                fn(new, False)
+            if self.keep_frame:
+                empty = self._frame.empty and not self._pending
+                last_ts = self._last_ts
+                in_order = (empty or pd.notna(last_ts)) and new["ts"].notna().all() \
+                    and new["ts"].is_monotonic_increasing and (empty or new["ts"].iloc[0] >= last_ts)
+                self._in_order = self._in_order and in_order
+                self._last_ts = new["ts"].iloc[-1] if in_order else pd.NaT
+                self._pending.append(new)
+        if not new.empty:
+            self.last_id = int(new["id"].iloc[-1])
+        return len(new)
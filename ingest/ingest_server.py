@@ -0,0 +1,341 @@
+"""
+ingest_server.py - Servidor asyncio de ingestao para varias placas ao mesmo tempo.
+
+Entradas:
+  - TCP (padrao :9000): uma leitura por linha, em JSON
+      {"device_id": "esp32-03", "ts": "...", "temperature": 28.1, ...}
+    ou no formato CSV do sensors/main.cpp
+      Timestamp,Temperatura,Umidade,Luminosidade,Vibracao,QualidadeAr
+    (opcionalmente com o device_id como primeira coluna). Uma linha
+    "DEVICE <id>" define o dispositivo das linhas CSV seguintes da conexao.
+  - HTTP (padrao :8080):
+      POST /readings[?device=<id>]  corpo JSON (objeto ou lista) ou linhas CSV
+      GET  /metrics                 contadores de vazao (JSON) e, com --models,
+                                    contagem por criticidade das anomalias
+
+As leituras sao agrupadas em micro-lotes (por tamanho ou tempo) e gravadas
+numa thread separada no armazenamento lido pelo dashboard (CSV particionado
+por dispositivo ou SQLite). Quando ha muitas linhas pendentes, as conexoes
+esperam o lote em andamento (backpressure via TCP).
+
+Exemplo:
+    python ingest/ingest_server.py --backend sqlite
+    python ingest/loadgen.py --devices 20 --rate 50
+"""
+import os
+import sys
+import json
+import time
+import signal
+import asyncio
+import logging
+import argparse
+from urllib.parse import urlsplit, parse_qs
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+INGEST_DIR = os.path.dirname(os.path.abspath(__file__))
+if INGEST_DIR not in sys.path:
+    sys.path.insert(0, INGEST_DIR)
+
+from serial_ingest import parse_line, make_sink, load_scorer, MillisClock, CSV_PATH, DB_PATH, ESP32_COLS
+from readings_log import DEFAULT_DEVICE
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger("ingest_server")
+
+READING_KEYS = ("ts", "temperature", "vibration", "luminosity", "air_q")
+
+
+# ===================== Micro-lotes =====================
+class MicroBatcher:
+    """
+    Acumula linhas e grava quando chega a batch_size ou a cada flush_interval
+    segundos. A gravacao roda num executor de uma thread (ordem preservada);
+    add() so espera quando ha mais de max_pending linhas aguardando.
+    """
+
+    def __init__(self, sink, batch_size: int = 1000, flush_interval: float = 0.5, max_pending: int = 50_000,
+                 scorer=None):
+        self.sink = sink
+        self.scorer = scorer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.buffer = []
+        self.pending = 0
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-writer")
+        self.inflight = set()
+        self.started = time.monotonic()
+        self.counters = {"received": 0, "written": 0, "batches": 0, "rejected": 0,
+                         "write_errors": 0, "last_batch_ms": 0.0, "backpressure_waits": 0}
+        self._timer = None
+
+    async def add(self, rows: list):
+        if not rows:
+            return
+        self.buffer.extend(rows)
+        self.pending += len(rows)
+        self.counters["received"] += len(rows)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.flush_interval, self.flush)
+        while self.pending > self.max_pending and self.inflight:
+            self.counters["backpressure_waits"] += 1
+            await asyncio.wait(set(self.inflight), return_when=asyncio.FIRST_COMPLETED)
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self.buffer:
+            return
+        batch, self.buffer = self.buffer, []
+        fut = asyncio.get_running_loop().run_in_executor(self.executor, self._write, batch)
+        self.inflight.add(fut)
+        fut.add_done_callback(lambda f, n=len(batch): self._done(f, n))
+
+    def _write(self, batch: list):
+        t0 = time.perf_counter()
+        self.sink(batch)
+        return (time.perf_counter() - t0) * 1000
+
+    def _done(self, fut, n: int):
+        self.inflight.discard(fut)
+        self.pending -= n
+        if fut.exception() is not None:
+            self.counters["write_errors"] += 1
+            logger.error("Falha ao gravar lote de %d linhas: %s", n, fut.exception())
+            return
+        self.counters["written"] += n
+        self.counters["batches"] += 1
+        self.counters["last_batch_ms"] = round(fut.result(), 2)
+
+    async def close(self):
+        self.flush()
+        if self.inflight:
+            await asyncio.wait(set(self.inflight))
+        self.executor.shutdown(wait=True)
+
+    def metrics(self) -> dict:
+        up = time.monotonic() - self.started
+        out = dict(self.counters)
+        out.update({
+            "uptime_s": round(up, 1),
+            "pending": self.pending,
+            "rows_per_s": round(self.counters["written"] / up, 1) if up > 0 else 0.0,
+        })
+        if self.scorer is not None:
+            out["anomalies"] = self.scorer.stats()
+        return out
+
+
+# ===================== Parse =====================
+def reading_from_json(obj: dict, device_id: str) -> dict:
+    row = {k: obj.get(k) for k in READING_KEYS}
+    row["ts"] = pd.Timestamp(row["ts"]) if row["ts"] is not None else pd.Timestamp.now()
+    row["device_id"] = obj.get("device_id") or device_id
+    return row
+
+
+class CsvSession:
+    """Estado de uma conexao/requisicao com linhas CSV: dispositivo e relogio do millis."""
+
+    def __init__(self, device_id: str):
+        self.device_id = device_id
+        self.clocks = {}
+
+    def parse(self, line: str):
+        parts = line.strip().split(",")
+        device = self.device_id
+        if len(parts) == len(ESP32_COLS) + 1:
+            device, line = parts[0], ",".join(parts[1:])
+        parsed = parse_line(line)
+        if parsed is None:
+            return None
+        millis, row = parsed
+        row["ts"] = self.clocks.setdefault(device, MillisClock()).to_ts(millis)
+        row["device_id"] = device
+        return row
+
+
+def parse_payload(text: str, session: CsvSession) -> tuple:
+    """(linhas validas, quantidade rejeitada) de um corpo JSON ou CSV."""
+    rows, rejected = [], 0
+    stripped = text.lstrip()
+    if stripped.startswith("{") or stripped.startswith("["):
+        try:
+            data = json.loads(text)
+        except ValueError:
+            # JSON por linha (NDJSON)
+            data = []
+            for line in text.splitlines():
+                if line.strip():
+                    try:
+                        data.append(json.loads(line))
+                    except ValueError:
+                        rejected += 1
+        for obj in data if isinstance(data, list) else [data]:
+            try:
+                rows.append(reading_from_json(obj, session.device_id))
+            except (AttributeError, ValueError, TypeError):
+                rejected += 1
+        return rows, rejected
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        row = session.parse(line)
+        if row is None:
+            rejected += 1
+        else:
+            rows.append(row)
+    return rows, rejected
+
+
+# ===================== TCP =====================
+async def handle_tcp(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, batcher: MicroBatcher,
+                     device_id: str = DEFAULT_DEVICE):
+    session = CsvSession(device_id)
+    peer = writer.get_extra_info("peername")
+    try:
+        while True:
+            raw = await reader.readline()
+            if not raw:
+                break
+            line = raw.decode("utf-8", errors="replace").strip()
+            if not line or line.startswith("//"):
+                continue
+            if line.upper().startswith("DEVICE "):
+                session.device_id = line.split(None, 1)[1].strip()
+                continue
+            rows, rejected = parse_payload(line, session)
+            batcher.counters["rejected"] += rejected
+            await batcher.add(rows)
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        logger.debug("conexao TCP encerrada: %s", peer)
+        writer.close()
+
+
+# ===================== HTTP (minimo) =====================
+def _response(status: str, body: dict, keep_alive: bool) -> bytes:
+    data = json.dumps(body).encode()
+    head = (f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode() + data
+
+
+async def handle_http(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, batcher: MicroBatcher,
+                      device_id: str = DEFAULT_DEVICE):
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            try:
+                method, target, version = request_line.decode("latin-1").split()
+            except ValueError:
+                writer.write(_response("400 Bad Request", {"erro": "requisicao invalida"}, False))
+                break
+            headers = {}
+            while True:
+                h = await reader.readline()
+                if h in (b"\r\n", b"\n", b""):
+                    break
+                k, _, v = h.decode("latin-1").partition(":")
+                headers[k.strip().lower()] = v.strip()
+            try:
+                length = int(headers.get("content-length", 0) or 0)
+                if length < 0:
+                    raise ValueError(length)
+            except ValueError:
+                # sem tamanho confiavel nao da para achar o fim do corpo: responde e fecha
+                writer.write(_response("400 Bad Request", {"erro": "content-length invalido"}, False))
+                break
+            body = await reader.readexactly(length)
+            keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+
+            url = urlsplit(target)
+            if method == "GET" and url.path == "/metrics":
+                writer.write(_response("200 OK", batcher.metrics(), keep_alive))
+            elif method == "POST" and url.path == "/readings":
+                device = parse_qs(url.query).get("device", [device_id])[0]
+                rows, rejected = parse_payload(body.decode("utf-8", errors="replace"), CsvSession(device))
+                batcher.counters["rejected"] += rejected
+                await batcher.add(rows)
+                writer.write(_response("202 Accepted", {"aceitas": len(rows), "rejeitadas": rejected}, keep_alive))
+            else:
+                writer.write(_response("404 Not Found", {"erro": "rota desconhecida"}, keep_alive))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+# ===================== Main =====================
+async def serve(args):
+    scorer = load_scorer(args.models)
+    batcher = MicroBatcher(make_sink(args.backend, args.csv, args.db, args.device, scorer),
+                           args.batch_size, args.flush_interval, args.max_pending, scorer)
+    tcp = await asyncio.start_server(lambda r, w: handle_tcp(r, w, batcher, args.device), args.host, args.tcp_port)
+    http = await asyncio.start_server(lambda r, w: handle_http(r, w, batcher, args.device), args.host, args.http_port)
+    logger.info("TCP em %s:%d, HTTP em %s:%d (backend=%s)", args.host, args.tcp_port,
+                args.host, args.http_port, args.backend)
+
+    async def report():
+        while True:
+            await asyncio.sleep(args.report_every)
+            logger.info("metricas: %s", batcher.metrics())
+
+    reporter = asyncio.create_task(report())
+    # SIGINT/SIGTERM encerram o servidor gravando o lote pendente
+    main_task = asyncio.current_task()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            asyncio.get_running_loop().add_signal_handler(sig, main_task.cancel)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows: Ctrl+C continua chegando como KeyboardInterrupt
+    try:
+        async with tcp, http:
+            await asyncio.gather(tcp.serve_forever(), http.serve_forever())
+    except asyncio.CancelledError:
+        pass
+    finally:
+        reporter.cancel()
+        await batcher.close()
+        logger.info("Fim: %s", batcher.metrics())
+
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Servidor asyncio de ingestao (TCP + HTTP) com micro-lotes.")
+    ap.add_argument("--host", default="0.0.0.0")
+    ap.add_argument("--tcp-port", type=int, default=9000)
+    ap.add_argument("--http-port", type=int, default=8080)
+    ap.add_argument("--device", default=DEFAULT_DEVICE, help="dispositivo das linhas sem device_id")
+    ap.add_argument("--backend", choices=["csv", "sqlite"], default=os.environ.get("HERMIA_BACKEND", "csv"))
+    ap.add_argument("--csv", default=CSV_PATH)
+    ap.add_argument("--db", default=os.environ.get("HERMIA_DB", DB_PATH))
+    ap.add_argument("--batch-size", type=int, default=1000)
+    ap.add_argument("--flush-interval", type=float, default=0.5)
+    ap.add_argument("--max-pending", type=int, default=50_000)
+    ap.add_argument("--report-every", type=float, default=30.0)
+    ap.add_argument("--models", default=os.environ.get("HERMIA_MODELOS"),
+                    help="pasta dos modelos do pipeline para pontuar anomalias (metricas em /metrics)")
+    return ap.parse_args(argv)
+
+
+def main(argv=None):
+    try:
+        asyncio.run(serve(parse_args(argv)))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+loadgen.py - Gerador de carga sintetica para o ingest_server.py.
+
+Simula N placas enviando leituras saudaveis (healthy_reading() do dashboard)
+por TCP (JSON ou CSV do ESP32, uma linha por leitura) ou por HTTP (POST em
+lotes), e ao fim compara o que foi enviado com os contadores de /metrics.
+
+Exemplo:
+    python ingest/loadgen.py --devices 20 --rate 50 --duration 10
+    python ingest/loadgen.py --mode http --batch 200 --rate 0      # o mais rapido possivel
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DASHBOARD_DIR = os.path.join(ROOT_DIR, "dashboard")
+if DASHBOARD_DIR not in sys.path:
+    sys.path.insert(0, DASHBOARD_DIR)
+
+from simulation import healthy_reading
+
+
+def json_line(device_id: str) -> str:
+    r = healthy_reading()
+    r["ts"] = r["ts"].isoformat()
+    r["device_id"] = device_id
+    return json.dumps(r)
+
+def esp32_line(device_id: str, millis: int) -> str:
+    # device_id,Timestamp,Temperatura,Umidade,Luminosidade,Vibracao,QualidadeAr
+    r = healthy_reading()
+    return (f"{device_id},{millis},{r['temperature']:.1f},60.0,{r['luminosity']},"
+            f"{r['vibration']:.3f},{r['air_q']}")
+
+
+async def tcp_device(host, port, device_id, n, rate, fmt, sent):
+    reader, writer = await asyncio.open_connection(host, port)
+    interval = 1.0 / rate if rate > 0 else 0
+    t0 = time.monotonic()
+    for i in range(n):
+        line = json_line(device_id) if fmt == "json" else esp32_line(device_id, i * 1000)
+        writer.write(line.encode() + b"\n")
+        sent[0] += 1
+        if interval:
+            # ritmo constante, sem acumular atraso
+            delay = t0 + (i + 1) * interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        if i % 100 == 0:
+            await writer.drain()
+    await writer.drain()
+    writer.close()
+    await writer.wait_closed()
+
+async def http_request(reader, writer, method, path, body=b""):
+    writer.write((f"{method} {path} HTTP/1.1\r\nHost: loadgen\r\nContent-Type: application/json\r\n"
+                  f"Content-Length: {len(body)}\r\n\r\n").encode() + body)
+    await writer.drain()
+    await reader.readline()
+    length = 0
+    while True:
+        h = await reader.readline()
+        if h in (b"\r\n", b""):
+            break
+        if h.lower().startswith(b"content-length:"):
+            length = int(h.split(b":")[1])
+    return json.loads(await reader.readexactly(length))
+
+async def http_device(host, port, device_id, n, rate, batch, sent):
+    reader, writer = await asyncio.open_connection(host, port)
+    interval = batch / rate if rate > 0 else 0
+    t0 = time.monotonic()
+    for k, i in enumerate(range(0, n, batch)):
+        body = "[" + ",".join(json_line(device_id) for _ in range(min(batch, n - i))) + "]"
+        await http_request(reader, writer, "POST", "/readings", body.encode())
+        sent[0] += min(batch, n - i)
+        if interval:
+            delay = t0 + (k + 1) * interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+    writer.close()
+
+async def fetch_metrics(host, port) -> dict:
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        return await http_request(reader, writer, "GET", "/metrics")
+    finally:
+        writer.close()
+
+async def run(args):
+    n = int(args.rate * args.duration) if args.rate > 0 else args.count
+    before = await fetch_metrics(args.host, args.http_port)
+    sent = [0]
+    t0 = time.perf_counter()
+    devices = [f"{args.prefix}{i:02d}" for i in range(1, args.devices + 1)]
+    if args.mode == "tcp":
+        jobs = [tcp_device(args.host, args.tcp_port, d, n, args.rate, args.format, sent) for d in devices]
+    else:
+        jobs = [http_device(args.host, args.http_port, d, n, args.rate, args.batch, sent) for d in devices]
+    await asyncio.gather(*jobs)
+    elapsed = time.perf_counter() - t0
+    print(f"enviadas {sent[0]} leituras de {len(devices)} dispositivos em {elapsed:.2f}s "
+          f"({sent[0] / elapsed:.0f}/s)")
+
+    # espera o servidor gravar o que recebeu
+    deadline = time.monotonic() + args.wait
+    while True:
+        m = await fetch_metrics(args.host, args.http_port)
+        if m["written"] - before["written"] >= sent[0] or time.monotonic() > deadline:
+            break
+        await asyncio.sleep(0.2)
+    print(f"gravadas {m['written'] - before['written']} (lotes={m['batches'] - before['batches']}, "
+          f"ultimo lote={m['last_batch_ms']} ms, rejeitadas={m['rejected'] - before['rejected']})")
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Gerador de carga sintetica para o ingest_server.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--tcp-port", type=int, default=9000)
+    ap.add_argument("--http-port", type=int, default=8080)
+    ap.add_argument("--mode", choices=["tcp", "http"], default="tcp")
+    ap.add_argument("--format", choices=["json", "csv"], default="json", help="formato das linhas TCP")
+    ap.add_argument("--devices", type=int, default=10)
+    ap.add_argument("--prefix", default="esp32-")
+    ap.add_argument("--rate", type=float, default=10.0, help="leituras/s por dispositivo (0 = sem limite)")
+    ap.add_argument("--duration", type=float, default=10.0, help="segundos (com --rate > 0)")
+    ap.add_argument("--count", type=int, default=10_000, help="leituras por dispositivo (com --rate 0)")
+    ap.add_argument("--batch", type=int, default=100, help="leituras por POST (modo http)")
+    ap.add_argument("--wait", type=float, default=10.0, help="espera maxima pela gravacao (s)")
+    return ap.parse_args(argv)
+
+def main(argv=None):
+    asyncio.run(run(parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+"""
+serial_ingest.py - Processo de ingestao continua da saida do ESP32 (sensors/main.cpp).
+
+Le linhas no formato
+    Timestamp,Temperatura,Umidade,Luminosidade,Vibracao,QualidadeAr
+(Timestamp = millis() desde o boot) de uma porta serial, de um arquivo sendo
+escrito (tail -f) ou de um pty (para simuladores), converte o millis em
+horario absoluto e grava em lotes no mesmo armazenamento lido pelo dashboard
+(ingest/readings.csv por dispositivo ou SQLite).
+
+A leitura e a escrita rodam em threads separadas ligadas por uma fila com
+tamanho maximo: se o disco ficar lento, a fila enche e a leitura espera
+(backpressure) em vez de descartar amostras ou crescer sem limite.
+
+Exemplos:
+    python ingest/serial_ingest.py --serial /dev/ttyUSB0
+    python ingest/serial_ingest.py --tail sensors/saida_serial.log --device esp32-02
+    python ingest/serial_ingest.py --pty            # imprime o caminho do pty criado
+"""
+import os
+import sys
+import time
+import queue
+import signal
+import logging
+import argparse
+import threading
+
+import pandas as pd
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for p in (ROOT_DIR, os.path.join(ROOT_DIR, "dashboard")):
+    if p not in sys.path:
+        sys.path.insert(0, p)
+
+from readings_log import DEFAULT_DEVICE, PartitionedAppender
+
+try:
+    import serial  # pyserial (opcional: so para --serial)
+except ImportError:
+    serial = None
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger("serial_ingest")
+
+CSV_PATH = os.path.join(ROOT_DIR, "ingest", "readings.csv")
+DB_PATH = os.path.join(ROOT_DIR, "db", "hermia.db")
+BAUD = 115200
+# colunas impressas pelo main.cpp -> colunas das leituras do dashboard
+ESP32_COLS = ["Timestamp", "Temperatura", "Umidade", "Luminosidade", "Vibracao", "QualidadeAr"]
+FIELD_MAP = {"Temperatura": "temperature", "Umidade": "humidity", "Luminosidade": "luminosity",
+             "Vibracao": "vibration", "QualidadeAr": "air_q"}
+
+
+# ===================== Parse =====================
+def parse_line(line: str):
+    """
+    Converte uma linha do ESP32 em (millis, {coluna: valor}).
+    Cabecalho, comentarios ("// ...") e mensagens de erro devolvem None.
+    """
+    parts = line.strip().split(",")
+    if len(parts) != len(ESP32_COLS):
+        return None
+    try:
+        millis = int(float(parts[0]))
+        values = [float(v) for v in parts[1:]]
+    except ValueError:
+        return None
+    return millis, dict(zip([FIELD_MAP[c] for c in ESP32_COLS[1:]], values))
+
+
+class MillisClock:
+    """
+    Converte millis() do ESP32 em horario absoluto. A ancora (horario do
+    millis 0) e fixada na primeira linha; se o millis voltar (reboot da
+    placa), a ancora e refeita.
+    """
+
+    def __init__(self, start: pd.Timestamp = None):
+        self.anchor = start
+        self.last = None
+
+    def to_ts(self, millis: int, now: pd.Timestamp = None) -> pd.Timestamp:
+        if self.anchor is None or (self.last is not None and millis < self.last):
+            now = now or pd.Timestamp.now()
+            if self.last is not None:
+                logger.warning("millis voltou (%s -> %s): placa reiniciada, refazendo a ancora", self.last, millis)
+            self.anchor = now - pd.Timedelta(milliseconds=millis)
+        self.last = millis
+        return self.anchor + pd.Timedelta(milliseconds=millis)
+
+
+# ===================== Escrita em lotes =====================
+class BatchWriter:
+    """
+    Thread de escrita: junta ate batch_size linhas (ou o que chegou em
+    flush_interval segundos) e chama sink(linhas). put() bloqueia quando a
+    fila (max_queue linhas) esta cheia.
+    """
+
+    def __init__(self, sink, batch_size: int = 500, flush_interval: float = 1.0, max_queue: int = 10_000):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.stats = {"rows": 0, "batches": 0, "blocked_s": 0.0, "max_queue": 0}
+        self._stop = object()
+        self._thread = threading.Thread(target=self._run, name="batch-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, row: dict):
+        try:
+            self.queue.put_nowait(row)
+        except queue.Full:
+            t0 = time.monotonic()
+            self.queue.put(row)
+            self.stats["blocked_s"] += time.monotonic() - t0
+        self.stats["max_queue"] = max(self.stats["max_queue"], self.queue.qsize())
+
+    def _run(self):
+        done = False
+        while not done:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get(timeout=max(deadline - time.monotonic(), 0.001))
+                except queue.Empty:
+                    break
+                if item is self._stop:
+                    done = True
+                    break
+                batch.append(item)
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch: list):
+        while True:
+            try:
+                self.sink(batch)
+                break
+            except OSError as e:
+                # disco cheio/indisponivel: segura o lote (e, pela fila, a leitura) e tenta de novo
+                logger.error("Falha ao gravar lote de %d linhas: %s; nova tentativa em 1s", len(batch), e)
+                time.sleep(1)
+            except Exception:
+                # erro de dados (nao de disco): registra e segue para nao travar a fila
+                logger.exception("Lote de %d linhas descartado", len(batch))
+                return
+        self.stats["rows"] += len(batch)
+        self.stats["batches"] += 1
+
+    def close(self):
+        self.queue.put(self._stop)
+        self._thread.join()
+
+
+def make_sink(backend: str, csv_path: str, db_path: str, device_id: str, scorer=None):
+    if backend == "sqlite":
+        from db.storage import SqliteStore
+        store = SqliteStore(db_path)
+        sink = lambda rows: store.insert_readings(rows, device_id=device_id)
+    else:
+        appender = PartitionedAppender(csv_path, tail_size=0)
+        sink = lambda rows: appender.append(rows, device_id=device_id)
+    return scored_sink(sink, scorer) if scorer is not None else sink
+
+
+# ===================== Anomalias (IsolationForest) =====================
+def load_scorer(models_dir: str):
+    """OnlineScorer (ml/scoring_online.py) da ultima versao treinada, ou None se nao houver modelo."""
+    if not models_dir:
+        return None
+    from ml.scoring_online import OnlineScorer
+    try:
+        scorer = OnlineScorer(models_dir)
+    except (FileNotFoundError, ValueError) as e:
+        logger.warning("Pontuacao de anomalias desligada: %s", e)
+        return None
+    logger.info("Pontuando anomalias com os modelos %s (%s)", scorer.versao, models_dir)
+    return scorer
+
+def scored_sink(sink, scorer):
+    """Pontua cada lote antes de gravar e registra as leituras com criticidade Alto/Critico."""
+    def write(rows: list):
+        try:
+            crit = scorer.pontuar(rows)["criticidade"]
+            high = crit.isin(["Alto", "Crítico"]).to_numpy()
+            if high.any():
+                devices = sorted({str(r.get("device_id") or "") for r, h in zip(rows, high) if h})
+                logger.warning("%d leitura(s) com criticidade alta (%s)", int(high.sum()), ", ".join(devices))
+        except Exception:
+            # a pontuacao nunca impede a gravacao
+            logger.exception("Falha ao pontuar lote de %d linhas", len(rows))
+        sink(rows)
+    return write
+
+
+# ===================== Fontes =====================
+def iter_serial(port: str, baud: int = BAUD):
+    if serial is None:
+        raise SystemExit("pyserial nao instalado: pip install pyserial")
+    with serial.Serial(port, baud, timeout=1) as ser:
+        while True:
+            raw = ser.readline()
+            if raw:
+                yield raw.decode("utf-8", errors="replace")
+
+def iter_tail(path: str, from_start: bool = True, follow: bool = True, poll: float = 0.2):
+    """Linhas de um arquivo que continua sendo escrito (reabre se for rotacionado/truncado)."""
+    while not os.path.exists(path):
+        time.sleep(poll)
+    f = open(path, "r", encoding="utf-8", errors="replace", newline="")
+    try:
+        if not from_start:
+            f.seek(0, os.SEEK_END)
+        ident = os.fstat(f.fileno()).st_ino
+        partial = ""
+        while True:
+            line = f.readline()
+            if line:
+                partial += line
+                if partial.endswith("\n"):
+                    yield partial
+                    partial = ""
+                continue
+            if not follow:
+                if partial:
+                    yield partial
+                return
+            time.sleep(poll)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if st.st_ino != ident or st.st_size < f.tell():
+                f.close()
+                f = open(path, "r", encoding="utf-8", errors="replace", newline="")
+                ident = os.fstat(f.fileno()).st_ino
+                partial = ""
+    finally:
+        f.close()
+
+def open_pty():
+    """Cria um par pty; o simulador escreve no caminho devolvido e o daemon le o fd mestre."""
+    import pty
+    master, slave = pty.openpty()
+    return master, os.ttyname(slave)
+
+def iter_fd(fd: int):
+    with os.fdopen(fd, "r", encoding="utf-8", errors="replace", newline="") as f:
+        for line in f:
+            yield line
+
+
+# ===================== Loop principal =====================
+def run(lines, writer: BatchWriter, clock: MillisClock, device_id: str = DEFAULT_DEVICE,
+        report_every: float = 30.0) -> dict:
+    counts = {"lines": 0, "skipped": 0}
+    last_report = time.monotonic()
+    for line in lines:
+        counts["lines"] += 1
+        parsed = parse_line(line)
+        if parsed is None:
+            if line.strip():
+                counts["skipped"] += 1
+            continue
+        millis, row = parsed
+        row["ts"] = clock.to_ts(millis)
+        row["device_id"] = device_id
+        writer.put(row)
+        if time.monotonic() - last_report >= report_every:
+            last_report = time.monotonic()
+            logger.info("linhas=%d ignoradas=%d gravadas=%d fila=%d bloqueado=%.1fs", counts["lines"],
+                        counts["skipped"], writer.stats["rows"], writer.queue.qsize(), writer.stats["blocked_s"])
+    return counts
+
+def _raise_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Ingestao continua da saida serial do ESP32.")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--serial", metavar="PORTA", help="porta serial (ex.: /dev/ttyUSB0, COM3)")
+    src.add_argument("--tail", metavar="ARQUIVO", help="arquivo com a saida do Serial Monitor (segue novas linhas)")
+    src.add_argument("--pty", action="store_true", help="cria um pty e le o que o simulador escrever nele")
+    ap.add_argument("--baud", type=int, default=BAUD)
+    ap.add_argument("--once", action="store_true", help="com --tail: para no fim do arquivo")
+    ap.add_argument("--start", default=None, help="horario do millis 0 (padrao: agora - millis da 1a linha)")
+    ap.add_argument("--device", default=DEFAULT_DEVICE)
+    ap.add_argument("--backend", choices=["csv", "sqlite"], default=os.environ.get("HERMIA_BACKEND", "csv"))
+    ap.add_argument("--csv", default=CSV_PATH)
+    ap.add_argument("--db", default=os.environ.get("HERMIA_DB", DB_PATH))
+    ap.add_argument("--batch-size", type=int, default=500)
+    ap.add_argument("--flush-interval", type=float, default=1.0)
+    ap.add_argument("--max-queue", type=int, default=10_000)
+    ap.add_argument("--models", default=os.environ.get("HERMIA_MODELOS"),
+                    help="pasta dos modelos do pipeline (ml/modelos.py) para pontuar anomalias")
+    return ap.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.serial:
+        lines = iter_serial(args.serial, args.baud)
+    elif args.tail:
+        lines = iter_tail(args.tail, follow=not args.once)
+    else:
+        master, name = open_pty()
+        print(f"pty pronto: {name}", flush=True)
+        lines = iter_fd(master)
+
+    writer = BatchWriter(make_sink(args.backend, args.csv, args.db, args.device, load_scorer(args.models)),
+                         args.batch_size, args.flush_interval, args.max_queue)
+    clock = MillisClock(pd.Timestamp(args.start) if args.start else None)
+    # SIGTERM (systemd/docker stop) tambem grava o lote pendente antes de sair
+    signal.signal(signal.SIGTERM, _raise_interrupt)
+    try:
+        counts = run(lines, writer, clock, args.device)
+    except KeyboardInterrupt:
+        counts = None
+    finally:
+        writer.close()
+    logger.info("Fim: %s %s", counts or "", writer.stats)
+
+
+if __name__ == "__main__":
+    main()
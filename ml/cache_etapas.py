@@ -0,0 +1,166 @@
+# coding: utf-8
+"""
+cache_etapas.py - Cache em disco das etapas do pipeline_sensor5 (--cache).
+
+Cada etapa (carregar, enriquecer, treinar, pontuar, dashboards) tem uma chave
+sha256 que combina o nome da etapa, os parâmetros que mudam o seu resultado e
+a chave da etapa anterior; só a primeira (carregar) lê o conteúdo dos CSVs.
+Mudar um parâmetro invalida aquela etapa e as seguintes, nunca as anteriores.
+
+    <dir_cache>/<chave>.joblib     # resultado de uma etapa
+    <dir_cache>/saidas.json        # caminho de saída -> chave que o gerou
+
+O resultado é gravado com joblib (tmp + os.replace). Quando o total passa de
+limite_mb, as entradas usadas há mais tempo são apagadas (o mtime é atualizado
+a cada acerto). gravar_saida() pula a escrita de um arquivo de saída que já
+foi gerado pela mesma chave. Arquivos que a própria etapa grava (ex.: métricas e
+matriz de confusão do treino) entram em executar(saidas=[...]): o conteúdo
+fica na entrada do cache e um acerto os regrava se faltarem.
+
+Com diretorio=None o cache fica desligado: executar() só chama a função.
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+
+logger = logging.getLogger("pipeline_sensor5")
+
+# incrementar quando o código de uma etapa mudar o resultado para as mesmas entradas
+VERSAO_CACHE = 2
+ARQUIVO_SAIDAS = "saidas.json"
+EXTENSAO = ".joblib"
+
+
+def hash_arquivo(caminho, bloco=1 << 20):
+    """sha256 do conteúdo de um arquivo ("ausente" se não existir)."""
+    if not os.path.exists(caminho):
+        return "ausente"
+    h = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for parte in iter(lambda: f.read(bloco), b""):
+            h.update(parte)
+    return h.hexdigest()
+
+
+def _gravar_bytes(caminho, dados):
+    """Grava `dados` em caminho (tmp + os.replace), criando a pasta se preciso."""
+    pasta = os.path.dirname(caminho) or "."
+    os.makedirs(pasta, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix="tmp_saida_", dir=pasta)
+    with os.fdopen(fd, "wb") as f:
+        f.write(dados)
+    os.replace(tmp, caminho)
+
+
+class CacheEtapas:
+    def __init__(self, diretorio=None, limite_mb=2048):
+        self.diretorio = diretorio
+        self.limite = int(limite_mb * 1024 * 1024)
+        self.saidas = {}
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+            try:
+                with open(os.path.join(diretorio, ARQUIVO_SAIDAS), encoding="utf-8") as f:
+                    self.saidas = json.load(f)
+            except (OSError, ValueError):
+                self.saidas = {}
+
+    @property
+    def ativo(self):
+        return bool(self.diretorio)
+
+    def chave(self, etapa, *partes, arquivos=()):
+        """Chave de uma etapa: nome, parâmetros (serializáveis em JSON) e hash do conteúdo de `arquivos`."""
+        if not self.ativo:
+            return None
+        conteudo = [hash_arquivo(a) for a in arquivos]
+        texto = json.dumps([VERSAO_CACHE, etapa, partes, conteudo], sort_keys=True, default=str)
+        return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+    def _caminho(self, chave):
+        return os.path.join(self.diretorio, chave + EXTENSAO)
+
+    def executar(self, etapa, chave, funcao, saidas=()):
+        """
+        Resultado da etapa: lido do cache se a chave existir, senão funcao() (e grava no cache).
+        saidas: arquivos gravados por funcao(); o conteúdo vai junto do resultado e,
+        num acerto, cada um é regravado se não existir ou tiver vindo de outra chave.
+        """
+        if not self.ativo:
+            return funcao()
+        import joblib
+
+        caminho = self._caminho(chave)
+        if os.path.exists(caminho):
+            t0 = time.perf_counter()
+            try:
+                valor, conteudos = joblib.load(caminho)
+            except Exception as e:
+                logger.warning("Cache: entrada ilegível para %s (%s); recalculando", etapa, e)
+            else:
+                os.utime(caminho)
+                for saida, dados in conteudos.items():
+                    self.gravar_saida(saida, chave, lambda saida=saida, dados=dados: _gravar_bytes(saida, dados))
+                logger.info("Cache: %s reaproveitada (%s) em %.1f ms", etapa, chave[:12],
+                            (time.perf_counter() - t0) * 1000)
+                return valor
+        t0 = time.perf_counter()
+        valor = funcao()
+        logger.info("Cache: %s executada em %.2f s", etapa, time.perf_counter() - t0)
+        conteudos = {}
+        for saida in saidas:
+            if os.path.isfile(saida):
+                with open(saida, "rb") as f:
+                    conteudos[os.path.abspath(saida)] = f.read()
+                self._registrar_saida(saida, chave)
+        fd, tmp = tempfile.mkstemp(prefix="tmp_cache_", suffix=EXTENSAO, dir=self.diretorio)
+        os.close(fd)
+        try:
+            joblib.dump((valor, conteudos), tmp)
+            os.replace(tmp, caminho)
+        except Exception as e:
+            logger.warning("Cache: não foi possível gravar %s: %s", etapa, e)
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        self._despejar()
+        return valor
+
+    def gravar_saida(self, caminho, chave, funcao):
+        """
+        Chama funcao() para (re)gerar o arquivo/diretório `caminho`, a menos que
+        ele exista e tenha sido gerado pela mesma chave. Devolve True se gravou.
+        """
+        caminho = os.path.abspath(caminho)
+        if self.ativo and os.path.exists(caminho) and self.saidas.get(caminho) == chave:
+            logger.info("Cache: %s inalterado", caminho)
+            return False
+        funcao()
+        if self.ativo:
+            self._registrar_saida(caminho, chave)
+        return True
+
+    def _registrar_saida(self, caminho, chave):
+        """Anota em saidas.json que `caminho` foi gerado por `chave`."""
+        self.saidas[os.path.abspath(caminho)] = chave
+        fd, tmp = tempfile.mkstemp(prefix="tmp_saidas_", suffix=".json", dir=self.diretorio)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self.saidas, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, os.path.join(self.diretorio, ARQUIVO_SAIDAS))
+
+    def _despejar(self):
+        """Apaga as entradas menos usadas recentemente até o total caber em limite."""
+        entradas = []
+        for nome in os.listdir(self.diretorio):
+            if nome.endswith(EXTENSAO) and not nome.startswith("tmp_"):
+                st = os.stat(os.path.join(self.diretorio, nome))
+                entradas.append((st.st_mtime, st.st_size, nome))
+        total = sum(e[1] for e in entradas)
+        for _, tamanho, nome in sorted(entradas):
+            if total <= self.limite:
+                break
+            os.remove(os.path.join(self.diretorio, nome))
+            total -= tamanho
+            logger.info("Cache: %s removido (limite de %d MB)", nome, self.limite // (1024 * 1024))
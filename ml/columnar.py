@@ -0,0 +1,289 @@
+# coding: utf-8
+"""
+columnar.py - Saída colunar (Parquet ou Arrow IPC) para dados_enriquecidos e
+dados_resultados do pipeline_sensor5.
+
+- dataset particionado no estilo hive: <raiz>/data=AAAA-MM-DD/id_maquina=N/part-0.parquet
+  (um arquivo por partição: as partes gravadas em chunks são compactadas no fechar())
+- tipos preservados (criticidade continua categórica e ordenada, ts como datetime)
+- leitura com memory-map: Arrow IPC é lido sem cópia; Parquet é mapeado e
+  só as colunas/partições pedidas são decodificadas (filters/columns).
+
+pyarrow é dependência opcional: só é importado quando o formato colunar é usado.
+"""
+import os
+import time
+import shutil
+import logging
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger("pipeline_sensor5")
+
+FORMATOS = ("csv", "parquet", "arrow")
+PARTICOES = ("data", "id_maquina")
+EXTENSAO = {"parquet": ".parquet", "arrow": ".arrow"}
+# metadado do schema com as colunas de partição criadas na gravação (ex.: "data"),
+# que não existiam no DataFrame original e saem da leitura
+META_DERIVADAS = b"columnar.derivadas"
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        import pyarrow.fs as fs
+    except ImportError as e:
+        raise RuntimeError("Formato colunar requer pyarrow (pip install pyarrow)") from e
+    return pa, ds, fs
+
+
+# granularidade da partição "data": dia, mês ou ano (unidades do numpy datetime64)
+UNIDADE_DATA = {"dia": "D", "mes": "M", "ano": "Y"}
+# "auto" sobe para mês/ano quando os arquivos por dia x máquina ficariam pequenos demais
+MIN_LINHAS_ARQUIVO = 50_000
+
+
+def _truncar(ts, nivel):
+    return ts.to_numpy(dtype="datetime64[ns]").astype(f"datetime64[{UNIDADE_DATA[nivel]}]")
+
+
+def _granularidade(ts, df, cols):
+    chaves = {c: df[c].to_numpy() for c in cols if c != "data"}
+    for nivel in ("dia", "mes"):
+        grupos = len(pd.DataFrame(dict(chaves, data=_truncar(ts, nivel).view("i8"))).drop_duplicates())
+        if len(df) / max(grupos, 1) >= MIN_LINHAS_ARQUIVO:
+            return nivel
+    return "ano"
+
+
+def _com_particoes(df, particoes, granularidade="auto"):
+    """
+    Adiciona a coluna 'data' (dia/mês/ano do ts) e devolve (df, partições
+    disponíveis, granularidade usada).
+    """
+    out = df
+    if "data" in particoes and "data" not in df.columns and "ts" in df.columns:
+        ts = pd.to_datetime(df["ts"], errors="coerce")
+        cols = [c for c in particoes if c in df.columns or c == "data"]
+        if granularidade == "auto":
+            granularidade = _granularidade(ts, df, cols)
+        # formata só os valores distintos (strftime linha a linha é lento)
+        codigos, unicos = pd.factorize(_truncar(ts, granularidade), use_na_sentinel=False)
+        rotulos = np.where(pd.isna(unicos), "sem_data", np.datetime_as_string(unicos))
+        out = df.assign(data=rotulos[codigos] if len(unicos) else np.array([], dtype=object))
+    cols = [c for c in particoes if c in out.columns]
+    return out, cols, granularidade
+
+
+def _opcoes_escrita(ds, formato):
+    """(formato do pyarrow.dataset, opções de escrita) para parquet/arrow."""
+    if formato == "parquet":
+        return "parquet", ds.ParquetFileFormat().make_write_options(compression="zstd")
+    # sem compressão: leitura sem cópia
+    return "ipc", ds.IpcFileFormat().make_write_options(compression=None)
+
+
+def _compactar(ds, raiz, formato, prefixo=""):
+    """
+    Junta os arquivos de cada pasta de partição de `raiz` num só (part-<prefixo>0),
+    em streaming por lotes e na ordem em que as partes foram gravadas.
+    """
+    fmt, file_options = _opcoes_escrita(ds, formato)
+    ext = EXTENSAO[formato]
+    for pasta, _, arquivos in os.walk(raiz):
+        partes = [a for a in arquivos if a.endswith(ext)]
+        if len(partes) == 1:
+            os.replace(os.path.join(pasta, partes[0]), os.path.join(pasta, f"part-{prefixo}0" + ext))
+        if len(partes) < 2:
+            continue
+        # part-<prefixo><parte>-<i>: ordena pela parte (chunk) e pelo índice dentro dela
+        partes.sort(key=lambda a: tuple(int(x) for x in a[len("part-" + prefixo):-len(ext)].split("-")))
+        caminhos = [os.path.join(pasta, a) for a in partes]
+        origem = ds.dataset(caminhos, format=fmt)
+        saida = tempfile.mkdtemp(prefix="tmp_compactar_", dir=pasta)
+        ds.write_dataset(origem, saida, format=fmt, file_options=file_options,
+                         basename_template=f"part-{prefixo}{{i}}" + ext, preserve_order=True,
+                         min_rows_per_group=1 << 17, max_rows_per_group=1 << 20)
+        for c in caminhos:
+            os.remove(c)
+        for a in os.listdir(saida):
+            os.replace(os.path.join(saida, a), os.path.join(pasta, a))
+        os.rmdir(saida)
+
+
+def _granularidade_existente(destino):
+    """Granularidade de 'data' de um dataset já gravado (pelo rótulo: 2025-08-01, 2025-08 ou 2025)."""
+    niveis = {10: "dia", 7: "mes", 4: "ano"}
+    for _, dirs, _ in os.walk(destino):
+        for d in dirs:
+            if d.startswith("data=") and len(d) - 5 in niveis:
+                return niveis[len(d) - 5]
+    return None
+
+
+def _schema_existente(pa, destino, formato):
+    """Schema (sem as colunas de partição) de um arquivo do dataset em destino, ou None."""
+    for raiz, _, arquivos in os.walk(destino):
+        for a in sorted(arquivos):
+            if a.endswith(EXTENSAO[formato]):
+                caminho = os.path.join(raiz, a)
+                if formato == "parquet":
+                    import pyarrow.parquet as pq
+                    return pq.read_schema(caminho)
+                with pa.memory_map(caminho) as f:
+                    return pa.ipc.open_file(f).schema
+    return None
+
+
+def _mover_partes(tmp_dir, destino):
+    """Move os arquivos de tmp_dir para destino, mantendo as pastas de partição."""
+    for raiz, _, arquivos in os.walk(tmp_dir):
+        alvo = os.path.join(destino, os.path.relpath(raiz, tmp_dir))
+        os.makedirs(alvo, exist_ok=True)
+        for a in arquivos:
+            os.replace(os.path.join(raiz, a), os.path.join(alvo, a))
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _substituir_dir(tmp_dir, destino):
+    """Troca o diretório destino pelo recém-gravado (mesma ideia do tmp -> os.replace dos CSVs)."""
+    antigo = None
+    if os.path.exists(destino):
+        antigo = destino + ".old"
+        if os.path.exists(antigo):
+            shutil.rmtree(antigo, ignore_errors=True)
+        os.replace(destino, antigo)
+    os.replace(tmp_dir, destino)
+    if antigo:
+        shutil.rmtree(antigo, ignore_errors=True)
+
+
+class EscritorColunar:
+    """
+    Grava um dataset particionado em partes (ex.: um chunk por vez) num
+    diretório temporário; fechar() compacta as partes de cada partição num
+    único arquivo e troca o destino pelo dataset completo.
+    O schema da primeira parte vale para as seguintes (as demais são convertidas).
+    anexar=True: fechar() acrescenta os arquivos novos ao dataset existente em
+    destino (mesma granularidade e tipos das partes já gravadas; um arquivo
+    novo por partição a cada execução).
+    """
+
+    def __init__(self, destino, formato="parquet", particoes=PARTICOES, granularidade="auto", anexar=False):
+        self.pa, self.ds, _ = _pyarrow()
+        self.destino = destino
+        self.formato = formato
+        self.particoes = particoes
+        self.granularidade = granularidade
+        self.schema = None
+        self.cols = []
+        self.partes = 0
+        self.linhas = 0
+        self.anexar = anexar and os.path.isdir(destino)
+        self.base = None
+        # prefixo único para os nomes dos arquivos não colidirem com os já gravados
+        self.prefixo = ""
+        if self.anexar:
+            self.granularidade = _granularidade_existente(destino) or granularidade
+            self.base = _schema_existente(self.pa, destino, formato)
+            self.prefixo = format(time.time_ns(), "x") + "-"
+        parent = os.path.dirname(destino) or "."
+        os.makedirs(parent, exist_ok=True)
+        self.tmp_dir = tempfile.mkdtemp(prefix="tmp_" + os.path.basename(destino) + "_", dir=parent)
+
+    def escrever(self, df):
+        ds = self.ds
+        # a granularidade escolhida na primeira parte vale para o dataset inteiro
+        derivadas = [c for c in self.particoes if c not in df.columns]
+        df, cols, self.granularidade = _com_particoes(df, self.particoes, self.granularidade)
+        table = self.pa.Table.from_pandas(df, preserve_index=False)
+        if self.schema is None:
+            self.cols = cols
+            metadata = dict(table.schema.metadata or {})
+            metadata[META_DERIVADAS] = ",".join(c for c in cols if c in derivadas).encode()
+            campos = list(table.schema)
+            if self.base is not None:
+                campos = [self.base.field(n) if n in self.base.names else f
+                          for n, f in zip(table.schema.names, table.schema)]
+            self.schema = self.pa.schema(campos, metadata=metadata)
+            table = table.cast(self.schema)
+        else:
+            table = table.select(self.schema.names).cast(self.schema)
+        fmt, file_options = _opcoes_escrita(ds, self.formato)
+        partitioning = ds.partitioning(self.schema.empty_table().select(self.cols).schema, flavor="hive") \
+            if self.cols else None
+        ds.write_dataset(table, self.tmp_dir, format=fmt, partitioning=partitioning, file_options=file_options,
+                         basename_template=f"part-{self.prefixo}{self.partes}-{{i}}" + EXTENSAO[self.formato],
+                         existing_data_behavior="overwrite_or_ignore",
+                         max_rows_per_group=1 << 20, max_partitions=1 << 16)
+        self.partes += 1
+        self.linhas += len(df)
+
+    def fechar(self):
+        _compactar(self.ds, self.tmp_dir, self.formato, self.prefixo)
+        if self.anexar:
+            _mover_partes(self.tmp_dir, self.destino)
+            logger.info("Anexadas %d linhas ao dataset %s: %s", self.linhas, self.formato, self.destino)
+            return self.destino
+        _substituir_dir(self.tmp_dir, self.destino)
+        logger.info("Salvo %s particionado por %s: %s (linhas=%d)", self.formato, self.cols or "-",
+                    self.destino, self.linhas)
+        return self.destino
+
+    def abortar(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+
+def salvar_colunar(df, destino, formato="parquet", particoes=PARTICOES, granularidade="auto"):
+    """
+    Grava df como dataset particionado (Parquet/zstd ou Arrow IPC) em `destino`
+    (um diretório). Grava em um diretório temporário e troca no final.
+    Retorna o caminho do dataset.
+    """
+    escritor = EscritorColunar(destino, formato, particoes, granularidade)
+    try:
+        escritor.escrever(df)
+        return escritor.fechar()
+    except Exception:
+        escritor.abortar()
+        raise
+
+
+def abrir_dataset(caminho, formato=None):
+    """pyarrow.dataset.Dataset do diretório gravado por salvar_colunar."""
+    pa, ds, fs = _pyarrow()
+    if formato is None:
+        formato = "arrow" if any(f.endswith(".arrow") for _, _, fs in os.walk(caminho) for f in fs) else "parquet"
+    fmt = ds.ParquetFileFormat(default_fragment_scan_options=ds.ParquetFragmentScanOptions(pre_buffer=False)) \
+        if formato == "parquet" else ds.IpcFileFormat()
+    return ds.dataset(caminho, format=fmt, partitioning="hive", filesystem=fs.LocalFileSystem(use_mmap=True))
+
+
+def ler_colunar(caminho, columns=None, filtro=None, formato=None):
+    """
+    Lê o dataset de volta como DataFrame (memory-mapped; só as colunas e partições pedidas).
+    filtro: expressão pyarrow, ex. ds.field("id_maquina") == 12.
+    As colunas de partição criadas na gravação (ex.: "data") só voltam se
+    pedidas em `columns`; as demais voltam com o tipo original (e, sem
+    `columns`, na posição original).
+    """
+    pa, ds, fs = _pyarrow()
+    dataset = abrir_dataset(caminho, formato)
+    pedidas = columns
+    if columns is None:
+        derivadas = (dataset.schema.metadata or {}).get(META_DERIVADAS, b"").decode().split(",")
+        columns = [c for c in dataset.schema.names if c not in derivadas]
+    table = dataset.to_table(columns=columns, filter=filtro)
+    out = table.to_pandas()
+    # colunas de partição voltam com o tipo inferido do nome do diretório (int32/str) e no fim;
+    # restaura o tipo e a ordem originais registrados nos metadados do pandas
+    meta = {c["name"]: c["numpy_type"] for c in (table.schema.pandas_metadata or {}).get("columns", [])}
+    for c in dataset.partitioning.schema.names if dataset.partitioning else []:
+        if c in out.columns and meta.get(c, "").startswith(("int", "float")):
+            out[c] = out[c].astype(meta[c])
+    if pedidas is None:
+        out = out[[c for c in meta if c in out.columns] + [c for c in out.columns if c not in meta]]
+    return out
@@ -0,0 +1,121 @@
+# coding: utf-8
+"""
+features.py - Features de janela de tempo por máquina para o classificador.
+
+Para cada coluna (vibracao, temperatura, qualidade_ar) e cada janela (ex.: 6h,
+24h) calcula, por id_maquina, sobre as leituras de (ts - janela, ts]:
+
+    <coluna>_media_<janela>, <coluna>_desvio_<janela>,
+    <coluna>_inclinacao_<janela> (tendência linear, unidades por hora),
+    <coluna>_max_<janela>
+
+Tudo vetorizado com groupby().rolling() sobre os dados ordenados por máquina
+e ts (a inclinação sai de somas móveis: n, Σt, Σt², Σx, Σtx).
+
+Modo incremental: FeaturesJanela.atualizar(novas) guarda, por máquina, só as
+leituras que ainda cabem na maior janela; cada lote novo é calculado junto
+com essa cauda, sem reprocessar o histórico.
+"""
+import numpy as np
+import pandas as pd
+
+COLUNAS_JANELA = ("vibracao", "temperatura", "qualidade_ar")
+JANELAS_PADRAO = ("6h", "24h")
+ESTATISTICAS = ("media", "desvio", "inclinacao", "max")
+
+
+def nomes_features(colunas=COLUNAS_JANELA, janelas=JANELAS_PADRAO):
+    return [f"{c}_{e}_{j}" for j in janelas for c in colunas for e in ESTATISTICAS]
+
+
+class FeaturesJanela:
+    def __init__(self, janelas=JANELAS_PADRAO, colunas=COLUNAS_JANELA, chave="id_maquina", ts="ts"):
+        self.janelas = list(janelas)
+        self.colunas = list(colunas)
+        self.chave = chave
+        self.ts = ts
+        self.maior = max(pd.Timedelta(j) for j in self.janelas) if self.janelas else pd.Timedelta(0)
+        self.cauda = None
+
+    def transformar(self, df):
+        """Features sobre o histórico inteiro de df (sem estado)."""
+        return df.join(self._calcular(df))
+
+    def atualizar(self, df):
+        """
+        Features das linhas de df usando a cauda guardada das chamadas anteriores;
+        depois guarda a nova cauda (leituras dentro da maior janela, por máquina).
+        """
+        base = self._base(df)
+        if self.cauda is not None and len(self.cauda):
+            junto = pd.concat([self.cauda, base], ignore_index=True)
+        else:
+            junto = base.reset_index(drop=True)
+        feats = self._calcular(junto, ja_base=True)
+        novas = feats.iloc[len(junto) - len(base):]
+        novas.index = df.index
+        self._guardar_cauda(junto)
+        return df.join(novas)
+
+    def _base(self, df):
+        """Só o necessário para as janelas: chave, ts (datetime) e colunas numéricas."""
+        base = pd.DataFrame(index=df.index)
+        base[self.chave] = df[self.chave] if self.chave in df.columns else np.nan
+        base[self.ts] = pd.to_datetime(df[self.ts], errors="coerce") if self.ts in df.columns else pd.NaT
+        for c in self.colunas:
+            base[c] = pd.to_numeric(df[c], errors="coerce") if c in df.columns else np.nan
+        return base
+
+    def _guardar_cauda(self, junto):
+        validas = junto[junto[self.ts].notna() & junto[self.chave].notna()]
+        if validas.empty:
+            return
+        ultimo = validas.groupby(self.chave)[self.ts].transform("max")
+        self.cauda = validas[validas[self.ts] > ultimo - self.maior].reset_index(drop=True)
+
+    def _calcular(self, df, ja_base=False):
+        base = df if ja_base else self._base(df)
+        nomes = nomes_features(self.colunas, self.janelas)
+        out = pd.DataFrame(np.nan, index=base.index, columns=nomes)
+        validas = (base[self.ts].notna() & base[self.chave].notna()).to_numpy()
+        if not validas.any() or not self.janelas:
+            return out
+        b = base[validas]
+        # ordena por máquina e ts (lexsort é estável); posição original para devolver na ordem de df
+        ordem = np.lexsort((b[self.ts].to_numpy(), b[self.chave].to_numpy()))
+        b = b.iloc[ordem].reset_index(drop=True)
+        t = (b[self.ts] - b[self.ts].min()) / pd.Timedelta(hours=1)
+        aux = {self.chave: b[self.chave], self.ts: b[self.ts]}
+        for c in self.colunas:
+            x = b[c]
+            m = x.notna().astype(float)
+            aux[c] = x
+            aux[c + "__n"] = m
+            aux[c + "__t"] = t * m
+            aux[c + "__t2"] = t * t * m
+            aux[c + "__tx"] = (t * x).fillna(0.0)
+        aux = pd.DataFrame(aux)
+        somas = [c + s for c in self.colunas for s in ("__n", "__t", "__t2", "__tx")]
+
+        resultado = {}
+        for j in self.janelas:
+            r = aux.groupby(self.chave, sort=False).rolling(j, on=self.ts)
+            media = r[self.colunas].mean().reset_index(drop=True)
+            desvio = r[self.colunas].std().reset_index(drop=True)
+            maximo = r[self.colunas].max().reset_index(drop=True)
+            s = r[somas].sum().reset_index(drop=True)
+            for c in self.colunas:
+                n, st, st2, stx = (s[c + k].to_numpy() for k in ("__n", "__t", "__t2", "__tx"))
+                sx = media[c].to_numpy() * n
+                den = n * st2 - st * st
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    inclinacao = np.where(den > 1e-12, (n * stx - st * sx) / den, np.nan)
+                resultado[f"{c}_media_{j}"] = media[c].to_numpy()
+                resultado[f"{c}_desvio_{j}"] = desvio[c].to_numpy()
+                resultado[f"{c}_inclinacao_{j}"] = inclinacao
+                resultado[f"{c}_max_{j}"] = maximo[c].to_numpy()
+        # groupby(sort=False).rolling devolve os grupos na ordem de aparição, que já é a ordem de b
+        calc = pd.DataFrame(resultado, columns=nomes)
+        pos_validas = np.flatnonzero(validas)[ordem]
+        out.iloc[pos_validas] = calc.to_numpy()
+        return out
@@ -0,0 +1,228 @@
+# coding: utf-8
+"""
+figuras.py - Figuras dos dashboards do pipeline_sensor5 montadas a partir de
+agregados, não das linhas brutas.
+
+px.histogram/px.box embutem todos os pontos no HTML (pio.to_html), então o
+arquivo e o tempo de serialização crescem com o número de leituras. Aqui cada
+figura sai de um resumo calculado em NumPy/pandas:
+
+- hist: contagens de np.histogram (nbins barras);
+- barras: contagem por categoria (as MAX_CATEGORIAS mais frequentes; as
+  demais somadas em "(outras)"), uma cor por categoria;
+- box / box_grupo: quartis, cercas de 1.5*IQR e média (go.Box com as
+  estatísticas prontas, sem os pontos individuais);
+- linha: série por grupo reduzida a min/max por balde (series_maquinas.py),
+  em WebGL (scattergl).
+
+renderizar() gera o fragmento HTML de cada figura num pool de processos
+(joblib) e guarda cada um em <dashboards>/fragmentos/<dashboard>/<chave>.html.
+A chave é o hash das colunas de entrada + a especificação da figura, então numa
+nova execução só as figuras cujas colunas mudaram são recalculadas.
+"""
+import os
+import json
+import hashlib
+import logging
+import tempfile
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io as pio
+from plotly.colors import qualitative
+from plotly.offline import get_plotlyjs_version
+
+from series_maquinas import PONTOS_PADRAO, series_por_maquina
+
+logger = logging.getLogger("pipeline_sensor5")
+
+# incrementar quando a aparência das figuras mudar (invalida os fragmentos gravados)
+VERSAO_FIGURAS = 2
+MAX_CATEGORIAS = 50
+CORES = qualitative.Plotly
+
+
+class Figura:
+    """
+    Especificação de uma figura: tipo ("hist", "barras", "box", "box_grupo", "linha"),
+    colunas de entrada (na ordem usada por construir_figura), título e opções
+    (ex.: nbins, cor=True).
+    """
+
+    def __init__(self, tipo, colunas, titulo, **opcoes):
+        self.tipo = tipo
+        self.colunas = list(colunas)
+        self.titulo = titulo
+        self.opcoes = opcoes
+
+    def chave(self, df):
+        h = hashlib.sha256(json.dumps([VERSAO_FIGURAS, self.tipo, self.colunas, self.titulo, self.opcoes],
+                                      sort_keys=True, default=str).encode("utf-8"))
+        for c in self.colunas:
+            h.update(str(df[c].dtype).encode("utf-8"))
+            h.update(pd.util.hash_pandas_object(df[c], index=False).to_numpy().tobytes())
+        return h.hexdigest()
+
+
+# --- Resumos ---
+def _finitos(serie):
+    v = pd.to_numeric(serie, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+    return v[np.isfinite(v)]
+
+
+def resumo_histograma(serie, nbins=30):
+    """(centros, larguras, contagens) das nbins barras; None sem valores numéricos."""
+    v = _finitos(serie)
+    if not len(v):
+        return None
+    contagens, bordas = np.histogram(v, bins=nbins)
+    return (bordas[:-1] + bordas[1:]) / 2, np.diff(bordas), contagens
+
+
+def resumo_contagens(serie, limite=MAX_CATEGORIAS):
+    """Contagem por categoria (Series): ordem das categorias, se categórica; senão, a natural."""
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie.value_counts(sort=False)
+    vc = serie.value_counts()
+    if len(vc) > limite:
+        outras = vc.iloc[limite:].sum()
+        vc = pd.concat([vc.iloc[:limite], pd.Series([outras], index=["(outras)"])])
+        return vc
+    try:
+        return vc.sort_index()
+    except TypeError:
+        return vc
+
+
+def resumo_box(serie):
+    """Estatísticas do boxplot (q1, mediana, q3, cercas de 1.5*IQR, média); None se vazio."""
+    v = _finitos(serie)
+    if not len(v):
+        return None
+    q1, mediana, q3 = np.percentile(v, [25, 50, 75])
+    iqr = q3 - q1
+    return {
+        "q1": q1, "median": mediana, "q3": q3, "mean": v.mean(),
+        "lowerfence": v[v >= q1 - 1.5 * iqr].min(),
+        "upperfence": v[v <= q3 + 1.5 * iqr].max(),
+    }
+
+
+# --- Figuras ---
+def _box(stats, nome, x=None, cor=None):
+    return go.Box(q1=[stats["q1"]], median=[stats["median"]], q3=[stats["q3"]], mean=[stats["mean"]],
+                  lowerfence=[stats["lowerfence"]], upperfence=[stats["upperfence"]], name=nome,
+                  x=None if x is None else [x], marker_color=cor, boxpoints=False)
+
+
+def construir_figura(figura, dados):
+    """go.Figure da especificação a partir de {coluna: Series}; None se não houver dados."""
+    tipo, cols = figura.tipo, figura.colunas
+    fig = go.Figure()
+    if tipo == "hist":
+        resumo = resumo_histograma(dados[cols[0]], figura.opcoes.get("nbins", 30))
+        if resumo is None:
+            return None
+        centros, larguras, contagens = resumo
+        fig.add_trace(go.Bar(x=centros, y=contagens, width=larguras, name=cols[0]))
+        fig.update_layout(bargap=0, xaxis_title=cols[0], yaxis_title="count")
+    elif tipo == "barras":
+        vc = resumo_contagens(dados[cols[0]])
+        if vc.empty:
+            return None
+        if figura.opcoes.get("cor"):
+            for i, (cat, n) in enumerate(vc.items()):
+                fig.add_trace(go.Bar(x=[str(cat)], y=[n], name=str(cat), marker_color=CORES[i % len(CORES)]))
+            fig.update_layout(legend_title_text=cols[0])
+        else:
+            fig.add_trace(go.Bar(x=[str(c) for c in vc.index], y=vc.to_numpy(), name=cols[0]))
+        fig.update_layout(xaxis_title=cols[0], yaxis_title="count")
+    elif tipo == "box":
+        stats = resumo_box(dados[cols[0]])
+        if stats is None:
+            return None
+        fig.add_trace(_box(stats, cols[0]))
+        fig.update_layout(yaxis_title=cols[0])
+    elif tipo == "box_grupo":
+        grupo, y = dados[cols[0]], dados[cols[1]]
+        grupos = resumo_contagens(grupo).index
+        for i, g in enumerate(grupos):
+            stats = resumo_box(y[(grupo == g).to_numpy()]) if g != "(outras)" else None
+            if stats is not None:
+                fig.add_trace(_box(stats, str(g), x=str(g), cor=CORES[i % len(CORES)]))
+        if not fig.data:
+            return None
+        fig.update_layout(xaxis_title=cols[0], yaxis_title=cols[1], legend_title_text=cols[0])
+    elif tipo == "linha":
+        # série temporal por grupo (máquina), reduzida a min/max por balde e desenhada em WebGL
+        series = series_por_maquina(pd.DataFrame(dados), [cols[1]], figura.opcoes.get("pontos", PONTOS_PADRAO),
+                                    chave=cols[2], ts=cols[0])
+        for i, (g, s) in enumerate(series.items()):
+            x, y = s[cols[1]]
+            fig.add_trace(go.Scattergl(x=x.astype("datetime64[ms]"), y=y, mode="lines", name=str(g),
+                                       line_color=CORES[i % len(CORES)]))
+        if not fig.data:
+            return None
+        fig.update_layout(xaxis_title=cols[0], yaxis_title=cols[1], legend_title_text=cols[2])
+    else:
+        raise ValueError(f"tipo de figura desconhecido: {tipo}")
+    fig.update_layout(title=figura.titulo)
+    return fig
+
+
+def fragmento(figura, dados):
+    """HTML (div + script, sem o plotly.js) de uma figura; "" se ela não puder ser gerada."""
+    try:
+        fig = construir_figura(figura, dados)
+    except Exception as e:
+        logger.debug("Erro ao criar %s: %s", figura.titulo, e)
+        return ""
+    if fig is None:
+        return ""
+    return pio.to_html(fig, include_plotlyjs=False, full_html=False, auto_play=False)
+
+
+def _gravar_texto(caminho, texto, prefixo="tmp_"):
+    fd, tmp = tempfile.mkstemp(prefix=prefixo, suffix=".html", dir=os.path.dirname(caminho) or ".")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(texto)
+    os.replace(tmp, caminho)
+
+
+def renderizar(figuras, df, dash_path, n_jobs=1):
+    """
+    Grava dash_path com as figuras (na ordem da lista). Fragmentos já gravados
+    com a mesma chave são reaproveitados; os demais são gerados em paralelo
+    (n_jobs processos). Devolve (novas, reaproveitadas).
+    """
+    dash_dir = os.path.dirname(dash_path) or "."
+    frag_dir = os.path.join(dash_dir, "fragmentos", os.path.splitext(os.path.basename(dash_path))[0])
+    os.makedirs(frag_dir, exist_ok=True)
+    chaves = [f.chave(df) for f in figuras]
+    pendentes = [i for i, k in enumerate(chaves) if not os.path.exists(os.path.join(frag_dir, k + ".html"))]
+
+    if pendentes:
+        tarefas = [(figuras[i], {c: df[c] for c in figuras[i].colunas}) for i in pendentes]
+        if n_jobs == 1 or len(tarefas) == 1:
+            fragmentos = [fragmento(f, d) for f, d in tarefas]
+        else:
+            from joblib import Parallel, delayed
+            fragmentos = Parallel(n_jobs=n_jobs)(delayed(fragmento)(f, d) for f, d in tarefas)
+        for i, frag in zip(pendentes, fragmentos):
+            _gravar_texto(os.path.join(frag_dir, chaves[i] + ".html"), frag, "tmp_frag_")
+
+    # fragmentos de figuras que saíram do dashboard
+    atuais = {k + ".html" for k in chaves}
+    for nome in os.listdir(frag_dir):
+        if nome.endswith(".html") and nome not in atuais:
+            os.remove(os.path.join(frag_dir, nome))
+
+    partes = ['<html>\n<head><meta charset="utf-8" />',
+              f'<script src="https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js"></script></head>\n<body>']
+    for k in chaves:
+        with open(os.path.join(frag_dir, k + ".html"), encoding="utf-8") as f:
+            partes.append(f.read())
+    partes.append("</body>\n</html>\n")
+    _gravar_texto(dash_path, "\n".join(partes), "tmp_dash_")
+    return len(pendentes), len(chaves) - len(pendentes)
@@ -0,0 +1,192 @@
+# coding: utf-8
+"""
+incremental.py - Execuções incrementais do pipeline_sensor5 (--incremental).
+
+O manifesto (<saida>/manifesto.json) registra o que a última execução já
+processou:
+
+- sensores: offset (bytes) já lido de leitura_sensores.csv, hash dos últimos
+  bytes antes do offset (detecta arquivo reescrito em vez de anexado) e a
+  marca d'água (maior id_leitura_sensores e maior ts);
+- dimensoes: tamanho e hash de máquinas, manutenção e funcionários;
+- parametros que mudam as saídas (formato, janelas) e a versão dos modelos.
+
+planejar() compara o manifesto com os arquivos atuais e decide entre "nada"
+(sem leituras novas), "delta" (só as linhas anexadas depois do offset) e
+"completo" (primeira execução, dimensão alterada, arquivo reescrito, parâmetro
+ou modelo novo). O estado das features de janela (FeaturesJanela) fica ao lado
+do manifesto para o delta continuar as janelas de onde parou.
+"""
+import io
+import os
+import json
+import hashlib
+import logging
+import tempfile
+
+import pandas as pd
+
+logger = logging.getLogger("pipeline_sensor5")
+
+ARQUIVO_MANIFESTO = "manifesto.json"
+ARQUIVO_ESTADO_JANELAS = "estado_janelas.pkl"
+DIMENSOES = ("maquinas", "manutencao", "funcionarios")
+# trecho conferido antes do offset: barato mesmo com leitura_sensores.csv grande
+BYTES_CONFERENCIA = 64 * 1024
+
+
+def _hash_trecho(caminho, fim, n=BYTES_CONFERENCIA):
+    """sha256 dos n bytes que terminam em `fim` (None = arquivo inteiro)."""
+    inicio = 0 if n is None else max(fim - n, 0)
+    with open(caminho, "rb") as f:
+        f.seek(inicio)
+        return hashlib.sha256(f.read(fim - inicio)).hexdigest()
+
+
+def assinatura(caminho):
+    """Tamanho e hash do conteúdo (None se o arquivo não existe). Só para as tabelas pequenas."""
+    if not os.path.exists(caminho):
+        return None
+    tamanho = os.path.getsize(caminho)
+    return {"tamanho": tamanho, "hash": _hash_trecho(caminho, tamanho, None)}
+
+
+def fim_ultima_linha(caminho, bloco=8192):
+    """Posição logo após o último '\\n' (uma linha ainda sendo gravada fica para a próxima execução)."""
+    with open(caminho, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        while pos > 0:
+            passo = min(bloco, pos)
+            f.seek(pos - passo)
+            dados = f.read(passo)
+            i = dados.rfind(b"\n")
+            if i >= 0:
+                return pos - passo + i + 1
+            pos -= passo
+    return 0
+
+
+def ler_manifesto(outdir):
+    caminho = os.path.join(outdir, ARQUIVO_MANIFESTO)
+    try:
+        with open(caminho, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning("Manifesto ilegível (%s): %s; a execução será completa", caminho, e)
+        return None
+
+
+def gravar_manifesto(outdir, manifesto):
+    """Grava o manifesto (tmp + os.replace, como os CSVs de saída)."""
+    fd, tmp = tempfile.mkstemp(prefix="tmp_manifesto_", suffix=".json", dir=outdir)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(manifesto, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, os.path.join(outdir, ARQUIVO_MANIFESTO))
+    return manifesto
+
+
+def montar_manifesto(arquivos, parametros, versao_modelos, marca, offset, linhas):
+    """Manifesto de uma execução que processou leitura_sensores.csv até `offset` (bytes)."""
+    return {
+        "atualizado_em": pd.Timestamp.now().isoformat(timespec="seconds"),
+        "parametros": parametros,
+        "versao_modelos": versao_modelos,
+        "dimensoes": {nome: assinatura(arquivos[nome]) for nome in DIMENSOES},
+        "sensores": {"offset": offset, "hash": _hash_trecho(arquivos["sensores"], offset),
+                     "linhas": linhas, "marca": marca},
+    }
+
+
+def planejar(manifesto, arquivos, parametros, versao_modelos):
+    """Devolve (plano, motivo), com plano em "nada", "delta" ou "completo"."""
+    if not manifesto:
+        return "completo", "primeira execução (sem manifesto)"
+    if manifesto.get("parametros") != parametros:
+        return "completo", "parâmetros mudaram"
+    if manifesto.get("versao_modelos") != versao_modelos:
+        return "completo", "versão dos modelos mudou"
+    for nome in DIMENSOES:
+        if manifesto.get("dimensoes", {}).get(nome) != assinatura(arquivos[nome]):
+            return "completo", f"{os.path.basename(arquivos[nome])} mudou"
+    sensores = manifesto["sensores"]
+    fim = fim_ultima_linha(arquivos["sensores"])
+    if fim < sensores["offset"] or _hash_trecho(arquivos["sensores"], sensores["offset"]) != sensores["hash"]:
+        return "completo", f"{os.path.basename(arquivos['sensores'])} foi reescrito"
+    if fim == sensores["offset"]:
+        return "nada", "sem leituras novas"
+    return "delta", f"{fim - sensores['offset']} bytes novos"
+
+
+def ler_delta(caminho, inicio, fim, chunksize=None):
+    """
+    Lê as linhas de `caminho` entre os bytes [inicio, fim) com o cabecalho do
+    arquivo, em DataFrames de até chunksize linhas (None = um só).
+    """
+    colunas = pd.read_csv(caminho, nrows=0).columns.tolist()
+    with open(caminho, "rb") as f:
+        f.seek(inicio)
+        pos, linhas = inicio, []
+        while pos < fim:
+            linha = f.readline()
+            if not linha:
+                break
+            pos += len(linha)
+            if linha.strip():
+                linhas.append(linha)
+            if chunksize and len(linhas) >= chunksize:
+                yield pd.read_csv(io.BytesIO(b"".join(linhas)), header=None, names=colunas)
+                linhas = []
+        if linhas:
+            yield pd.read_csv(io.BytesIO(b"".join(linhas)), header=None, names=colunas)
+
+
+def atualizar_marca(marca, df):
+    """Marca d'água: maior id_leitura_sensores e maior ts vistos até agora."""
+    marca = dict(marca or {"id": None, "ts": None})
+    if "id_leitura_sensores" in df.columns:
+        ids = pd.to_numeric(df["id_leitura_sensores"], errors="coerce").max()
+        if pd.notna(ids):
+            marca["id"] = int(ids) if marca["id"] is None else max(marca["id"], int(ids))
+    if "ts" in df.columns:
+        ts = pd.to_datetime(df["ts"], errors="coerce").max()
+        if pd.notna(ts):
+            marca["ts"] = ts.isoformat() if marca["ts"] is None else max(pd.Timestamp(marca["ts"]), ts).isoformat()
+    return marca
+
+
+def filtrar_marca(df, marca):
+    """
+    Descarta linhas que já passaram pela marca d'água: id_leitura_sensores
+    <= marca["id"] ou, sem a coluna de id, ts <= marca["ts"].
+    """
+    if not marca:
+        return df
+    if marca.get("id") is not None and "id_leitura_sensores" in df.columns:
+        novas = pd.to_numeric(df["id_leitura_sensores"], errors="coerce") > marca["id"]
+    elif marca.get("ts") and "ts" in df.columns:
+        novas = pd.to_datetime(df["ts"], errors="coerce") > pd.Timestamp(marca["ts"])
+    else:
+        return df
+    if not novas.all():
+        logger.info("Marca d'água: %d linhas já processadas ignoradas", int((~novas).sum()))
+    return df[novas].reset_index(drop=True)
+
+
+def salvar_estado_janelas(outdir, estado):
+    caminho = os.path.join(outdir, ARQUIVO_ESTADO_JANELAS)
+    if estado is None:
+        if os.path.exists(caminho):
+            os.remove(caminho)
+        return
+    fd, tmp = tempfile.mkstemp(prefix="tmp_estado_", suffix=".pkl", dir=outdir)
+    os.close(fd)
+    pd.to_pickle(estado, tmp)
+    os.replace(tmp, caminho)
+
+
+def carregar_estado_janelas(outdir):
+    caminho = os.path.join(outdir, ARQUIVO_ESTADO_JANELAS)
+    return pd.read_pickle(caminho) if os.path.exists(caminho) else None
@@ -0,0 +1,208 @@
+# coding: utf-8
+"""
+modelos.py - Artefatos versionados dos modelos do pipeline_sensor5.
+
+O comando "treinar" ajusta o classificador de falhas (ColumnTransformer +
+RandomForest) e o IsolationForest e grava tudo numa versão:
+
+    <dir_modelos>/<AAAAmmdd-HHMMSS>/modelos.joblib   # modelos + features + referência (t-digest)
+    <dir_modelos>/<AAAAmmdd-HHMMSS>/meta.json        # resumo legível (linhas, features, versões)
+    <dir_modelos>/ATUAL                              # nome da versão em uso
+
+O caminho de pontuação (carregar_modelos + Modelos.pontuar) só carrega os
+modelos uma vez e pontua lotes de leituras, sem reajustar nada. A referência
+é um t-digest (quantile_sketch.py) dos scores de treino: os limiares de
+criticidade (quantis 0.75 / 0.9 / 0.98) ficam fixos na versão e cada leitura é
+classificada comparando o score com três números, sem reordenar o histórico;
+a classe de uma leitura não muda quando chegam dados novos.
+
+A versão também leva um segundo IsolationForest ("online"), ajustado só nos
+sensores que chegam ao vivo (COLUNAS_ONLINE), usado por scoring_online.py no
+dashboard e na ingestão.
+"""
+import os
+import json
+import shutil
+import logging
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from quantile_sketch import TDigest
+
+logger = logging.getLogger("pipeline_sensor5")
+
+ARQUIVO_MODELOS = "modelos.joblib"
+ARQUIVO_META = "meta.json"
+PONTEIRO = "ATUAL"
+FORMATO_VERSAO = "%Y%m%d-%H%M%S"
+
+# coluna do pipeline -> coluna das leituras ao vivo (as gravadas pelo dashboard/ingest)
+COLUNAS_ONLINE = {"temperatura": "temperature", "luminosidade": "luminosity", "vibracao": "vibration",
+                  "qualidade_ar": "air_q"}
+
+CRITICIDADE_BINS = [0, 0.75, 0.9, 0.98, 1.0]
+CRITICIDADE_LABELS = ["Baixo", "Médio", "Alto", "Crítico"]
+
+
+def referencia_de_scores(iso, X, n_jobs=1, bloco=50_000):
+    """
+    t-digest dos scores (-score_samples) de X. Com n_jobs > 1 cada bloco é
+    pontuado num processo e os digests parciais são juntados.
+    """
+    blocos = [X.iloc[i:i + bloco] for i in range(0, len(X), bloco)] if hasattr(X, "iloc") else \
+        [X[i:i + bloco] for i in range(0, len(X), bloco)]
+    if n_jobs == 1 or len(blocos) == 1:
+        return TDigest.juntar(TDigest.de_valores(-iso.score_samples(b)) for b in blocos)
+    from joblib import Parallel, delayed
+    parciais = Parallel(n_jobs=n_jobs)(delayed(_digest_bloco)(iso, b) for b in blocos)
+    return TDigest.juntar(parciais)
+
+
+def _digest_bloco(iso, bloco):
+    return TDigest.de_valores(-iso.score_samples(bloco))
+
+
+def limiares_criticidade(referencia):
+    """Scores que separam Baixo/Médio/Alto/Crítico (quantis 0.75, 0.9 e 0.98 da referência)."""
+    return np.asarray(referencia.quantile(CRITICIDADE_BINS[1:-1]), dtype=float)
+
+
+def codigos_criticidade(scores, limiares):
+    """0..3 (índice em CRITICIDADE_LABELS); score igual ao limiar fica na classe de baixo, como no pd.cut."""
+    return np.searchsorted(limiares, scores, side="left")
+
+
+def rank_na_referencia(scores, referencia):
+    """Rank percentual aproximado (CDF da referência), no intervalo (0, 1]."""
+    return np.clip(referencia.cdf(scores), 1.0 / max(referencia.n, 1.0), 1.0)
+
+
+def categorias_criticidade(codigos):
+    return pd.Categorical.from_codes(codigos, categories=CRITICIDADE_LABELS, ordered=True)
+
+
+def _como_referencia(ref):
+    # versões antigas guardavam o vetor ordenado de scores
+    return TDigest.de_valores(ref) if isinstance(ref, np.ndarray) else ref
+
+
+class Modelos:
+    """Modelos ajustados + features usadas no treino + referência dos scores de anomalia."""
+
+    def __init__(self, numeric_features, categorical_features, clf=None, iso=None, referencia=None,
+                 versao=None, info=None, iso_online=None, referencia_online=None, features_online=None):
+        self.numeric_features = list(numeric_features)
+        self.categorical_features = list(categorical_features)
+        self.clf = clf
+        self.iso = iso
+        self.referencia = referencia
+        self.versao = versao
+        self.info = info or {}
+        self.iso_online = iso_online
+        self.referencia_online = referencia_online
+        self.features_online = list(features_online or [])
+        self.limiares = limiares_criticidade(referencia) if referencia is not None else None
+
+    def pontuar(self, df):
+        """
+        Adiciona a df: prob_falha (se houver classificador), anomalia_score,
+        anomalia_rank_pct e criticidade. Colunas ausentes no lote viram NaN.
+        """
+        if self.clf is not None:
+            X = df.reindex(columns=self.numeric_features + self.categorical_features)
+            classes = list(self.clf.classes_)
+            proba = self.clf.predict_proba(X)
+            df["prob_falha"] = proba[:, classes.index(1)] if 1 in classes else 0.0
+        if self.iso is not None:
+            scores = -self.iso.score_samples(df.reindex(columns=self.numeric_features).fillna(0))
+            df["anomalia_score"] = scores
+            df["anomalia_rank_pct"] = pd.Series(rank_na_referencia(scores, self.referencia), index=df.index)
+            df["criticidade"] = pd.Series(categorias_criticidade(codigos_criticidade(scores, self.limiares)),
+                                          index=df.index)
+        return df
+
+
+def salvar_modelos(modelos, dir_modelos):
+    """Grava uma nova versão (diretório temporário + os.replace) e aponta ATUAL para ela."""
+    import joblib
+    import sklearn
+
+    os.makedirs(dir_modelos, exist_ok=True)
+    versao = pd.Timestamp.now().strftime(FORMATO_VERSAO)
+    destino = os.path.join(dir_modelos, versao)
+    sufixo = 1
+    while os.path.exists(destino):
+        destino = os.path.join(dir_modelos, f"{versao}-{sufixo}")
+        sufixo += 1
+    versao = os.path.basename(destino)
+
+    meta = dict(modelos.info, versao=versao, sklearn=sklearn.__version__,
+                numeric_features=modelos.numeric_features, categorical_features=modelos.categorical_features,
+                classificador=modelos.clf is not None, anomalias=modelos.iso is not None,
+                features_online=modelos.features_online,
+                limiares=None if modelos.limiares is None else modelos.limiares.tolist())
+    tmp_dir = tempfile.mkdtemp(prefix="tmp_modelos_", dir=dir_modelos)
+    try:
+        joblib.dump({"clf": modelos.clf, "iso": modelos.iso, "referencia": modelos.referencia,
+                     "numeric_features": modelos.numeric_features,
+                     "categorical_features": modelos.categorical_features, "meta": meta,
+                     "iso_online": modelos.iso_online, "referencia_online": modelos.referencia_online,
+                     "features_online": modelos.features_online},
+                    os.path.join(tmp_dir, ARQUIVO_MODELOS), compress=3)
+        with open(os.path.join(tmp_dir, ARQUIVO_META), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_dir, destino)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    apontar_versao(dir_modelos, versao)
+    modelos.versao, modelos.info = versao, meta
+    logger.info("Modelos salvos: %s", destino)
+    return destino
+
+
+def apontar_versao(dir_modelos, versao):
+    """Faz ATUAL apontar para `versao` (tmp + os.replace)."""
+    fd, tmp = tempfile.mkstemp(prefix="tmp_", dir=dir_modelos)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(versao + "\n")
+    os.replace(tmp, os.path.join(dir_modelos, PONTEIRO))
+
+
+def listar_versoes(dir_modelos):
+    """Versões gravadas, da mais antiga para a mais nova."""
+    if not os.path.isdir(dir_modelos):
+        return []
+    return sorted(v for v in os.listdir(dir_modelos)
+                  if os.path.isfile(os.path.join(dir_modelos, v, ARQUIVO_MODELOS)))
+
+
+def versao_atual(dir_modelos):
+    try:
+        with open(os.path.join(dir_modelos, PONTEIRO), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        versoes = listar_versoes(dir_modelos)
+        return versoes[-1] if versoes else None
+
+
+def carregar_modelos(dir_modelos, versao=None):
+    """Carrega uma versão (padrão: a apontada por ATUAL)."""
+    import joblib
+    import sklearn
+
+    versao = versao or versao_atual(dir_modelos)
+    if versao is None:
+        raise FileNotFoundError(f"Nenhum modelo treinado em {dir_modelos} (rode o comando treinar)")
+    dados = joblib.load(os.path.join(dir_modelos, versao, ARQUIVO_MODELOS))
+    meta = dados.get("meta", {})
+    if meta.get("sklearn") and meta["sklearn"] != sklearn.__version__:
+        logger.warning("Modelos %s treinados com scikit-learn %s (instalado: %s)",
+                       versao, meta["sklearn"], sklearn.__version__)
+    logger.info("Modelos carregados: %s", os.path.join(dir_modelos, versao))
+    return Modelos(dados["numeric_features"], dados["categorical_features"], dados["clf"], dados["iso"],
+                   _como_referencia(dados["referencia"]), versao, meta, dados.get("iso_online"),
+                   _como_referencia(dados.get("referencia_online")), dados.get("features_online"))
@@ -9,18 +9,16 @@ ambientes Windows/OneDrive (tenta chmod, grava em tmp e faz replace).
 """
 
 import os
+import sys
+import argparse
 import tempfile
 import stat
+import time
 import logging
 import pandas as pd
 import numpy as np
-import plotly.express as px
-import plotly.io as pio
 from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler, OneHotEncoder
 from sklearn.pipeline import Pipeline
-from sklearn.impute import SimpleImputer
-from sklearn.compose import ColumnTransformer
 from sklearn.ensemble import RandomForestClassifier, IsolationForest
 from sklearn.metrics import classification_report, confusion_matrix
 import matplotlib.pyplot as plt
@@ -28,6 +26,27 @@ import matplotlib.pyplot as plt
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 logger = logging.getLogger("pipeline_sensor5")
 
+# raiz do repositório no path para importar db.storage (e ml/ para os módulos irmãos)
+ML_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(ML_DIR)
+for _p in (ROOT_DIR, ML_DIR):
+    if _p not in sys.path:
+        sys.path.insert(0, _p)
+
+from columnar import FORMATOS, EscritorColunar, salvar_colunar, ler_colunar
+from features import JANELAS_PADRAO, FeaturesJanela
+from selecao_modelo import RF_PADRAO, construir_preprocessador, selecionar_classificador
+from modelos import (COLUNAS_ONLINE, Modelos, apontar_versao, carregar_modelos, referencia_de_scores, salvar_modelos,
+                     versao_atual)
+from cache_etapas import CacheEtapas
+from figuras import Figura, renderizar
+from series_maquinas import gerar_series_maquinas
+from incremental import (atualizar_marca, carregar_estado_janelas, filtrar_marca, fim_ultima_linha, gravar_manifesto,
+                         ler_delta, ler_manifesto, montar_manifesto, planejar, salvar_estado_janelas)
+
+# ajuste seu base_path se necessário (ou use --base-path)
+BASE_PATH = r"C:\Users\CarlosSouza\OneDrive\BACKUP\OneDrive\Documentos\3_PESSOAIS_DADOS_ARQUIVOS\FIAP\FASE_5\Trabalho_Rascunho"
+
 
 # --- Funções utilitárias ---
 def ensure_dir(path):
@@ -45,6 +64,41 @@ def safe_merge(left, right, on, how="left"):
         return left
 
 
+def safe_merge_asof(left, right, by, left_on, right_on):
+    """
+    Merge "as-of" (ponto no tempo): cada linha de left recebe a última linha de
+    right com o mesmo `by` e right_on <= left_on. Mantém a quantidade, a ordem
+    e o índice das linhas de left (sem o fan-out de um merge simples quando
+    right tem vários registros por chave). Sem as colunas de data, usa o
+    registro mais recente de right por `by`.
+    """
+    if left is None or right is None:
+        return left
+    if by not in left.columns or by not in right.columns:
+        logger.warning("Merge ignorado: coluna '%s' não existe em ambos os DataFrames", by)
+        return left
+    if left_on not in left.columns or right_on not in right.columns:
+        logger.warning("Merge as-of sem '%s'/'%s': usando o registro mais recente por '%s'", left_on, right_on, by)
+        ultimo = right.sort_values(right_on, kind="stable") if right_on in right.columns else right
+        out = left.merge(ultimo.drop_duplicates(by, keep="last"), on=by, how="left")
+        out.index = left.index
+        return out
+
+    chave_r = pd.to_datetime(right[right_on], errors="coerce").astype("datetime64[ns]")
+    r = right.assign(_asof=chave_r.values)[chave_r.notna().values].sort_values("_asof", kind="stable")
+    if r[by].dtype != left[by].dtype:
+        r[by] = r[by].astype(left[by].dtype)
+    chave_l = pd.to_datetime(left[left_on], errors="coerce").astype("datetime64[ns]")
+    l = left.assign(_asof=chave_l.values, _pos=np.arange(len(left)))
+    validas = (l["_asof"].notna() & l[by].notna()).values
+    # merge_asof exige as duas chaves ordenadas e sem nulos; linhas sem data/chave ficam sem correspondência
+    m = pd.merge_asof(l[validas].sort_values("_asof", kind="stable"), r, on="_asof", by=by, direction="backward")
+    out = pd.concat([m, l[~validas]]) if not validas.all() else m
+    out = out.sort_values("_pos", kind="stable").drop(columns=["_asof", "_pos"])
+    out.index = left.index
+    return out
+
+
 # --- Funções de gravação robusta (lida com PermissionError / readonly / OneDrive) ---
 def _ensure_parent_dir(path):
     parent = os.path.dirname(path)
@@ -154,8 +208,52 @@ def safe_save_figure(fig_or_savetarget, path, savefunc=None, **save_kwargs):
                 raise
 
 
+def salvar_tabela(df, rel_dir, nome, formato="csv"):
+    """
+    Salva uma tabela de saída (dados_enriquecidos / dados_resultados):
+    - csv: rel_dir/nome.csv via safe_save_csv
+    - parquet/arrow: dataset particionado por data e id_maquina em rel_dir/nome/
+      (tipos preservados, ex.: criticidade continua categórica; ver columnar.py)
+    """
+    if formato == "csv":
+        return safe_save_csv(df, os.path.join(rel_dir, nome + ".csv"), index=False, encoding="utf-8")
+    return salvar_colunar(df, os.path.join(rel_dir, nome), formato)
+
+
+def caminho_tabela(rel_dir, nome, formato="csv"):
+    """Arquivo (csv) ou diretório (parquet/arrow) gravado por salvar_tabela."""
+    return os.path.join(rel_dir, nome + ".csv") if formato == "csv" else os.path.join(rel_dir, nome)
+
+
+def ler_tabela(rel_dir, nome, formato="csv", chunksize=None, amostra=None):
+    """
+    Relê uma tabela gravada por salvar_tabela. CSV com chunksize: lê em chunks
+    e devolve uma amostra uniforme de `amostra` linhas (na ordem original).
+    """
+    if formato != "csv":
+        return ler_colunar(os.path.join(rel_dir, nome), formato=formato)
+    caminho = os.path.join(rel_dir, nome + ".csv")
+    if not chunksize:
+        return pd.read_csv(caminho)
+    rng = np.random.default_rng(42)
+    out, inicio = None, 0
+    for chunk in pd.read_csv(caminho, chunksize=chunksize):
+        out = amostra_reservatorio(out, chunk.assign(_ordem=np.arange(inicio, inicio + len(chunk))), amostra, rng)
+        inicio += len(chunk)
+    return out.sort_values("_ordem").drop(columns=["_chave", "_ordem"]).reset_index(drop=True)
+
+
 # --- Função para dashboards ---
-def gerar_dashboards(df, outdir):
+def _publicar_dashboard(figs, df, dash_path, n_jobs, nome):
+    """Grava o HTML das figuras (figuras.renderizar: agregados, pool de processos e fragmentos reaproveitados)."""
+    try:
+        novas, reaproveitadas = renderizar(figs, df, dash_path, n_jobs)
+        logger.info("%s gerado em: %s (figuras novas=%d, reaproveitadas=%d)", nome, dash_path, novas, reaproveitadas)
+    except Exception as e:
+        logger.error("Falha ao gerar %s: %s", nome, e)
+
+
+def gerar_dashboards(df, outdir, nbins=30, n_jobs=1):
     dash_dir = os.path.join(outdir, "dashboards")
     ensure_dir(dash_dir)
     dash_path = os.path.join(dash_dir, "dashboard.html")
@@ -166,159 +264,80 @@ def gerar_dashboards(df, outdir):
     cat_cols = df.select_dtypes(include=["object"]).columns.tolist()
 
     for col in num_cols:
-        try:
-            fig = px.histogram(df, x=col, nbins=30, title=f"Distribuição de {col}")
-            figs.append(fig)
-        except Exception as e:
-            logger.debug("Erro ao criar hist para %s: %s", col, e)
-
-        try:
-            fig = px.box(df, y=col, title=f"Boxplot de {col}")
-            figs.append(fig)
-        except Exception as e:
-            logger.debug("Erro ao criar box para %s: %s", col, e)
+        figs.append(Figura("hist", [col], f"Distribuição de {col}", nbins=nbins))
+        figs.append(Figura("box", [col], f"Boxplot de {col}"))
 
     for col in cat_cols:
-        try:
-            fig = px.histogram(df, x=col, title=f"Distribuição de {col} (categórica)")
-            figs.append(fig)
-        except Exception as e:
-            logger.debug("Erro ao criar hist categórica para %s: %s", col, e)
+        figs.append(Figura("barras", [col], f"Distribuição de {col} (categórica)"))
 
     # Se houver 'falha'
     if "falha" in df.columns:
-        try:
-            fig = px.histogram(df, x="falha", title="Distribuição de Falhas", color="falha")
-            figs.append(fig)
-        except Exception as e:
-            logger.debug("Erro ao criar hist de falha: %s", e)
-
+        figs.append(Figura("barras", ["falha"], "Distribuição de Falhas", cor=True))
         for col in num_cols[:5]:  # limita a 5 para não gerar centenas de gráficos
-            try:
-                fig = px.box(df, x="falha", y=col, color="falha", title=f"{col} x Falha")
-                figs.append(fig)
-            except Exception as e:
-                logger.debug("Erro ao criar box falha x %s: %s", col, e)
+            figs.append(Figura("box_grupo", ["falha", col], f"{col} x Falha"))
 
     # Se houver 'criticidade'
     if "criticidade" in df.columns:
-        try:
-            fig = px.histogram(df, x="criticidade", title="Distribuição de Criticidade", color="criticidade")
-            figs.append(fig)
-        except Exception as e:
-            logger.debug("Erro ao criar hist criticidade: %s", e)
+        figs.append(Figura("barras", ["criticidade"], "Distribuição de Criticidade", cor=True))
 
-    # Salvar em HTML único usando arquivo temporário e replace
-    try:
-        dir_ = os.path.dirname(dash_path) or "."
-        fd, tmp = tempfile.mkstemp(prefix="tmp_dash_", suffix=".html", dir=dir_)
-        os.close(fd)
-        with open(tmp, "w", encoding="utf-8") as f:
-            for fig in figs:
-                f.write(pio.to_html(fig, include_plotlyjs="cdn", full_html=False, auto_play=False))
-        try:
-            os.replace(tmp, dash_path)
-            logger.info("Dashboard gerado em: %s", dash_path)
-        except Exception as e:
-            logger.warning("Não foi possível mover dashboard tmp -> final: %s. Mantendo tmp em %s. Erro: %s", dash_path,
-                           tmp, e)
-    except Exception as e:
-        logger.error("Falha ao gerar dashboard: %s", e)
+    _publicar_dashboard(figs, df, dash_path, n_jobs, "Dashboard")
 
 
 # --- Função para dashboards de dados enriquecidos ---
-def gerar_dashboards_enriquecidos(df, outdir):
+# acima disso as séries ficam só nos pequenos múltiplos (series_maquinas.html)
+MAX_MAQUINAS_LINHA = 10
+
+
+def gerar_dashboards_enriquecidos(df, outdir, nbins=30, n_jobs=1):
     dash_dir = os.path.join(outdir, "dashboards")
     ensure_dir(dash_dir)
     dash_path = os.path.join(dash_dir, "dashboard_enriquecidos.html")
 
     figs = []
 
-    # Série temporal por máquina
+    # Série temporal por máquina: pequenos múltiplos paginados em series_maquinas.html; no dashboard,
+    # uma figura com todas as máquinas só enquanto a frota é pequena o bastante para ser legível
     if "ts" in df.columns and "id_maquina" in df.columns:
-        for col in ["vibracao", "temperatura", "velocidade_motor"]:
-            if col in df.columns:
-                try:
-                    fig = px.line(df, x="ts", y=col, color="id_maquina",
-                                  title=f"Série temporal de {col} por máquina")
-                    figs.append(fig)
-                except Exception as e:
-                    logger.debug("Erro ao criar série temporal %s: %s", col, e)
+        cols_serie = [c for c in ["vibracao", "temperatura", "velocidade_motor"] if c in df.columns]
+        if cols_serie:
+            try:
+                series_path = os.path.join(dash_dir, "series_maquinas.html")
+                n = gerar_series_maquinas(df, cols_serie, series_path)
+                logger.info("Séries por máquina geradas em: %s (máquinas=%d)", series_path, n)
+            except Exception as e:
+                logger.error("Falha ao gerar séries por máquina: %s", e)
+        if df["id_maquina"].nunique() <= MAX_MAQUINAS_LINHA:
+            for col in cols_serie:
+                figs.append(Figura("linha", ["ts", col, "id_maquina"], f"Série temporal de {col} por máquina"))
 
     # Distribuição das variáveis numéricas
     for col in ["vibracao", "temperatura", "velocidade_motor", "dias_ultima_manutencao"]:
         if col in df.columns:
-            try:
-                fig = px.histogram(df, x=col, nbins=30, title=f"Distribuição de {col}")
-                figs.append(fig)
-            except Exception as e:
-                logger.debug("Erro ao criar hist enriquecido para %s: %s", col, e)
-
-            try:
-                fig = px.box(df, y=col, title=f"Boxplot de {col}")
-                figs.append(fig)
-            except Exception as e:
-                logger.debug("Erro ao criar box enriquecido para %s: %s", col, e)
+            figs.append(Figura("hist", [col], f"Distribuição de {col}", nbins=nbins))
+            figs.append(Figura("box", [col], f"Boxplot de {col}"))
 
     # Falha
     if "falha" in df.columns:
-        try:
-            fig = px.histogram(df, x="falha", title="Distribuição de Falhas", color="falha")
-            figs.append(fig)
-        except Exception as e:
-            logger.debug("Erro ao criar hist falha (enriq): %s", e)
-
+        figs.append(Figura("barras", ["falha"], "Distribuição de Falhas", cor=True))
         for col in ["vibracao", "temperatura", "velocidade_motor"]:
             if col in df.columns:
-                try:
-                    fig = px.box(df, x="falha", y=col, color="falha", title=f"{col} x Falha")
-                    figs.append(fig)
-                except Exception as e:
-                    logger.debug("Erro ao criar box falha x %s (enriq): %s", col, e)
+                figs.append(Figura("box_grupo", ["falha", col], f"{col} x Falha"))
 
     # Qualidade do ar
     if "qualidade_de_ar" in df.columns:
-        try:
-            fig = px.histogram(df, x="qualidade_de_ar", title="Distribuição de Qualidade do Ar",
-                               color="qualidade_de_ar")
-            figs.append(fig)
-        except Exception as e:
-            logger.debug("Erro ao criar hist qualidade_de_ar: %s", e)
-
+        figs.append(Figura("barras", ["qualidade_de_ar"], "Distribuição de Qualidade do Ar", cor=True))
         if "temperatura" in df.columns:
-            try:
-                fig = px.box(df, x="qualidade_de_ar", y="temperatura", color="qualidade_de_ar",
-                             title="Temperatura x Qualidade do Ar")
-                figs.append(fig)
-            except Exception as e:
-                logger.debug("Erro ao criar box qualidade_de_ar x temperatura: %s", e)
+            figs.append(Figura("box_grupo", ["qualidade_de_ar", "temperatura"], "Temperatura x Qualidade do Ar"))
 
-    # Salvar HTML único (tmp -> replace)
-    try:
-        dir_ = os.path.dirname(dash_path) or "."
-        fd, tmp = tempfile.mkstemp(prefix="tmp_dash_enriq_", suffix=".html", dir=dir_)
-        os.close(fd)
-        with open(tmp, "w", encoding="utf-8") as f:
-            for fig in figs:
-                f.write(pio.to_html(fig, include_plotlyjs="cdn", full_html=False, auto_play=False))
-        try:
-            os.replace(tmp, dash_path)
-            logger.info("Dashboard de dados enriquecidos gerado em: %s", dash_path)
-        except Exception as e:
-            logger.warning("Não foi possível mover dashboard_enriq tmp -> final: %s. Mantendo tmp em %s. Erro: %s",
-                           dash_path, tmp, e)
-    except Exception as e:
-        logger.error("Falha ao gerar dashboard_enriq: %s", e)
+    _publicar_dashboard(figs, df, dash_path, n_jobs, "Dashboard de dados enriquecidos")
 
 
-def gerar_readings_from_sensores(df_sensores, outdir, filename="readings.csv"):
+def montar_readings(df_sensores):
     """
-    Gera readings.csv com colunas exatas:
+    Monta o DataFrame de readings com colunas exatas:
       ts, temperatura, vibracao, qualidade_de_ar
     a partir do DataFrame df_sensores (leitura_sensores.csv).
-    Salva em outdir/filename usando safe_save_csv.
     """
-    ensure_dir(outdir)
     n = len(df_sensores)
 
     # --- TS ---
@@ -385,67 +404,514 @@ def gerar_readings_from_sensores(df_sensores, outdir, filename="readings.csv"):
         "qualidade_de_ar": qualidade_de_ar
     })
 
+    return out_df
+
+
+def gerar_readings_from_sensores(df_sensores, outdir, filename="readings.csv"):
+    """
+    Gera readings.csv (ver montar_readings) e salva em outdir/filename
+    usando safe_save_csv.
+    """
+    ensure_dir(outdir)
+    out_df = montar_readings(df_sensores)
     outpath = os.path.join(outdir, filename)
     safe_save_csv(out_df, outpath, index=False, encoding="utf-8")
     logger.info("readings.csv gerado em: %s (linhas=%d)", outpath, len(out_df))
     return outpath
 
-    # --- TEMPERATURA ---
-    if "temperatura" in df_sensores.columns:
-        temperatura = pd.to_numeric(df_sensores["temperatura"], errors="coerce")
-    elif "temperature" in df_sensores.columns:
-        temperatura = pd.to_numeric(df_sensores["temperature"], errors="coerce")
-    elif "temp" in df_sensores.columns:
-        temperatura = pd.to_numeric(df_sensores["temp"], errors="coerce")
-    else:
-        temperatura = pd.Series([np.nan] * n)
 
-    # --- VIBRACAO ---
-    if "vibracao" in df_sensores.columns:
-        vibracao = pd.to_numeric(df_sensores["vibracao"], errors="coerce")
-    elif "vibration" in df_sensores.columns:
-        vibracao = pd.to_numeric(df_sensores["vibration"], errors="coerce")
-    elif "vib" in df_sensores.columns:
-        vibracao = pd.to_numeric(df_sensores["vib"], errors="coerce")
+def salvar_readings_sqlite(df_sensores, db_path, store=None):
+    """
+    Grava as leituras no banco SQLite local (db/storage.py), o mesmo lido pelo
+    dashboard com HERMIA_BACKEND=sqlite. Usa id_maquina como device_id.
+    store: SqliteStore já aberto (modo em chunks); não é fechado aqui.
+    """
+    from db.storage import SqliteStore
+
+    out_df = montar_readings(df_sensores)
+    rows = pd.DataFrame({
+        "ts": out_df["ts"],
+        "temperature": out_df["temperatura"],
+        "vibration": out_df["vibracao"],
+        "luminosity": pd.to_numeric(df_sensores["luminosidade"], errors="coerce").values
+        if "luminosidade" in df_sensores.columns else np.nan,
+        "air_q": pd.to_numeric(out_df["qualidade_de_ar"], errors="coerce"),
+    })
+    if rows["air_q"].isna().all() and "qualidade_ar" in df_sensores.columns:
+        # nome da coluna no schema LEITURA_SENSORES (QUALIDADE_AR)
+        rows["air_q"] = pd.to_numeric(df_sensores["qualidade_ar"], errors="coerce").values
+    if "id_maquina" in df_sensores.columns:
+        rows["device_id"] = df_sensores["id_maquina"].astype(str).values
+    proprio = store is None
+    store = SqliteStore(db_path) if proprio else store
+    try:
+        n = store.insert_readings(rows)
+    finally:
+        if proprio:
+            store.close()
+    # leituras já gravadas (mesmo device_id e ts) são ignoradas: rodar de novo não duplica
+    logger.info("Leituras gravadas no SQLite: %s (novas=%d de %d)", db_path, n, len(rows))
+    return n
+
+
+# --- Etapas do pipeline ---
+def carregar_dimensoes(arquivos):
+    """Carrega as tabelas pequenas (máquinas, manutenção, funcionários), que ficam em memória."""
+    return {
+        "maquinas": pd.read_csv(arquivos["maquinas"]),
+        "manutencao": pd.read_csv(arquivos["manutencao"]),
+        "funcionarios": pd.read_csv(arquivos["funcionarios"]),
+    }
+
+
+def enriquecer(df_sensores, dims, janelas=None):
+    """
+    Merges automáticos das leituras com as tabelas de dimensão. A manutenção
+    entra por merge as-of (a última antes do ts da leitura), então o resultado
+    tem exatamente uma linha por leitura.
+    janelas: FeaturesJanela (features.py) que adiciona as estatísticas móveis por
+    máquina; a mesma instância entre chunks mantém o estado das janelas.
+    """
+    df = safe_merge(df_sensores, dims["maquinas"], on="id_maquina")
+    df = safe_merge_asof(df, dims["manutencao"], by="id_maquina", left_on="ts", right_on="data_manutencao")
+    df = safe_merge(df, dims["funcionarios"], on="id_funcionario")
+    if janelas is not None:
+        df = janelas.atualizar(df)
+    return df
+
+
+def criar_janelas(janelas):
+    """FeaturesJanela para a lista de janelas (ex.: ["6h", "24h"]); None se vazia."""
+    return FeaturesJanela(janelas) if janelas else None
+
+
+def detectar_features(df):
+    """Features numéricas e categóricas (detecta automaticamente)."""
+    numeric_features = [c for c in df.select_dtypes(include=[np.number]).columns if c not in ["falha"]]
+    categorical_features = [c for c in df.select_dtypes(include=["object"]).columns]
+    logger.info("Features numéricas detectadas: %s", numeric_features)
+    logger.info("Features categóricas detectadas: %s", categorical_features)
+    return numeric_features, categorical_features
+
+
+def treinar_classificador(df, numeric_features, categorical_features, rel_dir, figs_dir, params=None):
+    """
+    Treinamento supervisionado (se coluna falha existir); grava métricas e matriz de confusão.
+    params: hiperparâmetros do RandomForest (ex.: os escolhidos por selecionar_classificador).
+    """
+    if "falha" not in df.columns or df["falha"].nunique() <= 1:
+        return None
+    X = df[numeric_features + categorical_features]
+    y = df["falha"].astype(int)
+
+    pre = construir_preprocessador(numeric_features, categorical_features)
+
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.25, stratify=y, random_state=42)
+    clf = Pipeline([("pre", pre), ("rf", RandomForestClassifier(**dict(RF_PADRAO, **(params or {}))))])
+    clf.fit(X_train, y_train)
+
+    y_pred = clf.predict(X_test)
+    report = classification_report(y_test, y_pred, output_dict=True, zero_division=0)
+    metrics_path = os.path.join(rel_dir, "metricas_classificacao.csv")
+    safe_save_csv(pd.DataFrame(report).transpose(), metrics_path)
+
+    cm = confusion_matrix(y_test, y_pred)
+    plt.figure(figsize=(6, 4))
+    plt.imshow(cm, cmap="Blues")
+    plt.title("Matriz de Confusão")
+    for (i, j), val in np.ndenumerate(cm):
+        plt.text(j, i, val, ha="center", va="center")
+    plt.tight_layout()
+
+    # salvar figura de forma robusta
+    conf_path = os.path.join(figs_dir, "confusion_matrix.png")
+    savefunc = lambda p, **kw: plt.savefig(p, **kw)
+    safe_save_figure(None, conf_path, savefunc=savefunc, bbox_inches="tight")
+    plt.close()
+    return clf
+
+
+def ajustar_anomalias(df, numeric_features, n_jobs=1):
+    """
+    Ajusta o IsolationForest em df e devolve (modelo, referência), onde a
+    referência é o t-digest dos scores de df (limiares de criticidade e rank).
+    """
+    X = df[numeric_features].fillna(0)
+    iso = IsolationForest(n_estimators=200, random_state=42, contamination=0.02).fit(X)
+    return iso, referencia_de_scores(iso, X, n_jobs)
+
+
+def selecionar(df, numeric_features, categorical_features, rel_dir, folds=5, n_jobs=-1):
+    """Busca de hiperparâmetros (selecao_modelo.py); grava selecao_modelo.csv e devolve os parâmetros."""
+    params, relatorio = selecionar_classificador(df, numeric_features, categorical_features, folds=folds,
+                                                 n_jobs=n_jobs)
+    if relatorio is not None:
+        safe_save_csv(relatorio, os.path.join(rel_dir, "selecao_modelo.csv"), index=False, encoding="utf-8")
+    return params
+
+
+def treinar_modelos(df, numeric_features, categorical_features, rel_dir, figs_dir, n_jobs=1, selecao=None,
+                    **info):
+    """
+    Ajusta o classificador e o IsolationForest em df e devolve um Modelos (ver modelos.py).
+    selecao: número de folds para escolher os hiperparâmetros antes do ajuste (None = parâmetros fixos).
+    """
+    params = selecionar(df, numeric_features, categorical_features, rel_dir, selecao, n_jobs) if selecao else None
+    if params:
+        info["parametros_rf"] = params
+    clf = treinar_classificador(df, numeric_features, categorical_features, rel_dir, figs_dir, params)
+    iso = referencia = None
+    if numeric_features:
+        try:
+            iso, referencia = ajustar_anomalias(df, numeric_features, n_jobs)
+        except Exception as e:
+            logger.error("Erro ao rodar IsolationForest: %s", e)
     else:
-        vibracao = pd.Series([np.nan] * n)
+        logger.warning("Nenhuma feature numérica encontrada para anomalias.")
+    # IsolationForest "online": só os sensores que o dashboard/ingest recebem ao vivo
+    features_online = [c for c in COLUNAS_ONLINE if c in numeric_features]
+    iso_online = referencia_online = None
+    if features_online:
+        try:
+            iso_online, referencia_online = ajustar_anomalias(df, features_online, n_jobs)
+        except Exception as e:
+            logger.error("Erro ao ajustar o IsolationForest online: %s", e)
+    return Modelos(numeric_features, categorical_features, clf, iso, referencia,
+                   info=dict(info, linhas_treino=len(df)), iso_online=iso_online,
+                   referencia_online=referencia_online, features_online=features_online)
 
-    # --- QUALIDADE_DE_AR ---
-    if "qualidade_de_ar" in df_sensores.columns:
-        # tenta manter numérico se for numérico, senão string
-        q = df_sensores["qualidade_de_ar"]
-        q_num = pd.to_numeric(q, errors="coerce")
-        if q_num.notna().any():
-            qualidade_de_ar = q_num
+
+def usar_versao(modelos, dir_modelos):
+    """
+    Modelos reaproveitados do cache: grava de novo se a versão não está em
+    dir_modelos; senão só faz ATUAL apontar para ela.
+    """
+    if not modelos.versao or not os.path.isdir(os.path.join(dir_modelos, modelos.versao)):
+        salvar_modelos(modelos, dir_modelos)
+    elif versao_atual(dir_modelos) != modelos.versao:
+        apontar_versao(dir_modelos, modelos.versao)
+        logger.info("Versão de modelos em uso: %s", modelos.versao)
+
+
+def pontuar(df, modelos):
+    """Adiciona prob_falha, anomalia_score, anomalia_rank_pct e criticidade a df (sem reajustar)."""
+    try:
+        return modelos.pontuar(df)
+    except Exception as e:
+        logger.error("Erro ao pontuar leituras: %s", e)
+        return df
+
+
+# --- Modo em chunks (fora da memória) ---
+class EscritorCsv:
+    """
+    Grava um CSV em partes (append) num arquivo temporário no mesmo diretório;
+    fechar() faz os.replace(tmp, path). As colunas da primeira parte valem para as demais.
+    anexar=True: acrescenta direto no fim de path (se existir), com as colunas do
+    cabeçalho já gravado; abortar() devolve o arquivo ao tamanho original.
+    """
+
+    def __init__(self, path, anexar=False):
+        self.path = path
+        self.colunas = None
+        self.linhas = 0
+        self.anexar = anexar and os.path.exists(path)
+        _ensure_parent_dir(path)
+        if self.anexar:
+            self.colunas = pd.read_csv(path, nrows=0).columns.tolist()
+            self.tamanho = os.path.getsize(path)
+            self.tmp = path
         else:
-            qualidade_de_ar = q.astype(str).replace("nan", pd.NA)
-    elif "aqi_pm25" in df_sensores.columns:
-        qualidade_de_ar = pd.to_numeric(df_sensores["aqi_pm25"], errors="coerce")
-    elif "air_q" in df_sensores.columns:
-        qualidade_de_ar = pd.to_numeric(df_sensores["air_q"], errors="coerce")
-    elif "aqi" in df_sensores.columns:
-        qualidade_de_ar = pd.to_numeric(df_sensores["aqi"], errors="coerce")
+            fd, self.tmp = tempfile.mkstemp(prefix="tmp_save_", suffix=".csv", dir=os.path.dirname(path) or ".")
+            os.close(fd)
+
+    def escrever(self, df):
+        cabecalho = self.colunas is None
+        if cabecalho:
+            self.colunas = list(df.columns)
+        df.reindex(columns=self.colunas).to_csv(self.tmp, mode="a", header=cabecalho, index=False, encoding="utf-8")
+        self.linhas += len(df)
+
+    def fechar(self):
+        if self.anexar:
+            logger.info("Anexado ao CSV: %s (linhas=%d)", self.path, self.linhas)
+            return self.path
+        _remove_readonly_if_exists(self.path)
+        os.replace(self.tmp, self.path)
+        logger.info("Salvo CSV: %s (linhas=%d)", self.path, self.linhas)
+        return self.path
+
+    def abortar(self):
+        if self.anexar:
+            with open(self.path, "r+b") as f:
+                f.truncate(self.tamanho)
+        elif os.path.exists(self.tmp):
+            os.remove(self.tmp)
+
+
+def abrir_escritor(rel_dir, nome, formato="csv", anexar=False):
+    """Escritor em partes equivalente a salvar_tabela (mesmos caminhos e formatos)."""
+    if formato == "csv":
+        return EscritorCsv(os.path.join(rel_dir, nome + ".csv"), anexar)
+    return EscritorColunar(os.path.join(rel_dir, nome), formato, anexar=anexar)
+
+
+def amostra_reservatorio(amostra, chunk, tamanho, rng):
+    """
+    Amostra uniforme (sem reposição) de tamanho fixo sobre um fluxo de chunks:
+    cada linha recebe uma chave aleatória e ficam as `tamanho` menores chaves.
+    """
+    chunk = chunk.assign(_chave=rng.random(len(chunk)))
+    if amostra is not None:
+        chunk = pd.concat([amostra, chunk], ignore_index=True)
+    if len(chunk) > tamanho:
+        chunk = chunk.nsmallest(tamanho, "_chave")
+    return chunk
+
+
+def amostrar_em_chunks(caminho, dims, chunksize, tamanho, ao_ler=None, janelas=None):
+    """
+    Lê `caminho` em chunks, enriquece cada um e mantém uma amostra uniforme de
+    `tamanho` linhas (na ordem original). ao_ler(chunk, enriquecido) é chamado
+    para cada chunk (ex.: gravar as saídas da 1a passada).
+    Devolve (amostra, (features numéricas, categóricas), total de linhas).
+    """
+    rng = np.random.default_rng(42)
+    amostra, features, inicio = None, None, 0
+    estado_janelas = criar_janelas(janelas)
+    for k, chunk in enumerate(pd.read_csv(caminho, chunksize=chunksize)):
+        # montar_readings espera índice 0..n-1 (como na leitura completa)
+        chunk = chunk.reset_index(drop=True)
+        df = enriquecer(chunk, dims, estado_janelas)
+        if features is None:
+            features = detectar_features(df)
+        if ao_ler is not None:
+            ao_ler(chunk, df)
+        amostra = amostra_reservatorio(amostra, df.assign(_ordem=np.arange(inicio, inicio + len(df))), tamanho, rng)
+        inicio += len(df)
+        logger.info("Chunk %d: %d leituras (enriquecidas até agora: %d)", k, len(chunk), inicio)
+    if amostra is not None:
+        amostra = amostra.sort_values("_ordem").drop(columns=["_chave", "_ordem"]).reset_index(drop=True)
+        logger.info("Amostra de %d de %d linhas enriquecidas", len(amostra), inicio)
+    return amostra, features, inicio
+
+
+def pontuar_em_chunks(caminho, dims, modelos, rel_dir, formato="csv", chunksize=100_000, estado_janelas=None):
+    """
+    Caminho rápido de pontuação: lê as leituras em lotes, enriquece, pontua com
+    os modelos já carregados e grava dados_resultados. Devolve o total de linhas.
+    estado_janelas: FeaturesJanela a usar (padrão: uma nova com as janelas dos modelos).
+    """
+    resultados = abrir_escritor(rel_dir, "dados_resultados", formato)
+    # as mesmas features de janela usadas no treino, com estado entre os lotes
+    if estado_janelas is None:
+        estado_janelas = criar_janelas(modelos.info.get("janelas"))
+    total = 0
+    try:
+        for chunk in pd.read_csv(caminho, chunksize=chunksize):
+            t0 = time.perf_counter()
+            df = pontuar(enriquecer(chunk.reset_index(drop=True), dims, estado_janelas), modelos)
+            dt = (time.perf_counter() - t0) * 1000
+            resultados.escrever(df)
+            total += len(df)
+            logger.info("Lote pontuado: %d leituras em %.1f ms", len(df), dt)
+        resultados.fechar()
+    except Exception:
+        resultados.abortar()
+        raise
+    return total
+
+
+def executar_em_chunks(args, arquivos, dims, outdir, figs_dir, rel_dir, offset=None):
+    """
+    Processa leitura_sensores.csv em chunks de args.chunksize linhas; a memória
+    de pico depende do chunk e do tamanho da amostra, não do total de leituras.
+
+    1a passada: enriquece cada chunk, grava dados_enriquecidos/readings e
+    mantém uma amostra uniforme (args.amostra linhas) onde são treinados o
+    classificador e o IsolationForest (cuja referência de scores define o rank).
+    2a passada: relê os chunks, enriquece, pontua e grava dados_resultados.
+    Os dashboards são gerados a partir da amostra pontuada.
+    offset: com --incremental, bytes de leitura_sensores.csv cobertos por esta
+    execução (gravados no manifesto com a marca d'água).
+    """
+    enriquecidos = abrir_escritor(rel_dir, "dados_enriquecidos", args.formato)
+    marca = {}
+    readings = EscritorCsv(os.path.join(outdir, "readings.csv"))
+    store = None
+    if args.db:
+        from db.storage import SqliteStore
+        store = SqliteStore(args.db)
+
+    def gravar(chunk, df):
+        enriquecidos.escrever(df)
+        readings.escrever(montar_readings(chunk))
+        if store is not None:
+            salvar_readings_sqlite(chunk, args.db, store=store)
+        if offset is not None:
+            marca.update(atualizar_marca(marca, chunk))
+
+    try:
+        amostra, features, total = amostrar_em_chunks(arquivos["sensores"], dims, args.chunksize, args.amostra, gravar,
+                                                      args.janelas)
+        enriquecidos.fechar()
+        readings.fechar()
+    except Exception:
+        enriquecidos.abortar()
+        readings.abortar()
+        raise
+    finally:
+        if store is not None:
+            store.close()
+    if amostra is None:
+        logger.warning("Nenhuma leitura em %s", arquivos["sensores"])
+        return
+
+    modelos = treinar_modelos(amostra, *features, rel_dir, figs_dir, args.n_jobs, args.selecionar,
+                              origem=arquivos["sensores"], janelas=args.janelas, linhas_total=total)
+    salvar_modelos(modelos, args.modelos)
+    estado_janelas = criar_janelas(args.janelas)
+    pontuar_em_chunks(arquivos["sensores"], dims, modelos, rel_dir, args.formato, args.chunksize, estado_janelas)
+    if offset is not None:
+        registrar_execucao(args, arquivos, outdir, offset, marca, modelos.versao, estado_janelas, total)
+    logger.info("Pipeline concluído. Resultados em: %s", outdir)
+
+    # --- Geração de Dashboards (amostra) ---
+    amostra = pontuar(amostra, modelos)
+    gerar_dashboards(amostra, outdir, args.nbins, args.n_jobs)
+    gerar_dashboards_enriquecidos(amostra, outdir, args.nbins, args.n_jobs)
+
+
+def treinar(args, arquivos, dims, figs_dir, rel_dir):
+    """Comando treinar: ajusta os modelos (dados completos ou amostra em chunks) e salva uma nova versão."""
+    if args.chunksize:
+        df, features, total = amostrar_em_chunks(arquivos["sensores"], dims, args.chunksize, args.amostra,
+                                                 janelas=args.janelas)
+        if df is None:
+            logger.warning("Nenhuma leitura em %s", arquivos["sensores"])
+            return None
     else:
-        qualidade_de_ar = pd.Series([pd.NA] * n)
+        df = enriquecer(pd.read_csv(arquivos["sensores"]), dims, criar_janelas(args.janelas))
+        features, total = detectar_features(df), len(df)
+    modelos = treinar_modelos(df, *features, rel_dir, figs_dir, args.n_jobs, args.selecionar,
+                              origem=arquivos["sensores"], janelas=args.janelas, linhas_total=total)
+    return salvar_modelos(modelos, args.modelos)
 
-    # montar DataFrame com a ordem e nomes exatos solicitados
-    out_df = pd.DataFrame({
-        "ts": ts_str,
-        "temperatura": pd.to_numeric(temperatura, errors="coerce"),
-        "vibracao": pd.to_numeric(vibracao, errors="coerce"),
-        "qualidade_de_ar": qualidade_de_ar
-    })
 
-    outpath = os.path.join(outdir, filename)
-    safe_save_csv(out_df, outpath, index=False, encoding="utf-8")
-    logger.info("readings.csv gerado em: %s (linhas=%d)", outpath, len(out_df))
-    return outpath
+# --- Execução incremental (manifesto e marca d'água, ver incremental.py) ---
+def parametros_incrementais(args):
+    """Opções que mudam as saídas: se mudarem, a execução incremental volta a ser completa."""
+    return {"formato": args.formato, "janelas": list(args.janelas), "db": args.db}
+
+
+def registrar_execucao(args, arquivos, outdir, offset, marca, versao, estado_janelas, linhas):
+    manifesto = montar_manifesto(arquivos, parametros_incrementais(args), versao, marca, offset, linhas)
+    gravar_manifesto(outdir, manifesto)
+    salvar_estado_janelas(outdir, estado_janelas)
+    logger.info("Manifesto atualizado: %d leituras processadas (marca d'água: %s)", linhas, marca)
+
+
+def executar_delta(args, arquivos, dims, outdir, rel_dir, manifesto):
+    """
+    Lê só as linhas anexadas a leitura_sensores.csv desde o offset do
+    manifesto, descarta as que já passaram pela marca d'água, enriquece
+    (continuando as janelas salvas), pontua com a versão de modelos do
+    manifesto e anexa a dados_enriquecidos, dados_resultados, readings.csv e
+    ao SQLite. Os dashboards são refeitos a partir de dados_resultados.
+    """
+    sensores = manifesto["sensores"]
+    fim = fim_ultima_linha(arquivos["sensores"])
+    modelos = carregar_modelos(args.modelos, manifesto["versao_modelos"])
+    estado_janelas = carregar_estado_janelas(outdir) or criar_janelas(args.janelas)
+    enriquecidos = abrir_escritor(rel_dir, "dados_enriquecidos", args.formato, anexar=True)
+    resultados = abrir_escritor(rel_dir, "dados_resultados", args.formato, anexar=True)
+    readings = EscritorCsv(os.path.join(outdir, "readings.csv"), anexar=True)
+    escritores = (enriquecidos, resultados, readings)
+    store = None
+    if args.db:
+        from db.storage import SqliteStore
+        store = SqliteStore(args.db)
+
+    marca, novas = sensores["marca"], 0
+    try:
+        for chunk in ler_delta(arquivos["sensores"], sensores["offset"], fim, args.chunksize):
+            chunk = filtrar_marca(chunk, marca)
+            if chunk.empty:
+                continue
+            t0 = time.perf_counter()
+            df = enriquecer(chunk, dims, estado_janelas)
+            enriquecidos.escrever(df)
+            readings.escrever(montar_readings(chunk))
+            if store is not None:
+                salvar_readings_sqlite(chunk, args.db, store=store)
+            resultados.escrever(pontuar(df, modelos))
+            marca = atualizar_marca(marca, chunk)
+            novas += len(chunk)
+            logger.info("Delta: %d leituras novas em %.1f ms", len(chunk), (time.perf_counter() - t0) * 1000)
+        for escritor in escritores:
+            escritor.fechar()
+    except Exception:
+        for escritor in escritores:
+            escritor.abortar()
+        raise
+    finally:
+        if store is not None:
+            store.close()
+
+    registrar_execucao(args, arquivos, outdir, fim, marca, modelos.versao, estado_janelas, sensores["linhas"] + novas)
+    if not novas:
+        return
+    logger.info("Pipeline incremental concluído (%d leituras novas). Resultados em: %s", novas, outdir)
+    df = ler_tabela(rel_dir, "dados_resultados", args.formato, args.chunksize, args.amostra)
+    gerar_dashboards(df, outdir, args.nbins, args.n_jobs)
+    gerar_dashboards_enriquecidos(df, outdir, args.nbins, args.n_jobs)
 
 
 # --- Pipeline principal ---
-def main():
-    # ajuste seu base_path se necessário
-    base_path = r"C:\Users\CarlosSouza\OneDrive\BACKUP\OneDrive\Documentos\3_PESSOAIS_DADOS_ARQUIVOS\FIAP\FASE_5\Trabalho_Rascunho"
+COMANDOS = ("completo", "treinar", "pontuar")
+
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Pipeline de sensores: merges, modelos e dashboards.")
+    ap.add_argument("comando", nargs="?", choices=COMANDOS, default="completo",
+                    help="completo: treina, pontua e gera dashboards; treinar: só salva os modelos; "
+                         "pontuar: usa os modelos salvos")
+    ap.add_argument("--base-path", default=BASE_PATH,
+                    help="pasta com leitura_sensores.csv, maquina_autonoma.csv, manutencao.csv e funcionario.csv")
+    ap.add_argument("--db", default=None,
+                    help="banco SQLite (db/storage.py) onde gravar as leituras, ex.: db/hermia.db")
+    ap.add_argument("--formato", choices=FORMATOS, default="csv",
+                    help="formato de dados_enriquecidos/dados_resultados (parquet/arrow: particionado por data e máquina)")
+    ap.add_argument("--chunksize", type=int, default=None,
+                    help="processa leitura_sensores.csv em chunks de N linhas (memória limitada pelo chunk)")
+    ap.add_argument("--amostra", type=int, default=200_000,
+                    help="com --chunksize: linhas da amostra usada no treino e nos dashboards")
+    ap.add_argument("--n-jobs", type=int, default=-1,
+                    help="processos para a seleção de modelo e para pontuar a referência (-1 = todos os núcleos)")
+    ap.add_argument("--selecionar", type=int, default=None, metavar="FOLDS",
+                    help="escolhe os hiperparâmetros do RandomForest por validação cruzada estratificada "
+                         "(FOLDS folds, grade em selecao_modelo.py) antes de treinar")
+    ap.add_argument("--janelas", default=",".join(JANELAS_PADRAO),
+                    help="janelas das features móveis por máquina, separadas por vírgula (vazio desliga)")
+    ap.add_argument("--incremental", action="store_true",
+                    help="completo: processa só as leituras novas desde a última execução (manifesto em saida/)")
+    ap.add_argument("--nbins", type=int, default=30, help="barras dos histogramas dos dashboards")
+    ap.add_argument("--cache", nargs="?", const="", default=None, metavar="DIR",
+                    help="reaproveita as etapas (carregar, enriquecer, treinar, pontuar, dashboards) cujas entradas "
+                         "não mudaram; DIR padrão: <base-path>/saida/cache")
+    ap.add_argument("--cache-mb", type=float, default=2048, help="tamanho máximo do cache em disco (MB)")
+    ap.add_argument("--modelos", default=None,
+                    help="pasta dos modelos versionados (padrão: <base-path>/saida/modelos)")
+    ap.add_argument("--versao", default=None, help="pontuar: versão dos modelos (padrão: a última treinada)")
+    ap.add_argument("--entrada", default=None,
+                    help="pontuar: CSV com as leituras a pontuar (padrão: leitura_sensores.csv)")
+    return ap.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    base_path = args.base_path
+    args.janelas = [j.strip() for j in args.janelas.split(",") if j.strip()]
 
     arquivos = {
         "sensores": os.path.join(base_path, "leitura_sensores.csv"),
@@ -461,97 +927,105 @@ def main():
     ensure_dir(outdir);
     ensure_dir(figs_dir);
     ensure_dir(rel_dir)
+    args.modelos = args.modelos or os.path.join(outdir, "modelos")
+    # cache das etapas em memória do comando completo (ver cache_etapas.py); desligado sem --cache
+    cache = CacheEtapas(None if args.cache is None else args.cache or os.path.join(outdir, "cache"), args.cache_mb)
+
+    plano, offset = "completo", None
+    if args.incremental and args.comando == "completo":
+        manifesto = ler_manifesto(outdir)
+        plano, motivo = planejar(manifesto, arquivos, parametros_incrementais(args), versao_atual(args.modelos))
+        logger.info("Execução incremental: %s (%s)", plano, motivo)
+        if plano == "nada":
+            return
+        offset = fim_ultima_linha(arquivos["sensores"])
 
     logger.info("Carregando dados...")
     # leitura com try/except mais verboso para diagnosticar erros de leitura/perm
     try:
-        df_sensores = pd.read_csv(arquivos["sensores"])
-        df_maquinas = pd.read_csv(arquivos["maquinas"])
-        df_manutencao = pd.read_csv(arquivos["manutencao"])
-        df_funcionarios = pd.read_csv(arquivos["funcionarios"])
+        dims = carregar_dimensoes(arquivos)
+        em_memoria = not args.chunksize and args.comando == "completo" and plano != "delta"
+        k_carregar = cache.chave("carregar", arquivos=arquivos.values()) if em_memoria else None
+        df_sensores = cache.executar("carregar", k_carregar, lambda: pd.read_csv(arquivos["sensores"])) \
+            if em_memoria else None
     except Exception as e:
         logger.error("Erro ao carregar arquivos CSV: %s", e)
         raise
 
-    # merges automáticos
-    df = safe_merge(df_sensores, df_maquinas, on="id_maquina")
-    df = safe_merge(df, df_manutencao, on="id_maquina")
-    df = safe_merge(df, df_funcionarios, on="id_funcionario")
-
-    # features numéricas e categóricas (detecta automaticamente)
-    numeric_features = [c for c in df.select_dtypes(include=[np.number]).columns if c not in ["falha"]]
-    categorical_features = [c for c in df.select_dtypes(include=["object"]).columns]
-
-    logger.info("Features numéricas detectadas: %s", numeric_features)
-    logger.info("Features categóricas detectadas: %s", categorical_features)
+    if args.comando == "treinar":
+        treinar(args, arquivos, dims, figs_dir, rel_dir)
+        return
+    if args.comando == "pontuar":
+        modelos = carregar_modelos(args.modelos, args.versao)
+        pontuar_em_chunks(args.entrada or arquivos["sensores"], dims, modelos, rel_dir, args.formato,
+                          args.chunksize or 100_000)
+        return
+    if plano == "delta":
+        executar_delta(args, arquivos, dims, outdir, rel_dir, manifesto)
+        return
+    if args.chunksize:
+        executar_em_chunks(args, arquivos, dims, outdir, figs_dir, rel_dir, offset)
+        return
+
+    def etapa_enriquecer():
+        estado = criar_janelas(args.janelas)
+        return enriquecer(df_sensores, dims, estado), estado
+
+    k_enriquecer = cache.chave("enriquecer", k_carregar, args.janelas)
+    df, estado_janelas = cache.executar("enriquecer", k_enriquecer, etapa_enriquecer)
+    numeric_features, categorical_features = detectar_features(df)
 
     # salvar dataset enriquecido (usando função robusta)
-    enriched_path = os.path.join(rel_dir, "dados_enriquecidos.csv")
-    safe_save_csv(df, enriched_path, index=False, encoding="utf-8")
-
-    # treinamento supervisionado (se coluna falha existir)
-    if "falha" in df.columns and df["falha"].nunique() > 1:
-        X = df[numeric_features + categorical_features]
-        y = df["falha"].astype(int)
-
-        pre = ColumnTransformer([
-            ("num", Pipeline([("imp", SimpleImputer(strategy="median")), ("sc", StandardScaler())]), numeric_features),
-            ("cat", Pipeline(
-                [("imp", SimpleImputer(strategy="most_frequent")), ("ohe", OneHotEncoder(handle_unknown="ignore"))]),
-             categorical_features)
-        ])
-
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.25, stratify=y, random_state=42)
-        clf = Pipeline(
-            [("pre", pre), ("rf", RandomForestClassifier(n_estimators=200, random_state=42, class_weight="balanced"))])
-        clf.fit(X_train, y_train)
-
-        y_pred = clf.predict(X_test)
-        report = classification_report(y_test, y_pred, output_dict=True, zero_division=0)
-        metrics_path = os.path.join(rel_dir, "metricas_classificacao.csv")
-        safe_save_csv(pd.DataFrame(report).transpose(), metrics_path)
-
-        cm = confusion_matrix(y_test, y_pred)
-        plt.figure(figsize=(6, 4))
-        plt.imshow(cm, cmap="Blues")
-        plt.title("Matriz de Confusão")
-        for (i, j), val in np.ndenumerate(cm):
-            plt.text(j, i, val, ha="center", va="center")
-        plt.tight_layout()
-
-        # salvar figura de forma robusta
-        conf_path = os.path.join(figs_dir, "confusion_matrix.png")
-        savefunc = lambda p, **kw: plt.savefig(p, **kw)
-        safe_save_figure(None, conf_path, savefunc=savefunc, bbox_inches="tight")
-        plt.close()
-
-    # IsolationForest (anomalias)
-    if numeric_features:
-        try:
-            iso = IsolationForest(n_estimators=200, random_state=42, contamination=0.02)
-            scores = -iso.fit(df[numeric_features].fillna(0)).score_samples(df[numeric_features].fillna(0))
-            df["anomalia_score"] = scores
-            df["anomalia_rank_pct"] = pd.Series(scores).rank(pct=True)
-            df["criticidade"] = pd.cut(df["anomalia_rank_pct"], bins=[0, 0.75, 0.9, 0.98, 1.0],
-                                       labels=["Baixo", "Médio", "Alto", "Crítico"])
-        except Exception as e:
-            logger.error("Erro ao rodar IsolationForest: %s", e)
-    else:
-        logger.warning("Nenhuma feature numérica encontrada para anomalias.")
-
-    result_path = os.path.join(rel_dir, "dados_resultados.csv")
-    safe_save_csv(df, result_path, index=False, encoding="utf-8")
+    cache.gravar_saida(caminho_tabela(rel_dir, "dados_enriquecidos", args.formato), k_enriquecer,
+                       lambda: salvar_tabela(df, rel_dir, "dados_enriquecidos", args.formato))
+
+    # classificador + IsolationForest (anomalias), salvos como nova versão
+    def etapa_treinar():
+        m = treinar_modelos(df, numeric_features, categorical_features, rel_dir, figs_dir, args.n_jobs, args.selecionar,
+                            origem=arquivos["sensores"], janelas=args.janelas, linhas_total=len(df))
+        salvar_modelos(m, args.modelos)
+        return m
+
+    # n_jobs não muda o modelo ajustado: fica fora da chave
+    k_treinar = cache.chave("treinar", k_enriquecer, args.selecionar)
+    # relatórios gravados pelo treino: guardados com a etapa e regravados num acerto
+    relatorios_treino = [os.path.join(rel_dir, "metricas_classificacao.csv"),
+                         os.path.join(figs_dir, "confusion_matrix.png")]
+    if args.selecionar:
+        relatorios_treino.append(os.path.join(rel_dir, "selecao_modelo.csv"))
+    modelos = cache.executar("treinar", k_treinar, etapa_treinar, saidas=relatorios_treino)
+    if cache.ativo:
+        usar_versao(modelos, args.modelos)
+
+    k_pontuar = cache.chave("pontuar", k_treinar)
+    df = cache.executar("pontuar", k_pontuar, lambda: pontuar(df, modelos))
+    cache.gravar_saida(caminho_tabela(rel_dir, "dados_resultados", args.formato), k_pontuar,
+                       lambda: salvar_tabela(df, rel_dir, "dados_resultados", args.formato))
+    if offset is not None:
+        registrar_execucao(args, arquivos, outdir, offset, atualizar_marca(None, df_sensores), modelos.versao,
+                           estado_janelas, len(df_sensores))
     logger.info("Pipeline concluído. Resultados em: %s", outdir)
 
     # gerar readings.csv com as colunas ts, temperatura, vibracao, qualidade_de_ar
     try:
-        gerar_readings_from_sensores(df_sensores, outdir, filename="readings.csv")
+        cache.gravar_saida(os.path.join(outdir, "readings.csv"), k_carregar,
+                           lambda: gerar_readings_from_sensores(df_sensores, outdir, filename="readings.csv"))
     except Exception as e:
         logger.error("Falha ao gerar readings.csv: %s", e)
 
+    if args.db:
+        try:
+            cache.gravar_saida(args.db, k_carregar, lambda: salvar_readings_sqlite(df_sensores, args.db))
+        except Exception as e:
+            logger.error("Falha ao gravar leituras no SQLite: %s", e)
+
     # --- Geração de Dashboards ---
-    gerar_dashboards(df, outdir)
-    gerar_dashboards_enriquecidos(df, outdir)
+    k_dashboards = cache.chave("dashboards", k_pontuar, args.nbins)
+    dash_dir = os.path.join(outdir, "dashboards")
+    cache.gravar_saida(os.path.join(dash_dir, "dashboard.html"), k_dashboards,
+                       lambda: gerar_dashboards(df, outdir, args.nbins, args.n_jobs))
+    cache.gravar_saida(os.path.join(dash_dir, "dashboard_enriquecidos.html"), k_dashboards,
+                       lambda: gerar_dashboards_enriquecidos(df, outdir, args.nbins, args.n_jobs))
 
 
 if __name__ == "__main__":
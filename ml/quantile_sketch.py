@@ -0,0 +1,114 @@
+# coding: utf-8
+"""
+quantile_sketch.py - t-digest (variante "merging") para quantis de fluxo.
+
+Resume uma distribuição em algumas centenas de centróides (média, peso), com
+erro pequeno principalmente nas caudas (q perto de 0 ou 1), que é onde ficam
+os limiares de criticidade (0.75 / 0.9 / 0.98). Dois digests se juntam com
+merge(), então cada chunk ou processo pode manter o seu e o resultado é
+combinado no fim.
+
+    d = TDigest()
+    d.update(scores_chunk_1)
+    d.merge(outro_digest)
+    d.quantile([0.75, 0.9, 0.98])   # limiares
+    d.cdf(novos_scores)              # rank percentual aproximado
+"""
+import numpy as np
+
+COMPRESSAO = 200
+
+
+class TDigest:
+    def __init__(self, compressao=COMPRESSAO):
+        self.compressao = compressao
+        self.medias = np.empty(0)
+        self.pesos = np.empty(0)
+        self.min = np.inf
+        self.max = -np.inf
+        self._buffer = []
+        self._n_buffer = 0
+
+    @classmethod
+    def de_valores(cls, valores, compressao=COMPRESSAO):
+        d = cls(compressao)
+        d.update(valores)
+        return d
+
+    @classmethod
+    def juntar(cls, digests, compressao=COMPRESSAO):
+        out = cls(compressao)
+        for d in digests:
+            out.merge(d)
+        return out
+
+    @property
+    def n(self):
+        self._compactar()
+        return float(self.pesos.sum())
+
+    def update(self, valores):
+        v = np.asarray(valores, dtype=float).ravel()
+        v = v[~np.isnan(v)]
+        if not len(v):
+            return self
+        self._adicionar(v, np.ones(len(v)))
+        return self
+
+    def merge(self, outro):
+        """Incorpora outro digest (o outro não é alterado)."""
+        outro._compactar()
+        if len(outro.medias):
+            self._adicionar(outro.medias, outro.pesos)
+            self.min = min(self.min, outro.min)
+            self.max = max(self.max, outro.max)
+        return self
+
+    def _adicionar(self, medias, pesos):
+        self._buffer.append((medias, pesos))
+        self._n_buffer += len(medias)
+        self.min = min(self.min, float(medias.min()))
+        self.max = max(self.max, float(medias.max()))
+        if self._n_buffer >= 10 * self.compressao:
+            self._compactar()
+
+    def _compactar(self):
+        if not self._buffer:
+            return
+        medias = np.concatenate([self.medias] + [m for m, _ in self._buffer])
+        pesos = np.concatenate([self.pesos] + [w for _, w in self._buffer])
+        self._buffer, self._n_buffer = [], 0
+        ordem = np.argsort(medias, kind="stable")
+        medias, pesos = medias[ordem], pesos[ordem]
+        acumulado = np.cumsum(pesos)
+        total = acumulado[-1]
+        # escala k1 (arco-seno): cada centróide cobre no máximo 1 unidade de k,
+        # o que deixa os centróides das caudas pequenos
+        q = (acumulado - pesos / 2) / total
+        k = np.floor(self.compressao / (2 * np.pi) * (np.arcsin(2 * q - 1) + np.pi / 2))
+        inicio = np.flatnonzero(np.r_[True, k[1:] != k[:-1]])
+        soma_pesos = np.add.reduceat(pesos, inicio)
+        self.medias = np.add.reduceat(medias * pesos, inicio) / soma_pesos
+        self.pesos = soma_pesos
+
+    def _pontos(self):
+        """(x, F(x)) para interpolação: min, centros dos centróides, max."""
+        self._compactar()
+        centros = (np.cumsum(self.pesos) - self.pesos / 2) / self.pesos.sum()
+        return np.r_[self.min, self.medias, self.max], np.r_[0.0, centros, 1.0]
+
+    def quantile(self, q):
+        if not len(self.medias) and not self._buffer:
+            return np.full(np.shape(q), np.nan)
+        x, f = self._pontos()
+        return np.interp(q, f, x)
+
+    def cdf(self, valores):
+        if not len(self.medias) and not self._buffer:
+            return np.full(np.shape(valores), np.nan)
+        x, f = self._pontos()
+        return np.interp(valores, x, f)
+
+    def __getstate__(self):
+        self._compactar()
+        return self.__dict__
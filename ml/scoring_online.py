@@ -0,0 +1,207 @@
+# coding: utf-8
+"""
+scoring_online.py - Pontuação de anomalias ao vivo (IsolationForest) para o
+dashboard e para a ingestão, a cada micro-lote de leituras.
+
+- usa o IsolationForest "online" salvo pelo comando treinar (modelos.py),
+  ajustado só nos sensores que chegam ao vivo (temperatura, vibração, ...);
+- a floresta é "achatada" em vetores NumPy e percorrida para todas as árvores
+  de uma vez (um passo por nível), sem o custo por árvore do scikit-learn:
+  uma leitura isolada custa bem menos de 1 ms;
+- a criticidade sai da comparação do score com três limiares (quantis
+  0.75 / 0.9 / 0.98 do t-digest dos scores do treino, quantile_sketch.py) e o
+  rank da CDF desse digest. Limiares e rank ficam fixos: a mesma leitura tem
+  sempre a mesma classe, e uma anomalia que se prolonga não rebaixa a si mesma;
+- os scores ao vivo vão para um digest à parte (`ao_vivo`), só para
+  monitoramento (deriva) ou para juntar com o de outros processos;
+  atualizar_limiares=True (opcional) recalcula limiares e rank sobre treino +
+  ao vivo a cada `atualizar_a_cada` leituras.
+
+Exemplo:
+    scorer = OnlineScorer("saida/modelos")
+    scorer.pontuar([{"temperature": 31.2, "vibration": 0.4, "luminosity": 512, "air_q": 80}])
+"""
+import os
+import sys
+import time
+import logging
+
+import numpy as np
+import pandas as pd
+
+ML_DIR = os.path.dirname(os.path.abspath(__file__))
+if ML_DIR not in sys.path:
+    sys.path.insert(0, ML_DIR)
+
+from modelos import (COLUNAS_ONLINE, CRITICIDADE_LABELS, carregar_modelos, codigos_criticidade,
+                     limiares_criticidade, rank_na_referencia)
+from quantile_sketch import TDigest
+
+logger = logging.getLogger("scoring_online")
+
+EULER = 0.5772156649
+
+
+def caminho_medio(n):
+    """Comprimento médio de uma busca sem sucesso numa BST de n elementos (c(n) do IsolationForest)."""
+    n = np.asarray(n, dtype=float)
+    out = np.zeros_like(n)
+    out[n == 2] = 1.0
+    m = n > 2
+    out[m] = 2.0 * (np.log(n[m] - 1.0) + EULER) - 2.0 * (n[m] - 1.0) / n[m]
+    return out
+
+
+class FlatIsolationForest:
+    """
+    IsolationForest do scikit-learn em vetores contíguos. score(X) devolve o
+    mesmo valor que -iso.score_samples(X) (maior = mais anômalo).
+    """
+
+    def __init__(self, iso):
+        esquerda, direita, feature, limiar, folha, raizes = [], [], [], [], [], []
+        offset, profundidade_max = 0, 0
+        for arvore, features in zip(iso.estimators_, iso.estimators_features_):
+            t = arvore.tree_
+            n = t.node_count
+            esq, dir_ = t.children_left.copy(), t.children_right.copy()
+            e_folha = esq == -1
+            prof = np.zeros(n)
+            for no in range(n):  # nós do sklearn vêm em pré-ordem: o pai antes dos filhos
+                if not e_folha[no]:
+                    prof[esq[no]] = prof[dir_[no]] = prof[no] + 1
+            profundidade_max = max(profundidade_max, int(prof.max()))
+            idx = np.arange(n)
+            # folhas apontam para si mesmas: o percurso pode rodar um número fixo de passos
+            esquerda.append(np.where(e_folha, idx, esq) + offset)
+            direita.append(np.where(e_folha, idx, dir_) + offset)
+            feature.append(np.where(e_folha, 0, np.asarray(features)[np.maximum(t.feature, 0)]))
+            limiar.append(np.where(e_folha, np.inf, t.threshold))
+            folha.append(np.where(e_folha, prof + caminho_medio(t.n_node_samples), 0.0))
+            raizes.append(offset)
+            offset += n
+        self.esquerda = np.concatenate(esquerda)
+        self.direita = np.concatenate(direita)
+        self.feature = np.concatenate(feature)
+        self.limiar = np.concatenate(limiar)
+        self.folha = np.concatenate(folha)
+        self.raizes = np.asarray(raizes)
+        self.passos = profundidade_max
+        self.normalizacao = float(caminho_medio([iso.max_samples_])[0])
+
+    def score(self, X):
+        # as árvores comparam em float32, como no scikit-learn
+        X = np.asarray(X, dtype=np.float32)
+        linhas = np.arange(len(X))[:, None]
+        no = np.broadcast_to(self.raizes, (len(X), len(self.raizes)))
+        for _ in range(self.passos):
+            vai_esquerda = X[linhas, self.feature[no]] <= self.limiar[no]
+            no = np.where(vai_esquerda, self.esquerda[no], self.direita[no])
+        return 2.0 ** (-self.folha[no].mean(axis=1) / self.normalizacao)
+
+
+class OnlineScorer:
+    """
+    Pontua micro-lotes de leituras ao vivo. pontuar(linhas) aceita DataFrame ou
+    lista de dicts com as colunas do dashboard (temperature, vibration, ...) e
+    devolve anomalia_score, anomalia_rank_pct e criticidade por linha.
+    """
+
+    def __init__(self, dir_modelos=None, versao=None, modelos=None, atualizar_a_cada=1_000,
+                 atualizar_limiares=False):
+        modelos = modelos or carregar_modelos(dir_modelos, versao)
+        if modelos.iso_online is None:
+            raise ValueError(f"Versão {modelos.versao} sem IsolationForest online (treine de novo)")
+        self.versao = modelos.versao
+        self.colunas = [COLUNAS_ONLINE[c] for c in modelos.features_online]
+        self.floresta = FlatIsolationForest(modelos.iso_online)
+        # referência do treino (não é alterada); rank e limiares saem dela
+        self.referencia_treino = modelos.referencia_online
+        self.referencia = self.referencia_treino
+        self.limiares = limiares_criticidade(self.referencia)
+        # scores ao vivo: monitoramento/merge; só entram nos limiares com atualizar_limiares=True
+        self.ao_vivo = TDigest()
+        self.atualizar_a_cada = atualizar_a_cada
+        self.atualizar_limiares = atualizar_limiares
+        self._pendentes = []
+        self._n_pendentes = 0
+        self.contagem = np.zeros(len(CRITICIDADE_LABELS), dtype=np.int64)
+        self.leituras = 0
+        self.tempo_s = 0.0
+
+    def _matriz(self, linhas):
+        if isinstance(linhas, pd.DataFrame):
+            return linhas.reindex(columns=self.colunas).apply(pd.to_numeric, errors="coerce").to_numpy(float)
+        return np.array([[np.nan if r.get(c) is None else r.get(c) for c in self.colunas] for r in linhas], float)
+
+    def pontuar_valores(self, X):
+        """(scores, rank_pct, códigos de criticidade 0..3) de uma matriz na ordem de self.colunas; só NumPy."""
+        t0 = time.perf_counter()
+        X = np.where(np.isnan(X), 0.0, X)  # mesmo fillna(0) do treino
+        scores = self.floresta.score(X)
+        rank = rank_na_referencia(scores, self.referencia)
+        codigos = codigos_criticidade(scores, self.limiares)
+        self._pendentes.append(scores)
+        self._n_pendentes += len(scores)
+        if self._n_pendentes >= self.atualizar_a_cada:
+            self._atualizar_referencia()
+        self.contagem += np.bincount(codigos, minlength=len(CRITICIDADE_LABELS))
+        self.leituras += len(scores)
+        self.tempo_s += time.perf_counter() - t0
+        return scores, rank, codigos
+
+    def pontuar_leitura(self, leitura: dict) -> dict:
+        """Uma leitura (dict) -> {anomalia_score, anomalia_rank_pct, criticidade}; caminho sem pandas."""
+        scores, rank, codigos = self.pontuar_valores(self._matriz([leitura]))
+        return {"anomalia_score": float(scores[0]), "anomalia_rank_pct": float(rank[0]),
+                "criticidade": CRITICIDADE_LABELS[codigos[0]]}
+
+    def pontuar(self, linhas) -> pd.DataFrame:
+        """Micro-lote (DataFrame ou lista de dicts) -> DataFrame com as colunas de anomalia."""
+        index = linhas.index if isinstance(linhas, pd.DataFrame) else None
+        X = self._matriz(linhas if index is not None else list(linhas))
+        if not len(X):
+            return pd.DataFrame(columns=["anomalia_score", "anomalia_rank_pct", "criticidade"], index=index)
+        scores, rank, codigos = self.pontuar_valores(X.reshape(len(X), len(self.colunas)))
+        return pd.DataFrame({
+            "anomalia_score": scores,
+            "anomalia_rank_pct": rank,
+            "criticidade": pd.Categorical.from_codes(codigos, categories=CRITICIDADE_LABELS, ordered=True),
+        }, index=index)
+
+    def _atualizar_referencia(self):
+        """Leva os scores pendentes para o digest ao vivo e, se ligado, recalcula rank e limiares."""
+        self.ao_vivo.update(np.concatenate(self._pendentes))
+        self._pendentes, self._n_pendentes = [], 0
+        if self.atualizar_limiares:
+            self.referencia = TDigest.juntar([self.referencia_treino, self.ao_vivo])
+            self.limiares = limiares_criticidade(self.referencia)
+
+    def stats(self) -> dict:
+        vivo = limiares_criticidade(self.ao_vivo) if self.ao_vivo.n else []
+        return {"versao": self.versao, "leituras": self.leituras,
+                "limiares": [round(float(x), 4) for x in self.limiares],
+                "limiares_ao_vivo": [round(float(x), 4) for x in vivo],
+                "criticidade": dict(zip(CRITICIDADE_LABELS, self.contagem.tolist())),
+                "ms_por_leitura": round(1000 * self.tempo_s / self.leituras, 4) if self.leituras else None}
+
+
+class UltimasPontuadas:
+    """
+    Ouvinte do leitor incremental (subscribe): pontua só as linhas novas e
+    guarda as últimas n pontuadas. Numa releitura completa pontua só o fim.
+    """
+
+    def __init__(self, scorer: OnlineScorer, n: int = 500):
+        self.scorer = scorer
+        self.n = n
+        self.frame = pd.DataFrame()
+
+    def on_rows(self, new: pd.DataFrame, reset: bool = False):
+        if reset:
+            self.frame = pd.DataFrame()
+            new = new.tail(self.n)
+        if new.empty:
+            return
+        scored = new.join(self.scorer.pontuar(new))
+        self.frame = pd.concat([self.frame, scored]).tail(self.n) if not self.frame.empty else scored.tail(self.n)
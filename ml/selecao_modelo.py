@@ -0,0 +1,135 @@
+# coding: utf-8
+"""
+selecao_modelo.py - Seleção de hiperparâmetros do classificador de falhas.
+
+Validação cruzada estratificada (k folds) de uma grade de parâmetros do
+RandomForest, distribuída num pool de processos (joblib/loky, todos os núcleos
+por padrão):
+
+- o ColumnTransformer é ajustado uma vez por fold (no próprio processo do
+  pool) e as matrizes transformadas são gravadas uma única vez com
+  joblib.dump numa pasta temporária; cada tarefa (candidato x fold) recebe só
+  o caminho, abre as matrizes com mmap_mode="r" (inclusive os arrays da
+  matriz esparsa do one-hot) e só ajusta e avalia a floresta;
+- cada candidato tem o tempo de parede (soma das suas tarefas), o tempo de
+  ajuste e o custo de pontuação (ms por 1000 leituras) no relatório;
+- o escolhido é o mais barato de pontuar entre os que ficam a até
+  `tolerancia` do melhor F1 médio.
+"""
+import os
+import time
+import logging
+import tempfile
+import itertools
+
+import numpy as np
+import pandas as pd
+import joblib
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.impute import SimpleImputer
+from sklearn.metrics import balanced_accuracy_score, f1_score, roc_auc_score
+from sklearn.model_selection import StratifiedKFold
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+logger = logging.getLogger("pipeline_sensor5")
+
+# parâmetros fixos do RandomForest do pipeline; a grade sobrescreve os que variar
+RF_PADRAO = {"n_estimators": 200, "random_state": 42, "class_weight": "balanced"}
+GRADE_PADRAO = {
+    "n_estimators": [50, 100, 200],
+    "max_depth": [None, 12, 24],
+    "min_samples_leaf": [1, 5],
+}
+
+
+def construir_preprocessador(numeric_features, categorical_features):
+    return ColumnTransformer([
+        ("num", Pipeline([("imp", SimpleImputer(strategy="median")), ("sc", StandardScaler())]), numeric_features),
+        ("cat", Pipeline(
+            [("imp", SimpleImputer(strategy="most_frequent")), ("ohe", OneHotEncoder(handle_unknown="ignore"))]),
+         categorical_features)
+    ])
+
+
+def candidatos(grade):
+    chaves = sorted(grade)
+    return [dict(zip(chaves, valores)) for valores in itertools.product(*(grade[c] for c in chaves))]
+
+
+def _preparar_fold(pre, X, y, treino, teste, caminho):
+    """
+    Ajusta o pré-processamento só no treino do fold e grava as matrizes
+    transformadas (Xtr, ytr, Xte, yte) em `caminho`; devolve o caminho.
+    """
+    pre = clone(pre).fit(X.iloc[treino], y.iloc[treino])
+    joblib.dump((pre.transform(X.iloc[treino]), y.iloc[treino].to_numpy(), pre.transform(X.iloc[teste]),
+                 y.iloc[teste].to_numpy()), caminho)
+    return caminho
+
+
+def _avaliar(params, fold, caminho):
+    Xtr, ytr, Xte, yte = joblib.load(caminho, mmap_mode="r")
+    t0 = time.perf_counter()
+    rf = RandomForestClassifier(**dict(RF_PADRAO, **params, n_jobs=1)).fit(Xtr, ytr)
+    t1 = time.perf_counter()
+    proba = rf.predict_proba(Xte)
+    t2 = time.perf_counter()
+    pos = list(rf.classes_).index(1) if 1 in rf.classes_ else None
+    p1 = proba[:, pos] if pos is not None else np.zeros(len(yte))
+    pred = (p1 >= 0.5).astype(int)
+    return {
+        "fold": fold,
+        "f1": f1_score(yte, pred, zero_division=0),
+        "acuracia_balanceada": balanced_accuracy_score(yte, pred),
+        "roc_auc": roc_auc_score(yte, p1) if len(np.unique(yte)) > 1 else np.nan,
+        "ajuste_s": t1 - t0,
+        "ms_por_1000": (t2 - t1) * 1000 * 1000 / max(len(yte), 1),
+        "parede_s": t2 - t0,
+    }
+
+
+def selecionar_classificador(df, numeric_features, categorical_features, grade=None, folds=5, n_jobs=-1,
+                             tolerancia=0.01):
+    """
+    Roda a busca e devolve (parâmetros escolhidos, relatório por candidato).
+    None se não houver coluna falha com duas classes.
+    """
+    if "falha" not in df.columns or df["falha"].nunique() <= 1:
+        return None, None
+    X = df[numeric_features + categorical_features]
+    y = df["falha"].astype(int)
+    folds = max(2, min(folds, int(y.value_counts().min())))
+    divisoes = list(StratifiedKFold(n_splits=folds, shuffle=True, random_state=42).split(X, y))
+    lista = candidatos(grade or GRADE_PADRAO)
+    pre = construir_preprocessador(numeric_features, categorical_features)
+
+    t0 = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="selecao_modelo_") as pasta, Parallel(n_jobs=n_jobs) as pool:
+        # 1) pré-processamento: uma vez por fold, gravado uma vez em disco
+        cache = pool(delayed(_preparar_fold)(pre, X, y, tr, te, os.path.join(pasta, f"fold{k}.joblib"))
+                     for k, (tr, te) in enumerate(divisoes))
+        t_pre = time.perf_counter() - t0
+        # 2) candidatos x folds: cada tarefa leva só o caminho do fold (memmap, sem nova serialização)
+        tarefas = [(i, k) for i in range(len(lista)) for k in range(folds)]
+        resultados = pool(delayed(_avaliar)(lista[i], k, cache[k]) for i, k in tarefas)
+    total = time.perf_counter() - t0
+
+    por_tarefa = pd.DataFrame(resultados).assign(candidato=[i for i, _ in tarefas])
+    rel = por_tarefa.groupby("candidato").agg(
+        f1=("f1", "mean"), f1_std=("f1", "std"), acuracia_balanceada=("acuracia_balanceada", "mean"),
+        roc_auc=("roc_auc", "mean"), ajuste_s=("ajuste_s", "mean"), ms_por_1000=("ms_por_1000", "mean"),
+        parede_s=("parede_s", "sum"))
+    rel.insert(0, "parametros", [str(lista[i]) for i in rel.index])
+    melhor_f1 = rel["f1"].max()
+    elegiveis = rel[rel["f1"] >= melhor_f1 - tolerancia]
+    escolhido = elegiveis.sort_values(["ms_por_1000", "f1"], ascending=[True, False]).index[0]
+    rel["escolhido"] = rel.index == escolhido
+    rel = rel.sort_values("f1", ascending=False)
+    logger.info("Seleção: %d candidatos x %d folds em %.1fs (pré-processamento %.1fs); escolhido %s "
+                "(F1 %.3f, melhor %.3f, %.2f ms/1000 leituras)", len(lista), folds, total, t_pre,
+                lista[escolhido], rel.loc[escolhido, "f1"], melhor_f1, rel.loc[escolhido, "ms_por_1000"])
+    return lista[escolhido], rel.reset_index(drop=True)
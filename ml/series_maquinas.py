@@ -0,0 +1,185 @@
+# coding: utf-8
+"""
+series_maquinas.py - Séries temporais por máquina em pequenos múltiplos
+(dashboards/series_maquinas.html), para frotas grandes e históricos longos.
+
+- cada série é reduzida por máquina e por coluna com min/max por balde
+  (dashboard/downsample.py): no máximo `pontos` pontos, picos preservados;
+- os dados de cada máquina ficam em series_maquinas/<máquina>-<hash>.js e só são
+  carregados (tag <script>, funciona também em file://) quando o cartão da
+  máquina aparece na tela (IntersectionObserver);
+- a página mostra `por_pagina` máquinas por vez, com traces WebGL (scattergl).
+
+O HTML inicial só tem a lista de máquinas, então abre rápido para qualquer
+tamanho de frota.
+"""
+import os
+import re
+import json
+import hashlib
+import logging
+import tempfile
+
+import numpy as np
+import pandas as pd
+from plotly.offline import get_plotlyjs_version
+
+logger = logging.getLogger("pipeline_sensor5")
+
+PONTOS_PADRAO = 1000
+POR_PAGINA = 12
+
+
+def _nome_arquivo(maquina):
+    """
+    <id legível>-<hash curto do id>.js: o hash mantém o nome único quando ids
+    diferentes viram o mesmo texto depois da troca de caracteres ("M 1" e "M_1")
+    ou só diferem em maiúsculas (sistemas de arquivos que não as distinguem).
+    """
+    texto = str(maquina)
+    resumo = hashlib.sha1(texto.encode("utf-8")).hexdigest()[:8]
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", texto) + "-" + resumo + ".js"
+
+
+def series_por_maquina(df, colunas, pontos=PONTOS_PADRAO, chave="id_maquina", ts="ts"):
+    """
+    {máquina: {coluna: (x em ms desde a época, y)}}, ordenado por ts, com no
+    máximo `pontos` pontos por coluna (min/max por balde). Linhas sem ts ou
+    sem valor são ignoradas.
+    """
+    from dashboard.downsample import minmax
+
+    t = pd.to_datetime(df[ts], errors="coerce")
+    ok_t = t.notna().to_numpy()
+    t_ms = t.to_numpy(dtype="datetime64[ms]").astype(np.int64)
+    valores = {c: pd.to_numeric(df[c], errors="coerce").to_numpy(dtype=float, na_value=np.nan) for c in colunas}
+    out = {}
+    for maquina, idx in df.groupby(chave, sort=True).indices.items():
+        idx = idx[ok_t[idx]]
+        idx = idx[np.argsort(t_ms[idx], kind="stable")]
+        series = {}
+        for c in colunas:
+            y = valores[c][idx]
+            ok = np.isfinite(y)
+            x, y = minmax(t_ms[idx][ok], y[ok], pontos)
+            series[c] = (x, y)
+        out[maquina] = series
+    return out
+
+
+def _gravar(caminho, texto):
+    fd, tmp = tempfile.mkstemp(prefix="tmp_serie_", suffix=os.path.splitext(caminho)[1],
+                               dir=os.path.dirname(caminho) or ".")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(texto)
+    os.replace(tmp, caminho)
+
+
+def gerar_series_maquinas(df, colunas, dash_path, pontos=PONTOS_PADRAO, por_pagina=POR_PAGINA):
+    """Grava dash_path e a pasta com um .js por máquina ao lado. Devolve o número de máquinas."""
+    series = series_por_maquina(df, colunas, pontos)
+    dados_dir = os.path.splitext(dash_path)[0]
+    os.makedirs(dados_dir, exist_ok=True)
+    arquivos = {}
+    for maquina, cols in series.items():
+        nome = _nome_arquivo(maquina)
+        arquivos[str(maquina)] = nome
+        dados = {c: {"x": x.tolist(), "y": np.round(y, 6).tolist()} for c, (x, y) in cols.items()}
+        _gravar(os.path.join(dados_dir, nome),
+                f"carregarSerie({json.dumps(str(maquina))}, {json.dumps(dados, separators=(',', ':'))});\n")
+    # arquivos de máquinas que não estão mais nos dados
+    for nome in set(os.listdir(dados_dir)) - set(arquivos.values()):
+        if nome.endswith(".js"):
+            os.remove(os.path.join(dados_dir, nome))
+
+    config = {"maquinas": list(arquivos), "arquivos": arquivos, "colunas": list(colunas),
+              "pasta": os.path.basename(dados_dir), "porPagina": por_pagina}
+    _gravar(dash_path, PAGINA.replace("__PLOTLY__", get_plotlyjs_version())
+            .replace("__CONFIG__", json.dumps(config, ensure_ascii=False)))
+    return len(series)
+
+
+PAGINA = """<html>
+<head>
+<meta charset="utf-8" />
+<title>Séries temporais por máquina</title>
+<script src="https://cdn.plot.ly/plotly-__PLOTLY__.min.js"></script>
+<style>
+  body { font-family: sans-serif; margin: 16px; }
+  nav { margin: 8px 0 12px; display: flex; gap: 8px; align-items: center; }
+  .grade { display: grid; grid-template-columns: repeat(auto-fill, minmax(440px, 1fr)); gap: 12px; }
+  .cartao { height: 300px; border: 1px solid #ddd; }
+</style>
+</head>
+<body>
+<h2>Séries temporais por máquina</h2>
+<nav>
+  <button id="anterior">&#9664;</button><span id="pagina"></span><button id="proxima">&#9654;</button>
+  <label>coluna <select id="coluna"></select></label>
+</nav>
+<div class="grade" id="grade"></div>
+<script>
+const CONFIG = __CONFIG__;
+const dados = {}, pendentes = {};
+let pagina = 0;
+
+// chamado por series_maquinas/<máquina>.js
+function carregarSerie(maquina, series) {
+  dados[maquina] = series;
+  (pendentes[maquina] || []).forEach(desenhar);
+  delete pendentes[maquina];
+}
+
+function carregar(maquina, div) {
+  if (dados[maquina]) return desenhar(div);
+  if (!pendentes[maquina]) {
+    pendentes[maquina] = [];
+    const s = document.createElement("script");
+    s.src = CONFIG.pasta + "/" + CONFIG.arquivos[maquina];
+    document.head.appendChild(s);
+  }
+  pendentes[maquina].push(div);
+}
+
+function desenhar(div) {
+  const maquina = div.dataset.maquina, col = document.getElementById("coluna").value;
+  const s = dados[maquina][col];
+  Plotly.react(div, [{type: "scattergl", mode: "lines", x: s.x, y: s.y, name: col}],
+    {title: {text: "Máquina " + maquina, font: {size: 14}}, margin: {l: 50, r: 10, t: 36, b: 36},
+     xaxis: {type: "date"}, yaxis: {title: {text: col}}},
+    {responsive: true, displaylogo: false});
+  div.dataset.desenhado = "1";
+}
+
+const observador = new IntersectionObserver(entradas => entradas.forEach(e => {
+  if (e.isIntersecting) { observador.unobserve(e.target); carregar(e.target.dataset.maquina, e.target); }
+}), {rootMargin: "200px"});
+
+function mostrar(p) {
+  const total = Math.max(1, Math.ceil(CONFIG.maquinas.length / CONFIG.porPagina));
+  pagina = Math.min(Math.max(p, 0), total - 1);
+  const grade = document.getElementById("grade");
+  grade.querySelectorAll(".cartao").forEach(div => Plotly.purge(div));
+  grade.innerHTML = "";
+  observador.disconnect();
+  CONFIG.maquinas.slice(pagina * CONFIG.porPagina, (pagina + 1) * CONFIG.porPagina).forEach(m => {
+    const div = document.createElement("div");
+    div.className = "cartao";
+    div.dataset.maquina = m;
+    grade.appendChild(div);
+    observador.observe(div);
+  });
+  document.getElementById("pagina").textContent =
+    "página " + (pagina + 1) + " de " + total + " (" + CONFIG.maquinas.length + " máquinas)";
+}
+
+const seletor = document.getElementById("coluna");
+CONFIG.colunas.forEach(c => seletor.add(new Option(c, c)));
+seletor.onchange = () => document.querySelectorAll(".cartao[data-desenhado]").forEach(desenhar);
+document.getElementById("anterior").onclick = () => mostrar(pagina - 1);
+document.getElementById("proxima").onclick = () => mostrar(pagina + 1);
+mostrar(0);
+</script>
+</body>
+</html>
+"""
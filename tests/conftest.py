@@ -0,0 +1,50 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# os modulos do dashboard e do ml importam os vizinhos diretamente
+for d in (ROOT_DIR, os.path.join(ROOT_DIR, "dashboard"), os.path.join(ROOT_DIR, "ml")):
+    if d not in sys.path:
+        sys.path.insert(0, d)
+
+
+@pytest.fixture
+def base_sensores(tmp_path):
+    """Pasta com os quatro CSVs de entrada do pipeline_sensor5 (n leituras, 9 maquinas)."""
+    def criar(n=600):
+        rng = np.random.default_rng(0)
+        maquinas = list(range(11, 20))
+        pd.DataFrame({
+            "id_maquina": maquinas,
+            "modelo": ["WeldMaster", "WeldPro", "CutTech", "CutTech", "AssemBot", "AssemPro", "PaintBot",
+                       "PaintBot", "PaintTech"],
+            "tipo": ["Solda", "Solda", "Corte", "Corte", "Montagem", "Montagem", "Pintura", "Pintura", "Pintura"],
+            "data_instalacao": ["2022-06-10"] * 9,
+        }).to_csv(tmp_path / "maquina_autonoma.csv", index=False)
+        pd.DataFrame({
+            "id_manutencao": range(39, 43), "data_manutencao": ["2025-07-02", "2025-07-03", "2025-07-04", "2025-07-05"],
+            "id_maquina": [11, 12, 14, 16], "id_funcionario": [11, 11, 12, 12],
+        }).to_csv(tmp_path / "manutencao.csv", index=False)
+        pd.DataFrame({
+            "id_funcionario": [11, 12], "nome": ["Marcio", "Ana"], "idade": [35, 39], "salario": [2500, 3000],
+            "cargo": ["Manutencao", "Supervisor"],
+        }).to_csv(tmp_path / "funcionario.csv", index=False)
+        vib = rng.gamma(2, 8, n)
+        pd.DataFrame({
+            "id_leitura_sensores": range(1, n + 1),
+            "ts": pd.date_range("2025-07-01", periods=n, freq="10min").strftime("%Y-%m-%d %H:%M:%S"),
+            "id_maquina": rng.choice(maquinas, n),
+            "temperatura": rng.normal(40, 15, n).round(1),
+            "umidade": rng.uniform(30, 70, n).round(1),
+            "dias_ultima_manutencao": rng.integers(0, 250, n),
+            "falha": ((vib > 25) | (rng.random(n) < 0.05)).astype(int),
+            "luminosidade": rng.uniform(300, 700, n).round(1),
+            "vibracao": vib.round(1),
+            "qualidade_ar": rng.integers(20, 480, n),
+        }).to_csv(tmp_path / "leitura_sensores.csv", index=False)
+        return tmp_path
+    return criar
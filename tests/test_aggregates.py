@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from aggregates import AggregateStore
+
+
+def leituras(n=5000, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({"ts": pd.date_range("2024-01-01", periods=n, freq="7min"),
+                       "vibration": rng.random(n), "air_q": rng.random(n) * 100})
+    df.loc[rng.random(n) < 0.05, "vibration"] = np.nan
+    return df
+
+
+@pytest.mark.parametrize("span", ["1h", "24h", "7D"])
+def test_window_stats_igual_ao_pandas(span):
+    df = leituras()
+    # leituras atrasadas no fim criam baldes no meio do array
+    atrasadas = df.sample(200, random_state=1)
+    df = pd.concat([df.drop(atrasadas.index), atrasadas])
+    agg = AggregateStore()
+    for i in range(0, len(df), 97):
+        agg.update(df.iloc[i:i + 97])
+
+    # inicio alinhado a hora: o mesmo resultado em qualquer resolucao
+    start = (agg.last_ts - pd.Timedelta(span)).floor("h")
+    esperado = df.loc[df["ts"] >= start, "vibration"].dropna()
+    w = agg.window_stats("vibration", start)
+    assert w["count"] == len(esperado)
+    assert w["mean"] == pytest.approx(esperado.mean())
+    assert w["std"] == pytest.approx(esperado.std())
+    assert (w["min"], w["max"]) == (esperado.min(), esperado.max())
+
+
+def test_retencao_descarta_baldes_antigos():
+    agg = AggregateStore(resolutions={"min": pd.Timedelta(hours=1), "h": None})
+    df = leituras(2000)
+    for i in range(0, len(df), 50):
+        agg.update(df.iloc[i:i + 50])
+    keys = agg.buckets["min"].keys
+    assert len(keys) <= 61
+    assert keys[0] >= (agg.last_ts - pd.Timedelta(hours=1)).floor("min").value
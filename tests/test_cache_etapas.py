@@ -0,0 +1,30 @@
+import os
+import shutil
+import subprocess
+import sys
+
+from conftest import ROOT_DIR
+
+PIPELINE = os.path.join(ROOT_DIR, "ml", "pipeline_sensor5.py")
+
+
+def rodar(base, *extra):
+    env = dict(os.environ, MPLBACKEND="Agg")
+    r = subprocess.run([sys.executable, PIPELINE, "completo", "--base-path", str(base), "--modelos",
+                        str(base / "modelos"), "--cache", str(base / "cache"), *extra],
+                       check=True, cwd=str(base), env=env, capture_output=True, text=True)
+    return r.stdout + r.stderr
+
+
+def test_treino_em_cache_regrava_relatorios_e_ignora_n_jobs(base_sensores):
+    base = base_sensores(600)
+    rodar(base, "--n-jobs", "1")
+    relatorios = [base / "saida" / "relatorios" / "metricas_classificacao.csv",
+                  base / "saida" / "figs" / "confusion_matrix.png"]
+    conteudo = [p.read_bytes() for p in relatorios]
+
+    # pasta de saida limpa, cache quente e outro numero de nucleos
+    shutil.rmtree(base / "saida")
+    log = rodar(base, "--n-jobs", "2")
+    assert "Cache: treinar reaproveitada" in log
+    assert [p.read_bytes() for p in relatorios] == conteudo
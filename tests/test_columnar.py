@@ -0,0 +1,61 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from columnar import EscritorColunar, ler_colunar
+
+pytest.importorskip("pyarrow")
+
+
+def resultados(n=20000, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "ts": pd.date_range("2025-07-01", periods=n, freq="min"),
+        "id_maquina": rng.choice(np.arange(11, 20), n),
+        "score": rng.random(n),
+        "criticidade": pd.Categorical(rng.choice(["baixa", "alta"], n), categories=["baixa", "alta"],
+                                      ordered=True),
+    })
+
+
+def arquivos(destino):
+    return sorted(os.path.relpath(os.path.join(r, a), destino) for r, _, fs in os.walk(destino) for a in fs)
+
+
+@pytest.mark.parametrize("formato", ["parquet", "arrow"])
+def test_chunks_viram_um_arquivo_por_particao(tmp_path, formato):
+    df = resultados()
+    destino = str(tmp_path / "dados_resultados")
+    escritor = EscritorColunar(destino, formato)
+    for i in range(0, len(df), 2000):
+        escritor.escrever(df.iloc[i:i + 2000])
+    escritor.fechar()
+
+    partes = arquivos(destino)
+    assert len(partes) == df["id_maquina"].nunique()
+    assert all(os.path.basename(p) == "part-0" + ("." + formato) for p in partes)
+
+    lido = ler_colunar(destino)
+    assert list(lido.columns) == list(df.columns)
+    assert lido["criticidade"].dtype == df["criticidade"].dtype
+    # dentro de cada máquina, a ordem de gravação dos chunks é mantida
+    chave = ["id_maquina", "ts"]
+    pd.testing.assert_frame_equal(lido.sort_values(chave, kind="stable").reset_index(drop=True),
+                                  df.sort_values(chave, kind="stable").reset_index(drop=True))
+    assert lido.groupby("id_maquina")["ts"].is_monotonic_increasing.all()
+    # a coluna de partição derivada só volta se pedida
+    assert "data" in ler_colunar(destino, columns=["ts", "data"]).columns
+
+
+def test_anexar_grava_um_arquivo_novo_por_particao(tmp_path):
+    df = resultados()
+    destino = str(tmp_path / "dados_resultados")
+    for parte in (df.iloc[:10000], df.iloc[10000:]):
+        escritor = EscritorColunar(destino, anexar=True)
+        for i in range(0, len(parte), 1000):
+            escritor.escrever(parte.iloc[i:i + 1000])
+        escritor.fechar()
+    assert len(arquivos(destino)) == 2 * df["id_maquina"].nunique()
+    assert len(ler_colunar(destino)) == len(df)
@@ -0,0 +1,57 @@
+import numpy as np
+
+from downsample import SeriesPyramid
+
+
+def serie(n=20000, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.cumsum(rng.integers(1, 10, n)).astype(np.int64) * 10**9
+    return t, rng.normal(size=n)
+
+
+def em_lotes(p, t, v, seed=1):
+    rng = np.random.default_rng(seed)
+    i = 0
+    while i < len(t):
+        k = int(rng.integers(1, 200))
+        p.extend(t[i:i + k], v[i:i + k])
+        i += k
+
+
+def test_incremental_igual_a_construir_de_uma_vez():
+    t, v = serie()
+    inteira, aos_poucos = SeriesPyramid(), SeriesPyramid()
+    inteira.build(t, v)
+    em_lotes(aos_poucos, t, v)
+    assert len(inteira.levels) == len(aos_poucos.levels)
+    for a, b in zip(inteira.levels, aos_poucos.levels):
+        for f in ("t0", "tmin", "vmin", "tmax", "vmax"):
+            np.testing.assert_array_equal(a[f], b[f])
+
+
+def test_leitura_atrasada_e_intercalada():
+    t, v = serie(5000)
+    p = SeriesPyramid()
+    p.extend(t[:3000], v[:3000])
+    p.extend(t[3500:], v[3500:])
+    p.extend(t[3000:3500], v[3000:3500])
+    ref = SeriesPyramid()
+    ref.build(t, v)
+    for a, b in zip(ref.levels, p.levels):
+        np.testing.assert_array_equal(a["vmax"], b["vmax"])
+
+
+def test_capacidade_limita_memoria_e_preserva_picos():
+    t, v = serie(200_000)
+    v[1234] = 50.0   # pico antigo, bem antes do que o nivel 0 guarda
+    p, ref = SeriesPyramid(capacity=1000), SeriesPyramid()
+    em_lotes(p, t, v)
+    ref.build(t, v)
+
+    assert all(len(lvl) <= 1000 + p.factor for lvl in p.levels)
+    # janela recente: identica a piramide sem limite
+    start = int(t[-500])
+    np.testing.assert_array_equal(p.query(start, budget=300)[1], ref.query(start, budget=300)[1])
+    # historico inteiro sai dos niveis grossos, com o pico
+    _, y = p.query(budget=300)
+    assert y.max() == 50.0
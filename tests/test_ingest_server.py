@@ -0,0 +1,43 @@
+import asyncio
+import json
+import os
+import sys
+
+from conftest import ROOT_DIR
+
+sys.path.insert(0, os.path.join(ROOT_DIR, "ingest"))
+from ingest_server import MicroBatcher, handle_http  # noqa: E402
+
+
+async def requisicao(raw: bytes) -> bytes:
+    written = []
+    batcher = MicroBatcher(written.extend, flush_interval=0.05)
+    server = await asyncio.start_server(lambda r, w: handle_http(r, w, batcher), "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(raw)
+        await writer.drain()
+        resposta = await asyncio.wait_for(reader.read(), 5)
+        writer.close()
+    await batcher.close()
+    return resposta
+
+
+def test_content_length_invalido_responde_400():
+    resposta = asyncio.run(requisicao(b"POST /readings HTTP/1.1\r\nContent-Length: abc\r\n\r\n{}"))
+    assert resposta.startswith(b"HTTP/1.1 400 Bad Request")
+    assert json.loads(resposta.split(b"\r\n\r\n", 1)[1]) == {"erro": "content-length invalido"}
+
+
+def test_content_length_negativo_responde_400():
+    resposta = asyncio.run(requisicao(b"POST /readings HTTP/1.1\r\nContent-Length: -5\r\n\r\n"))
+    assert resposta.startswith(b"HTTP/1.1 400 Bad Request")
+
+
+def test_post_valido_continua_aceito():
+    corpo = json.dumps({"device_id": "esp32-09", "temperature": 28.0, "vibration": 0.2}).encode()
+    raw = (b"POST /readings HTTP/1.1\r\nConnection: close\r\nContent-Length: "
+           + str(len(corpo)).encode() + b"\r\n\r\n" + corpo)
+    resposta = asyncio.run(requisicao(raw))
+    assert resposta.startswith(b"HTTP/1.1 202 Accepted")
@@ -0,0 +1,45 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT_DIR
+from db.storage import SqliteStore
+
+PIPELINE = os.path.join(ROOT_DIR, "ml", "pipeline_sensor5.py")
+
+
+def rodar_pipeline(base, *extra):
+    env = dict(os.environ, MPLBACKEND="Agg")
+    subprocess.run([sys.executable, PIPELINE, "completo", "--base-path", str(base), "--n-jobs", "1",
+                    "--modelos", str(base / "modelos"), "--db", str(base / "hermia.db"), *extra],
+                   check=True, cwd=str(base), env=env, capture_output=True)
+
+
+@pytest.mark.parametrize("extra", [(), ("--chunksize", "250")], ids=["memoria", "chunks"])
+def test_db_nao_duplica_leituras_ao_rodar_de_novo(base_sensores, extra):
+    base = base_sensores(600)
+    rodar_pipeline(base, *extra)
+    rodar_pipeline(base, *extra)
+
+    store = SqliteStore(str(base / "hermia.db"))
+    try:
+        n_linhas = store.conn.execute("SELECT COUNT(*) FROM readings").fetchone()[0]
+        assert n_linhas == 600
+        assert store.count_readings() == 600
+    finally:
+        store.close()
+
+
+def test_insert_readings_ignora_leitura_repetida(tmp_path):
+    store = SqliteStore(str(tmp_path / "t.db"))
+    rows = [{"ts": f"2024-01-01 00:00:0{i}", "vibration": 0.1 * i, "air_q": 50} for i in range(5)]
+    try:
+        assert store.insert_readings(rows) == 5
+        assert store.insert_readings(rows) == 0
+        assert store.insert_readings(rows, device_id="esp32-02") == 5
+        assert store.kpis()["n_readings"] == 10
+        assert store.kpis("esp32-01")["avg_vibration"] == pytest.approx(0.2)
+    finally:
+        store.close()
@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+
+from readings_log import IncrementalCsvReader, map_cols
+
+
+def leituras(inicio, n, seed):
+    rng = np.random.default_rng(seed)
+    ts = pd.date_range(inicio, periods=n, freq="1min")
+    return pd.DataFrame({"ts": ts.strftime("%Y-%m-%d %H:%M:%S"), "temperature": rng.normal(30, 3, n),
+                         "vibration": rng.random(n), "luminosity": rng.uniform(300, 800, n),
+                         "air_q": rng.uniform(40, 100, n)})
+
+
+def test_frame_so_e_juntado_quando_lido(tmp_path):
+    path = tmp_path / "readings.csv"
+    leituras("2024-01-01", 50, 0).to_csv(path, index=False)
+    reader = IncrementalCsvReader(str(path), keep_frame=True)
+    assert reader.refresh() == 50
+
+    lotes = [leituras("2024-01-02", 30, 1), leituras("2024-01-01 12:00", 20, 2), leituras("2024-01-03", 40, 3)]
+    for i, lote in enumerate(lotes, 1):
+        lote.to_csv(path, mode="a", header=False, index=False)
+        assert reader.refresh() == len(lote)
+        # os lotes so se acumulam; nada de concat sobre o historico a cada refresh
+        assert len(reader._pending) == i and len(reader._frame) == 50
+
+    esperado = map_cols(pd.read_csv(path)).sort_values("ts", kind="mergesort")
+    frame = reader.frame
+    assert not reader._pending and frame["ts"].is_monotonic_increasing
+    pd.testing.assert_frame_equal(frame, esperado)
+
+    # depois de juntar, um lote em ordem nao obriga a reordenar
+    leituras("2024-01-04", 10, 4).to_csv(path, mode="a", header=False, index=False)
+    assert reader.refresh() == 10 and reader._in_order
+    assert len(reader.frame) == 150 and reader.frame["ts"].is_monotonic_increasing
@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+
+from ring_buffer import RingBuffer
+
+
+def lote(inicio, n):
+    ts = pd.date_range(inicio, periods=n, freq="1min")
+    return pd.DataFrame({"ts": ts, "temperature": 30.0, "vibration": np.arange(n) / n,
+                         "luminosity": 500.0, "air_q": 50.0})
+
+
+def test_since_com_lote_fora_de_ordem():
+    ring = RingBuffer(capacity=100)
+    ring.append(lote("2024-01-01 10:00", 30))
+    ring.append(lote("2024-01-01 09:00", 20))   # lote atrasado
+    ring.append(lote("2024-01-01 11:00", 10))
+
+    start = pd.Timestamp("2024-01-01 09:10")
+    ts = pd.DatetimeIndex(ring.window()["ts"])
+    w = ring.since(start)
+    assert len(w["ts"]) == (ts >= start).sum() == 50
+    assert (w["ts"] >= np.datetime64(start, "ns")).all()
+
+    # quando o lote atrasado sai da janela, volta a busca binaria sobre views
+    ring.append(lote("2024-01-01 12:00", 100))
+    w = ring.since(pd.Timestamp("2024-01-01 13:00"))
+    assert len(w["ts"]) == 40 and not w["ts"].flags.writeable
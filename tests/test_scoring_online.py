@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import IsolationForest
+
+from modelos import COLUNAS_ONLINE, Modelos
+from quantile_sketch import TDigest
+from scoring_online import OnlineScorer
+
+FEATURES = list(COLUNAS_ONLINE)
+
+
+def modelos_online(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.normal(size=(n, len(FEATURES))), columns=FEATURES)
+    iso = IsolationForest(n_estimators=50, random_state=0).fit(X)
+    return Modelos([], [], versao="teste", iso_online=iso, referencia_online=TDigest.de_valores(-iso.score_samples(X)),
+                   features_online=FEATURES)
+
+
+def anomalia(n):
+    return pd.DataFrame({COLUNAS_ONLINE[c]: np.full(n, 6.0) for c in FEATURES})
+
+
+def test_anomalia_prolongada_nao_muda_a_propria_classe():
+    modelos = modelos_online()
+    scorer = OnlineScorer(modelos=modelos, atualizar_a_cada=100)
+    limiares = scorer.limiares.copy()
+    primeira = scorer.pontuar(anomalia(1))["criticidade"].iloc[0]
+    assert primeira == "Crítico"
+
+    for _ in range(20):
+        scorer.pontuar(anomalia(100))
+    np.testing.assert_array_equal(scorer.limiares, limiares)
+    assert scorer.pontuar(anomalia(1))["criticidade"].iloc[0] == primeira
+    # os scores ao vivo ficam num digest separado, sem tocar na referencia do treino
+    assert scorer.ao_vivo.n == 2001
+    assert modelos.referencia_online.n == 2000
+    assert scorer.stats()["limiares_ao_vivo"][0] > limiares[-1]
+
+
+def test_recalcular_limiares_e_opcional():
+    scorer = OnlineScorer(modelos=modelos_online(), atualizar_a_cada=100, atualizar_limiares=True)
+    limiares = scorer.limiares.copy()
+    for _ in range(20):
+        scorer.pontuar(anomalia(100))
+    assert scorer.limiares[-1] > limiares[-1]
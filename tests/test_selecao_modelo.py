@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+import selecao_modelo
+from selecao_modelo import selecionar_classificador
+
+GRADE = {"n_estimators": [10, 20], "max_depth": [None, 4]}
+
+
+def dados(n=400, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({"vibracao": rng.gamma(2, 8, n), "temperatura": rng.normal(40, 15, n),
+                       "tipo": rng.choice(["Solda", "Corte", "Pintura"], n)})
+    df["falha"] = ((df["vibracao"] > 25) | (rng.random(n) < 0.05)).astype(int)
+    return df
+
+
+def test_tarefas_recebem_o_fold_por_caminho(monkeypatch):
+    recebidos = []
+    avaliar = selecao_modelo._avaliar
+
+    def espiao(params, fold, caminho):
+        recebidos.append(caminho)
+        return avaliar(params, fold, caminho)
+
+    monkeypatch.setattr(selecao_modelo, "_avaliar", espiao)
+    params, rel = selecionar_classificador(dados(), ["vibracao", "temperatura"], ["tipo"], grade=GRADE, folds=3,
+                                           n_jobs=1)
+    # candidatos x folds tarefas, mas so um arquivo (uma serializacao) por fold
+    assert len(recebidos) == 4 * 3 and all(isinstance(c, str) for c in recebidos)
+    assert len(set(recebidos)) == 3
+    assert len(rel) == 4 and rel["escolhido"].sum() == 1 and params in [eval(p) for p in rel["parametros"]]
+
+
+def test_resultado_nao_depende_do_pool():
+    _, rel = selecionar_classificador(dados(), ["vibracao", "temperatura"], ["tipo"], grade=GRADE, folds=3,
+                                      n_jobs=2)
+    _, ref = selecionar_classificador(dados(), ["vibracao", "temperatura"], ["tipo"], grade=GRADE, folds=3,
+                                      n_jobs=1)
+    pd.testing.assert_series_equal(rel.set_index("parametros")["f1"], ref.set_index("parametros")["f1"])
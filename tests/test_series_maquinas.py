@@ -0,0 +1,29 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from series_maquinas import gerar_series_maquinas
+
+
+def test_ids_que_viram_o_mesmo_nome_ficam_em_arquivos_separados(tmp_path):
+    n = 200
+    df = pd.DataFrame({
+        "ts": np.tile(pd.date_range("2025-07-01", periods=n // 2, freq="10min"), 2),
+        "id_maquina": ["M 1"] * (n // 2) + ["M_1"] * (n // 2),
+        "vibracao": np.r_[np.zeros(n // 2), np.ones(n // 2)],
+    })
+    dash = tmp_path / "series_maquinas.html"
+    assert gerar_series_maquinas(df, ["vibracao"], str(dash)) == 2
+
+    html = dash.read_text(encoding="utf-8")
+    config = json.loads(html.split("const CONFIG = ", 1)[1].split(";\n", 1)[0])
+    arquivos = config["arquivos"]
+    assert len(set(arquivos.values())) == 2
+    assert sorted(os.listdir(tmp_path / "series_maquinas")) == sorted(arquivos.values())
+    # cada arquivo carrega a série da sua máquina
+    for maquina, valor in (("M 1", 0), ("M_1", 1)):
+        texto = (tmp_path / "series_maquinas" / arquivos[maquina]).read_text(encoding="utf-8")
+        assert texto.startswith(f"carregarSerie({json.dumps(maquina)},")
+        assert set(json.loads(texto.split(", ", 1)[1].rsplit(");", 1)[0])["vibracao"]["y"]) == {valor}
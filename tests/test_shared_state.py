@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from readings_log import IncrementalCsvReader
+from shared_state import DeviceFeed
+
+FREQ = "2h"
+
+
+def leituras(inicio, n, seed):
+    rng = np.random.default_rng(seed)
+    ts = pd.date_range(inicio, periods=n, freq=FREQ)
+    return pd.DataFrame({"ts": ts.strftime("%Y-%m-%d %H:%M:%S"), "temperature": rng.normal(30, 3, n),
+                         "vibration": rng.random(n), "luminosity": rng.uniform(300, 800, n),
+                         "air_q": rng.uniform(40, 100, n)})
+
+
+def memoria(feed):
+    """Bytes alocados pelo buffer, pelas piramides e pelos baldes dos agregados."""
+    total = sum(a.nbytes for a in feed.ring._data.values())
+    total += sum(a.nbytes for p in feed.pyr.pyramids.values() for lvl in p.levels for a in lvl._arr.values())
+    total += sum(b._keys.nbytes + b._stats.nbytes for b in feed.agg.buckets.values())
+    return total
+
+
+def test_memoria_do_feed_nao_cresce_com_o_turno(tmp_path):
+    capacidade = 500
+    path = tmp_path / "readings.csv"
+    leituras("2020-01-01", 1, 0).iloc[:0].to_csv(path, index=False)
+    feed = DeviceFeed(IncrementalCsvReader(str(path), keep_frame=False), capacity=capacidade)
+    inicio = [pd.Timestamp("2000-01-01")]
+
+    def alimentar(n, seed, lote=2000):
+        df = leituras(inicio[0], n, seed)
+        for i in range(0, n, lote):
+            df.iloc[i:i + lote].to_csv(path, mode="a", header=False, index=False)
+            feed.refresh()
+        inicio[0] += n * pd.Timedelta(FREQ)
+        return df
+
+    # aquecimento: ~9 anos, passa da retencao de todos os baldes e do limite dos niveis finos
+    alimentar(40_000, 1)
+    antes = memoria(feed)
+    df = alimentar(80_000, 2)
+
+    assert feed.ring.total == 120_000 and len(feed.ring) == capacidade
+    for p in feed.pyr.pyramids.values():
+        assert all(len(lvl) <= capacidade + p.factor for lvl in p.levels)
+    for res, retencao in feed.agg.resolutions.items():
+        assert len(feed.agg.buckets[res]) <= retencao / pd.Timedelta(1, res) + 1
+    # o triplo de leituras: so os niveis grossos da piramide crescem (com o log do historico)
+    assert memoria(feed) <= 1.05 * antes
+
+    # o que o painel consulta continua certo
+    np.testing.assert_allclose(feed.ring.frame(5)["vibration"].to_numpy(), df["vibration"].tail(5).to_numpy())
+    start = feed.agg.last_ts - pd.Timedelta("24h")
+    esperado = df.loc[pd.to_datetime(df["ts"]) >= start, "vibration"]
+    w = feed.agg.window_stats("vibration", start)
+    assert w["count"] == len(esperado)
+    assert w["max"] == pytest.approx(esperado.max())
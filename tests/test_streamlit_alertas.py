@@ -0,0 +1,56 @@
+import os
+
+import pandas as pd
+import pytest
+
+from conftest import ROOT_DIR
+
+st = pytest.importorskip("streamlit")
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+APP = os.path.join(ROOT_DIR, "dashboard", "streamlit_app.py")
+
+
+def leituras_com_vibracao(n=20, vib=0.9):
+    ts = pd.date_range(end=pd.Timestamp.now(), periods=n, freq="min")
+    return pd.DataFrame({"ts": ts.strftime("%Y-%m-%d %H:%M:%S"), "temperature": 30.0, "vibration": vib,
+                         "luminosity": 500.0, "air_q": 90.0})
+
+
+def test_limiares_da_sessao_nao_mudam_o_estado_compartilhado(tmp_path, monkeypatch):
+    # o registro compartilhado (st.cache_resource) vive no processo inteiro
+    st.cache_resource.clear()
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("HERMIA_MODELOS", str(tmp_path / "sem_modelos"))
+    monkeypatch.setenv("HERMIA_ALERT_VIB", "0.8")
+    os.makedirs("ingest")
+    leituras_com_vibracao().to_csv("ingest/readings.csv", index=False)
+
+    a = AppTest.from_file(APP, default_timeout=60).run()
+    log = pd.read_csv("dashboard/alerts.csv")
+    assert list(log["status"]) == ["aberto"]
+
+    # duas sessoes com limiares de exibicao opostos, revezando
+    b = AppTest.from_file(APP, default_timeout=60).run()
+    b.slider(key="vib_thr").set_value(1.5).run()
+    a.slider(key="vib_thr").set_value(0.3).run()
+    b.run()
+    a.run()
+    assert not a.exception and not b.exception
+    pd.testing.assert_frame_equal(pd.read_csv("dashboard/alerts.csv"), log)
+
+    # cada sessao ve o aviso com os proprios limiares
+    assert a.error and not b.error and not b.warning
+
+
+def test_limite_de_ar_nao_inteiro(tmp_path, monkeypatch):
+    st.cache_resource.clear()
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("HERMIA_MODELOS", str(tmp_path / "sem_modelos"))
+    monkeypatch.setenv("HERMIA_ALERT_AIR", "60.5")
+    os.makedirs("ingest")
+    leituras_com_vibracao(vib=0.1).assign(air_q=20.0).to_csv("ingest/readings.csv", index=False)
+
+    a = AppTest.from_file(APP, default_timeout=60).run()
+    assert not a.exception
+    assert pd.read_csv("dashboard/alerts.csv")["regra"].str.startswith("air_q<=60.5 ").all()